@@ -2,15 +2,21 @@ import os
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
-import chats.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "abhijitongit_be.settings")
 
+# set Django up before importing consumers: the planner's use the ORM
+django_asgi_app = get_asgi_application()
+
+import chats.routing  # noqa: E402
+import planner.routing  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             chats.routing.websocket_urlpatterns
+            + planner.routing.websocket_urlpatterns
         )
     ),
 })
@@ -0,0 +1,344 @@
+"""A Channels layer shared by every ASGI worker on one host, stored in a SQLite file.
+
+InMemoryChannelLayer only reaches consumers in its own process. This layer
+keeps messages and group memberships in a WAL-mode SQLite database, so any
+number of worker processes (and management commands) on the host can send to
+each other's channels with no broker to run:
+
+    CHANNEL_LAYERS = {"default": {
+        "BACKEND": "abhijitongit_be.channel_layers.SQLiteChannelLayer",
+        "CONFIG": {"path": BASE_DIR / "channels.sqlite3"},
+    }}
+
+Each layer instance does its SQLite work on one private thread. Receivers do
+not poll a query per channel: one pump per event loop watches
+PRAGMA data_version (which only moves when another connection commits) and,
+when it moves, claims the messages of every channel waited on in that loop
+with one SELECT + DELETE. Sends from the same process wake the pump directly,
+so in-process delivery needs no polling at all; cross-process latency is at
+most `poll_interval` (default 50 ms: each idle receiver runs one PRAGMA per
+interval against the shared file).
+
+Messages expire after `expiry` seconds and group memberships after
+`group_expiry`, like the in-memory layer; a channel holding `capacity`
+messages (per-channel overrides in `channel_capacity`, glob patterns) raises
+ChannelFull on send and is skipped by group_send. Bodies are stored as JSON,
+with bytes values base64-encoded.
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import sqlite3
+import string
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    body TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_message_channel ON channel_message (channel, id);
+CREATE INDEX IF NOT EXISTS channel_message_expires ON channel_message (expires);
+CREATE TABLE IF NOT EXISTS channel_group (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS channel_group_channel ON channel_group (channel);
+"""
+SWEEP_EVERY = 5.0   # seconds between deletes of expired messages and memberships
+
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _hook(obj):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def dumps(message):
+    return json.dumps(message, default=_default, separators=(",", ":"))
+
+
+def loads(body):
+    return json.loads(body, object_hook=_hook)
+
+
+class _Store:
+    """The SQLite side. Only ever called on the layer's own thread."""
+
+    def __init__(self, path, timeout):
+        self.db = sqlite3.connect(str(path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")   # WAL stays consistent; a power cut may lose the last messages
+        self.db.executescript(SCHEMA)
+        self.swept = 0.0
+
+    def write(self, fn, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so writers queue on busy_timeout instead of deadlocking
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(*args)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return result
+
+    def data_version(self):
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _backlog(self, channels, now):
+        marks = ",".join("?" * len(channels))
+        return dict(self.db.execute(
+            f"SELECT channel, COUNT(*) FROM channel_message WHERE channel IN ({marks}) AND expires > ? GROUP BY channel",
+            [*channels, now],
+        ))
+
+    def send(self, channel, body, expires, capacity):
+        def run():
+            if self._backlog([channel], time.time()).get(channel, 0) >= capacity:
+                return False
+            self.db.execute("INSERT INTO channel_message (channel, body, expires) VALUES (?, ?, ?)",
+                            (channel, body, expires))
+            return True
+        return self.write(run)
+
+    def group_send(self, group, body, expires, capacity_for):
+        def run():
+            now = time.time()
+            members = [c for (c,) in self.db.execute(
+                "SELECT channel FROM channel_group WHERE grp = ? AND expires > ?", (group, now))]
+            if not members:
+                return 0
+            backlog = self._backlog(members, now)
+            targets = [c for c in members if backlog.get(c, 0) < capacity_for(c)]
+            self.db.executemany("INSERT INTO channel_message (channel, body, expires) VALUES (?, ?, ?)",
+                                [(c, body, expires) for c in targets])
+            return len(targets)
+        return self.write(run)
+
+    def take(self, channels, limit):
+        """Claim up to `limit` live messages per channel of `channels`, oldest first.
+
+        Only as many as there are receivers waiting: the rest stay in the
+        table, where they still count against the channel's capacity.
+        """
+        def run():
+            now = time.time()
+            marks = ",".join("?" * len(channels))
+            rows = self.db.execute(
+                "SELECT id, channel, body, expires FROM ("
+                " SELECT *, ROW_NUMBER() OVER (PARTITION BY channel ORDER BY id) AS n"
+                f" FROM channel_message WHERE channel IN ({marks})"
+                ") WHERE n <= ? ORDER BY id",
+                [*channels, limit],
+            ).fetchall()
+            if rows:
+                self.db.executemany("DELETE FROM channel_message WHERE id = ?", [(r[0],) for r in rows])
+            if now - self.swept > SWEEP_EVERY:
+                self.sweep(now)
+            return [(channel, body) for _, channel, body, expires in rows if expires > now]
+        return self.write(run)
+
+    def sweep(self, now):
+        # a channel whose message expired unread is gone: drop it from its groups, as the in-memory layer does
+        self.db.execute(
+            "DELETE FROM channel_group WHERE expires <= ? OR channel IN "
+            "(SELECT channel FROM channel_message WHERE expires <= ?)", (now, now))
+        self.db.execute("DELETE FROM channel_message WHERE expires <= ?", (now,))
+        self.swept = now
+
+    def group_add(self, group, channel, expires):
+        self.write(lambda: self.db.execute(
+            "INSERT INTO channel_group (grp, channel, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (grp, channel) DO UPDATE SET expires = excluded.expires", (group, channel, expires)))
+
+    def group_discard(self, group, channel):
+        self.write(lambda: self.db.execute(
+            "DELETE FROM channel_group WHERE grp = ? AND channel = ?", (group, channel)))
+
+    def flush(self):
+        def run():
+            self.db.execute("DELETE FROM channel_message")
+            self.db.execute("DELETE FROM channel_group")
+        self.write(run)
+
+    def close(self):
+        self.db.close()
+
+
+class _LoopState:
+    """Receivers waiting in one event loop, and the pump that feeds them."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.waiters = {}      # channel -> deque of futures
+        self.inbox = {}        # channel -> deque of messages claimed but not yet received
+        self.wake = asyncio.Event()
+        self.pump = None
+        self.seen_version = None
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path="channels.sqlite3", expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.05, timeout=5.0, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="channels-sqlite")
+        self._store = None
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    def _call(self, fn, args):
+        if self._store is None:
+            self._store = _Store(self.path, self.timeout)
+        return getattr(self._store, fn)(*args)
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = _LoopState(loop)
+        return state
+
+    def _wake_local(self):
+        # messages sent by this process do not move data_version for its own connection
+        with self._lock:
+            states = list(self._loops.values())
+        for state in states:
+            if state.waiters and not state.loop.is_closed():
+                state.loop.call_soon_threadsafe(state.wake.set)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        sent = await self._run("send", channel, dumps(message), time.time() + self.expiry,
+                               self.get_capacity(channel))
+        if not sent:
+            raise ChannelFull(channel)
+        self._wake_local()
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        state = self._state()
+        box = state.inbox.get(channel)
+        if box:
+            message = box.popleft()
+            if not box:
+                del state.inbox[channel]
+            return message
+        fut = state.loop.create_future()
+        state.waiters.setdefault(channel, deque()).append(fut)
+        if state.pump is None or state.pump.done():
+            state.pump = state.loop.create_task(self._pump(state))
+        state.wake.set()   # look once right away: the message may already be stored
+        try:
+            return await fut
+        finally:
+            queue = state.waiters.get(channel)
+            if queue is not None and fut in queue:
+                queue.remove(fut)
+                if not queue:
+                    del state.waiters[channel]
+
+    async def _pump(self, state):
+        while state.waiters:
+            try:
+                await asyncio.wait_for(state.wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            woken = state.wake.is_set()
+            state.wake.clear()
+            version = await self._run("data_version")
+            if not woken and version == state.seen_version:
+                continue
+            state.seen_version = version
+            if not state.waiters:
+                break
+            try:
+                rows = await self._run("take", list(state.waiters), max(map(len, state.waiters.values())))
+            except sqlite3.OperationalError:
+                continue   # locked past the busy timeout: try again on the next tick
+            for channel, body in rows:
+                message = loads(body)
+                queue = state.waiters.get(channel)
+                while queue and queue[0].done():   # cancelled receivers
+                    queue.popleft()
+                if queue:
+                    queue.popleft().set_result(message)
+                    if not queue:
+                        del state.waiters[channel]
+                else:
+                    state.inbox.setdefault(channel, deque()).append(message)
+
+    async def new_channel(self, prefix="specific."):
+        # pid + random: unique across every process sharing the file
+        return "%s.sqlite%d!%s" % (prefix, os.getpid(),
+                                   "".join(random.choice(string.ascii_letters) for _ in range(12)))
+
+    # Flush extension
+
+    async def flush(self):
+        await self._run("flush")
+        for state in list(self._loops.values()):
+            state.inbox.clear()
+
+    async def close(self):
+        for state in list(self._loops.values()):
+            if state.pump is not None and state.loop is asyncio.get_running_loop():
+                state.pump.cancel()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+    def _close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None   # reopened on next use
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run("group_add", group, channel, time.time() + self.group_expiry)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        await self._run("group_discard", group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        if await self._run("group_send", group, dumps(message), time.time() + self.expiry, self.get_capacity):
+            self._wake_local()
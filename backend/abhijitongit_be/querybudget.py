@@ -0,0 +1,139 @@
+"""Per-request SQL instrumentation and per-view query budgets.
+
+QueryBudgetMiddleware records every query a request runs (count, total SQL
+time, statements repeated with different parameters: the N+1 signature)
+through connection.execute_wrapper, so it works with DEBUG off too. Each
+request is logged as one JSON line on the "querybudget" logger; with DEBUG on
+the numbers are also sent back as X-Query-* response headers.
+
+Views declare their budget with @query_budget(n) (class-based views: a
+`query_budget` class attribute). Going over it logs a warning, or raises
+QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is on, which is what
+QueryBudgetTestMixin does so tests fail on regressions. A view whose batched
+writes grow with its input (one INSERT per batch, e.g. a file import) adds
+those statements to its request's budget with allow_queries().
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("querybudget")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class LogFileHandler(logging.FileHandler):
+    """FileHandler that creates the log's directory when it first opens the file (use with delay=True)."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def query_budget(n):
+    """Declare how many SQL queries one request to this view may run (session and auth included)."""
+    def decorator(view):
+        view.query_budget = n
+        return view
+    return decorator
+
+
+def allow_queries(request, n):
+    """Raise this request's budget by `n` statements the view ran by design (batched writes)."""
+    request.query_budget_extra = getattr(request, "query_budget_extra", 0) + n
+
+
+def budget_for(view):
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        budget = getattr(getattr(view, "view_class", None), "query_budget", None)
+    return budget
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - t0
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rec = QueryRecorder()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(rec))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        budget = budget_for(match.func) if match else None
+        if budget is not None:
+            budget += getattr(request, "query_budget_extra", 0)
+        stats = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": rec.count,
+            "sql_ms": round(rec.seconds * 1000, 2),
+            "duplicates": rec.duplicates,
+            "budget": budget,
+        }
+        response.query_stats = stats
+        over = budget is not None and rec.count > budget
+        logger.log(logging.WARNING if over else logging.INFO, json.dumps(stats))
+
+        if settings.DEBUG:
+            response["X-Query-Count"] = str(rec.count)
+            response["X-Query-Time-Ms"] = str(stats["sql_ms"])
+            response["X-Query-Duplicates"] = str(rec.duplicates)
+            if budget is not None:
+                response["X-Query-Budget"] = str(budget)
+        if over and getattr(settings, "QUERY_BUDGET_STRICT", False):
+            raise QueryBudgetExceeded(
+                f"{stats['view']} ran {rec.count} queries, budget is {budget} "
+                f"({rec.duplicates} duplicate statements)"
+            )
+        return response
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin: requests that go over their view's budget fail the test."""
+
+    def setUp(self):
+        from django.test.utils import override_settings
+
+        super().setUp()
+        self.enterContext(override_settings(QUERY_BUDGET_STRICT=True))
+
+    def assertWithinBudget(self, response):
+        stats = response.query_stats
+        self.assertIsNotNone(stats["budget"], f"{stats['view']} declares no query budget")
+        self.assertLessEqual(stats["queries"], stats["budget"], stats)
+        return stats
@@ -51,13 +51,28 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = "abhijitongit_be.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# The in-memory layer only reaches consumers in the same process. Set CHANNEL_LAYER_PATH
+# to a file to share one layer between all ASGI workers on the host; CHANNEL_LAYER_POLL
+# (seconds) bounds how late a message from another worker is noticed.
+if os.getenv("CHANNEL_LAYER_PATH"):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "abhijitongit_be.channel_layers.SQLiteChannelLayer",
+            "CONFIG": {
+                "path": os.getenv("CHANNEL_LAYER_PATH"),
+                "poll_interval": float(os.getenv("CHANNEL_LAYER_POLL", "0.05")),
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
     }
-}
 
 MIDDLEWARE = [
+    'abhijitongit_be.querybudget.QueryBudgetMiddleware',   # first, so session/auth queries count too
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -141,6 +156,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Largest planner attachment accepted through the resumable upload protocol
+# (planner.services.uploads); plain multipart uploads stay at MAX_UPLOAD_MB.
+ATTACHMENT_MAX_MB = int(os.getenv("ATTACHMENT_MAX_MB", "500"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -158,4 +177,30 @@ STATICFILES_DIRS = [BASE_DIR / 'core' / 'static']
 
 
 
-LOGIN_URL = "/agenda/login/"
\ No newline at end of file
+LOGIN_URL = "/agenda/login/"
+
+# Per-request SQL stats (abhijitongit_be.querybudget): one JSON line per request, written
+# only when QUERY_BUDGET_LOG names a file (e.g. logs/querybudget.log; its directory is created on first write)
+QUERY_BUDGET_STRICT = False   # raise instead of logging when a view goes over its budget
+QUERY_BUDGET_LOG = os.getenv("QUERY_BUDGET_LOG", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "line": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "line"},
+        "querylog": {
+            "class": "abhijitongit_be.querybudget.LogFileHandler",
+            "filename": BASE_DIR / QUERY_BUDGET_LOG,
+            "formatter": "line",
+            "delay": True,
+        } if QUERY_BUDGET_LOG else {"class": "logging.NullHandler"},
+    },
+    "loggers": {
+        "querybudget": {"handlers": ["querylog"], "level": "INFO", "propagate": False},
+        "planner": {"handlers": ["console"], "level": os.getenv("PLANNER_LOG_LEVEL", "WARNING")},
+    },
+}
\ No newline at end of file
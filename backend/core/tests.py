@@ -1,3 +1,39 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import get_resolver
+
+from abhijitongit_be.querybudget import QueryBudgetTestMixin, budget_for
+
+from .models import Experience, Project, Skill
+
+
+class CoreQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Project.objects.create(title=f"Project {i}", description="x", tech_stack="django")
+            Skill.objects.create(name=f"Skill {i}", proficiency_level=10 * i)
+            Experience.objects.create(role="Dev", company=f"Co {i}", start_date="2024-01-01", description="x")
+
+    def test_pages_and_api_stay_within_budget(self):
+        for url in ["/", "/projects/", "/contact/", "/api/projects/", "/api/skills/", "/api/experience/"]:
+            with self.subTest(url=url):
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                self.assertWithinBudget(resp)
+
+    def test_every_view_declares_a_budget(self):
+        for module in ["core.urls", "core.api_urls"]:
+            missing = [p.name for p in get_resolver(module).url_patterns if budget_for(p.callback) is None]
+            self.assertEqual(missing, [], module)
+
+    @override_settings(DEBUG=True)
+    def test_debug_exposes_query_headers(self):
+        resp = self.client.get("/api/skills/")
+        self.assertEqual(resp["X-Query-Count"], str(resp.query_stats["queries"]))
+        self.assertEqual(resp["X-Query-Budget"], "2")
+        self.assertIn("X-Query-Time-Ms", resp)
+        self.assertEqual(resp["X-Query-Duplicates"], "0")
+
+    def test_headers_hidden_without_debug(self):
+        self.assertNotIn("X-Query-Count", self.client.get("/api/skills/"))
 
-# Create your tests here.
@@ -4,15 +4,19 @@ from .models import Project, Skill, Experience, ContactMessage
 from .serializers import ProjectSerializer, SkillSerializer, ExperienceSerializer, ContactMessageSerializer
 from django.core.mail import send_mail
 from django.conf import settings
+from abhijitongit_be.querybudget import query_budget
 
 
 # HTML PAGES
+@query_budget(2)
 def home_view(request):
     return render(request, 'core/home.html')
 
+@query_budget(2)
 def projects_view(request):
     return render(request, 'core/projects.html')
 
+@query_budget(2)
 def contact_view(request):
     return render(request, 'core/contact.html')
 
@@ -21,18 +25,22 @@ def contact_view(request):
 class ProjectListView(generics.ListAPIView):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
+    query_budget = 2
 
 class SkillListView(generics.ListAPIView):
     queryset = Skill.objects.all()
     serializer_class = SkillSerializer
+    query_budget = 2
 
 class ExperienceListView(generics.ListAPIView):
     queryset = Experience.objects.all()
     serializer_class = ExperienceSerializer
+    query_budget = 2
 
 class ContactCreateView(generics.CreateAPIView):
     queryset = ContactMessage.objects.all()
     serializer_class = ContactMessageSerializer
+    query_budget = 3
 
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -1,15 +1,20 @@
 from django.contrib import admin
-from .models import Task, TaskGroup, DayPlan, PlanItem
+from .models import Task, TaskGroup, TaskSkip, DayPlan, DayTemplate, DayTemplateItem, PlanItem
 
 @admin.register(TaskGroup)
 class TaskGroupAdmin(admin.ModelAdmin):
     list_display = ("name",)
 
+class TaskSkipInline(admin.TabularInline):
+    model = TaskSkip
+    extra = 0
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ("title","group","duration_min","priority","desired_time","deadline","active")
     list_filter = ("group","desired_time","active")
     search_fields = ("title",)
+    inlines = [TaskSkipInline]
 
 class PlanItemInline(admin.TabularInline):
     model = PlanItem
@@ -19,3 +24,13 @@ class PlanItemInline(admin.TabularInline):
 class DayPlanAdmin(admin.ModelAdmin):
     list_display = ("date","created_at")
     inlines = [PlanItemInline]
+
+class DayTemplateItemInline(admin.TabularInline):
+    model = DayTemplateItem
+    extra = 0
+    autocomplete_fields = ("task",)
+
+@admin.register(DayTemplate)
+class DayTemplateAdmin(admin.ModelAdmin):
+    list_display = ("name","weekday","is_default","updated_at")
+    inlines = [DayTemplateItemInline]
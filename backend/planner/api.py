@@ -0,0 +1,122 @@
+"""Read-only JSON API: day plans and the task catalog, with conditional GET.
+
+Responses carry strong ETags built from cheap stamps instead of hashing the
+body: a plan's is DayPlan.version (bumped by services.counters.adjust on every
+item write) plus the newest updated_at of the tasks on it; the catalog's is
+the task count and newest Task/TaskGroup updated_at. A client that sends the
+ETag back in If-None-Match gets an empty 304 after one stamp query.
+
+Mutating planner views answer JSON clients (Accept: application/json) with
+plan_version() so they never need a refetch.
+"""
+from datetime import date
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from abhijitongit_be.querybudget import query_budget
+
+from .models import DayPlan, PlanItem, Task, TaskGroup
+from .services.broadcast import item_payload
+
+
+def wants_json(request):
+    return "application/json" in request.headers.get("Accept", "")
+
+
+def plan_version(plan):
+    return {"date": str(plan.date), "version": plan.version}
+
+
+def _day(day):
+    if day is None:
+        return timezone.localdate()
+    try:
+        return date.fromisoformat(day)
+    except ValueError:
+        return None
+
+
+def _plan_stamp(request, day=None):
+    """The requested day's plan row (counters, version, newest task change), fetched once per request."""
+    if not hasattr(request, "_plan_stamp"):
+        d = _day(day)
+        request._plan_stamp = d and (
+            DayPlan.objects.filter(date=d)
+                .annotate(tasks_changed=Max("items__task__updated_at"))
+                .values("id", "version", "tasks_changed", "total_items", "done_items", "planned_minutes")
+                .first()
+        )
+    return request._plan_stamp
+
+
+def _plan_etag(request, day=None):
+    d = _day(day)
+    if d is None:
+        return None
+    stamp = _plan_stamp(request, day)
+    if stamp is None:
+        return f"plan-{d}-none"   # no plan yet: stable until one is created
+    changed = stamp["tasks_changed"]
+    return f"plan-{stamp['id']}-v{stamp['version']}-{changed.timestamp() if changed else 0}"
+
+
+def _catalog_etag(request):
+    tasks = Task.objects.aggregate(n=Count("id"), changed=Max("updated_at"))
+    groups = TaskGroup.objects.aggregate(n=Count("id"), changed=Max("updated_at"))
+    stamp = "-".join(
+        str(x.timestamp() if hasattr(x, "timestamp") else x)
+        for x in (tasks["n"], tasks["changed"], groups["n"], groups["changed"])
+    )
+    return f"tasks-{request.GET.get('active', '')}-{stamp}"
+
+
+def _private(response):
+    # always revalidate; the session decides what the body is
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@query_budget(5)
+@login_required(login_url="/agenda/login/")
+@require_GET
+@condition(etag_func=_plan_etag)
+def plan_detail(request, day=None):
+    """GET /agenda/api/plans/today/ or /agenda/api/plans/YYYY-MM-DD/ (a missing plan is empty, not created)."""
+    d = _day(day)
+    if d is None:
+        return JsonResponse({"ok": False, "error": "Dates look like YYYY-MM-DD"}, status=400)
+    stamp = _plan_stamp(request, day)
+    body = {"date": str(d), "version": 0, "total_items": 0, "done_items": 0, "planned_minutes": 0, "items": []}
+    if stamp is not None:
+        items = PlanItem.objects.filter(plan_id=stamp["id"]).select_related("task").chronological()
+        body.update({k: stamp[k] for k in ("version", "total_items", "done_items", "planned_minutes")})
+        body["items"] = [item_payload(it) for it in items]
+    return _private(JsonResponse(body))
+
+
+@query_budget(6)
+@login_required(login_url="/agenda/login/")
+@require_GET
+@condition(etag_func=_catalog_etag)
+def task_catalog(request):
+    """GET /agenda/api/tasks/ (?active=1 for active tasks only)."""
+    tasks = Task.objects.select_related("group").order_by("group__name", "-priority", "title")
+    if request.GET.get("active") == "1":
+        tasks = tasks.filter(active=True)
+    return _private(JsonResponse({"tasks": [
+        {
+            "id": t.id, "title": t.title, "group": {"id": t.group_id, "name": t.group.name},
+            "duration_min": t.duration_min, "priority": t.priority, "desired_time": t.desired_time,
+            "active": t.active, "recurrence": t.recurrence, "recur_interval": t.recur_interval,
+            "recur_weekdays": t.recur_weekdays, "recur_monthday": t.recur_monthday,
+            "rrule_text": t.rrule_text, "start_date": t.start_date, "end_date": t.end_date,
+            "deadline": t.deadline, "deadline_at": t.deadline_at,
+            "description_type": t.description_type,
+        }
+        for t in tasks
+    ]}))
@@ -0,0 +1,61 @@
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+from django.utils import timezone
+
+from .models import DayPlan
+from .services.broadcast import TASKS_GROUP, plan_group
+
+
+class PlanConsumer(JsonWebsocketConsumer):
+    """Live diffs of one day's plan (services.broadcast), plus checklist changes.
+
+    ws/agenda/today/ or ws/agenda/YYYY-MM-DD/. On connect, and after
+    {"subscribe": "YYYY-MM-DD"}, the client gets {"type": "hello", "date", "version"}:
+    if that version is newer than what it rendered, it refetches the plan once
+    (GET /agenda/api/plans/<date>/) and then only applies diffs.
+    """
+
+    def connect(self):
+        self.day = None
+        user = self.scope.get("user")
+        day = self.scope["url_route"]["kwargs"]["day"]
+        try:
+            d = timezone.localdate() if day == "today" else date.fromisoformat(day)
+        except ValueError:
+            d = None
+        if d is None or user is None or not user.is_authenticated:
+            self.close()
+            return
+        self.accept()
+        async_to_sync(self.channel_layer.group_add)(TASKS_GROUP, self.channel_name)
+        self.subscribe(d)
+
+    def disconnect(self, code):
+        if getattr(self, "day", None) is not None:
+            async_to_sync(self.channel_layer.group_discard)(plan_group(self.day), self.channel_name)
+            async_to_sync(self.channel_layer.group_discard)(TASKS_GROUP, self.channel_name)
+
+    def subscribe(self, d):
+        if self.day is not None:
+            async_to_sync(self.channel_layer.group_discard)(plan_group(self.day), self.channel_name)
+        self.day = d
+        async_to_sync(self.channel_layer.group_add)(plan_group(d), self.channel_name)
+        version = DayPlan.objects.filter(date=d).values_list("version", flat=True).first()
+        self.send_json({"type": "hello", "date": str(d), "version": version or 0})
+
+    def receive_json(self, content, **kwargs):
+        try:
+            d = date.fromisoformat(content["subscribe"])
+        except (KeyError, TypeError, ValueError):
+            self.send_json({"type": "error", "error": 'Send {"subscribe": "YYYY-MM-DD"}'})
+            return
+        self.subscribe(d)
+
+    # group messages from services.broadcast go to the client as they are
+    def plan_diff(self, event):
+        self.send_json(event)
+
+    def task_checklist(self, event):
+        self.send_json(event)
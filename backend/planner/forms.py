@@ -1,5 +1,6 @@
 from django import forms
-from .models import Task, TaskGroup
+from .models import Task, TaskGroup, WEEKDAY_CODES
+from .services.rrule import RRule, RRuleError, DEFAULT_DTSTART
 
 # class TaskForm(forms.ModelForm):
 #     class Meta:
@@ -12,16 +13,48 @@ class TaskForm(forms.ModelForm):
     description_text = forms.CharField(
         required=False, widget=forms.Textarea(attrs={"rows": 3, "placeholder": "Notes…"})
     )
+    # stored as Task.recur_weekday_mask
+    recur_weekdays = forms.CharField(
+        required=False, max_length=20, help_text="e.g. MO,WE,FR (weekly only; empty = every day)"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.order_fields(self.Meta.fields)
+        if self.instance.pk:
+            self.initial.setdefault("recur_weekdays", self.instance.recur_weekdays)
     class Meta:
         model = Task
         fields = [
             "title","group","duration_min","priority","desired_time","active",
             "recurrence","recur_interval","recur_weekdays","recur_monthday",
+            "rrule_text",               # used when recurrence="custom", e.g. FREQ=MONTHLY;BYDAY=2TU
             "start_date","end_date",
             "deadline_at",              # if you added this earlier
             "description_type","description_text"
         ]
 
+    def clean_recur_weekdays(self):
+        codes = [x.strip().upper() for x in self.cleaned_data["recur_weekdays"].split(",") if x.strip()]
+        bad = [c for c in codes if c not in WEEKDAY_CODES]
+        if bad:
+            raise forms.ValidationError(f"Unknown weekday(s): {', '.join(bad)}. Use {','.join(WEEKDAY_CODES)}.")
+        return ",".join(codes)
+
+    def clean(self):
+        data = super().clean()
+        if data.get("recurrence") == "custom":
+            try:
+                RRule.parse(data.get("rrule_text") or "", data.get("start_date") or DEFAULT_DTSTART)
+            except RRuleError as e:
+                self.add_error("rrule_text", f"Invalid RRULE: {e}")
+        return data
+
+    def _post_clean(self):
+        super()._post_clean()
+        if "recur_weekdays" in self.cleaned_data:
+            self.instance.recur_weekdays = self.cleaned_data["recur_weekdays"]
+
 class TaskGroupForm(forms.ModelForm):
     class Meta:
         model = TaskGroup
@@ -0,0 +1,233 @@
+"""iCalendar (RFC 5545) feed of the planner, for subscribing from calendar apps.
+
+GET /agenda/feed.ics streams one VCALENDAR: a VEVENT per PlanItem of the
+last FEED_PAST_DAYS days and every later day, and a VTODO with an RRULE per
+active recurring Task. The body is generated while it is sent: rows are read
+with .iterator() in chunks of FEED_CHUNK, so memory stays flat however long
+the history is, and nothing is rendered when the client's copy is current.
+
+Calendar apps poll a subscription every few minutes, so the response carries
+an ETag and a Last-Modified built from cheap stamps, like planner.api: the
+window's plan count and summed DayPlan.version with the newest
+DayPlan/Task/TaskGroup updated_at. If-None-Match / If-Modified-Since get an
+empty 304 after those three aggregates. DTSTAMPs come from the same
+updated_at columns, so an unchanged feed is byte-for-byte the same.
+
+Most calendar apps cannot log in through a form; besides the session, the
+feed accepts HTTP Basic credentials and answers 401 with a challenge.
+"""
+import base64
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from django.contrib.auth import authenticate
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET
+
+from abhijitongit_be.querybudget import query_budget
+
+from .api import _private
+from .models import DayPlan, PlanItem, Task, TaskGroup
+from .services.rrule import DEFAULT_DTSTART, WD, RRule, RRuleError
+
+FEED_PAST_DAYS = 30
+FEED_CHUNK = 500
+PRODID = "-//abhijitongit//planner//EN"
+
+
+def escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold(line):
+    """One content line, folded at 75 octets (continuations start with a space), CRLF-terminated."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    out, start, limit = [], 0, 75
+    while start < len(raw):
+        end = min(start + limit, len(raw))
+        while end < len(raw) and raw[end] & 0xC0 == 0x80:   # never split a UTF-8 sequence
+            end -= 1
+        out.append(raw[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(out) + "\r\n"
+
+
+def _utc(dt):
+    return dt.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _local(d, minutes):
+    # wall-clock minutes of the plan's day, then the zone: correct across DST changes
+    return timezone.make_aware(datetime.combine(d, time.min) + timedelta(minutes=minutes))
+
+
+def task_rrule(task):
+    """(first date, RRULE value) of a recurring task, or None if it never occurs.
+
+    Built-in recurrences are spelled as the RRULE occurs_on() agrees with (weekly
+    intervals count whole weeks from start_date, hence WKST = its weekday); the
+    first occurrence is found with services.rrule so DTSTART is on the rule.
+    """
+    anchored = task.start_date is not None
+    interval = max(task.recur_interval, 1)
+    rec = task.recurrence
+    if rec == "custom":
+        text = task.rrule_text.strip()
+        rule = text[6:] if text.upper().startswith("RRULE:") else text
+    elif rec == "daily":
+        rule = f"FREQ=DAILY;INTERVAL={interval if anchored else 1}"
+    elif rec == "weekdays":
+        rule = "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"
+    elif rec == "weekends":
+        rule = "FREQ=WEEKLY;BYDAY=SA,SU"
+    elif rec == "weekly" and anchored:
+        days = ",".join(c for i, c in enumerate(WD) if task.recur_weekday_mask >> i & 1 or not task.recur_weekday_mask)
+        rule = f"FREQ=WEEKLY;BYDAY={days};INTERVAL={interval};WKST={WD[task.start_date.weekday()]}"
+    elif rec == "weekly":
+        rule = "FREQ=DAILY"   # occurs_on: a weekly task without a start date occurs every day
+    elif rec == "monthly":
+        dom = task.recur_monthday or (task.start_date.day if anchored else None)
+        # no day of month at all: occurs_on compares the day with itself, i.e. every day
+        rule = f"FREQ=MONTHLY;INTERVAL={interval if anchored else 1};BYMONTHDAY={dom}" if dom else "FREQ=DAILY"
+    else:
+        return None
+    if not rule:
+        return None
+    if task.end_date and "COUNT=" not in rule.upper() and "UNTIL=" not in rule.upper():
+        rule += f";UNTIL={task.end_date:%Y%m%d}"
+    anchor = task.start_date or DEFAULT_DTSTART
+    try:
+        first = RRule.parse(rule, anchor).next_on_or_after(anchor)
+    except RRuleError:
+        return None
+    if first is None or (task.end_date and first > task.end_date):
+        return None
+    return first, rule
+
+
+def _since():
+    return timezone.localdate() - timedelta(days=FEED_PAST_DAYS)
+
+
+def _feed_stamp(request):
+    if not hasattr(request, "_feed_stamp"):
+        since = _since()
+        plans = DayPlan.objects.filter(date__gte=since).aggregate(n=Count("id"), v=Sum("version"), changed=Max("updated_at"))
+        tasks = Task.objects.aggregate(n=Count("id"), changed=Max("updated_at"))
+        groups = TaskGroup.objects.aggregate(changed=Max("updated_at"))
+        changed = [x for x in (plans["changed"], tasks["changed"], groups["changed"]) if x]
+        request._feed_stamp = {
+            "etag": "ics-{}-{}-{}-{}-{}".format(
+                since, plans["n"], plans["v"] or 0, tasks["n"],
+                "-".join(str(x.timestamp()) for x in changed)),
+            "changed": max(changed) if changed else None,
+        }
+    return request._feed_stamp
+
+
+def _etag(request):
+    return _feed_stamp(request)["etag"]
+
+
+def _last_modified(request):
+    return _feed_stamp(request)["changed"]
+
+
+def _events(host, since):
+    rows = (
+        PlanItem.objects.filter(plan__date__gte=since)
+            .order_by("plan__date", "start_min", "order", "id")
+            .values_list("id", "plan__date", "plan__version", "plan__updated_at", "start_min", "end_min",
+                         "done", "group_name", "task__title")
+            .iterator(chunk_size=FEED_CHUNK)
+    )
+    for item_id, d, version, changed, start, end, done, group, title in rows:
+        yield "".join(fold(line) for line in (
+            "BEGIN:VEVENT",
+            f"UID:planitem-{item_id}@{host}",
+            f"DTSTAMP:{_utc(changed)}",
+            f"SEQUENCE:{version}",
+            f"DTSTART:{_utc(_local(d, start))}",
+            f"DTEND:{_utc(_local(d, end))}",
+            f"SUMMARY:{'✓ ' if done else ''}{escape(title)}",   # events have no done state of their own
+            f"CATEGORIES:{escape(group)}",
+            "END:VEVENT",
+        ))
+
+
+def _todos(host):
+    tasks = (
+        Task.objects.filter(active=True).exclude(recurrence="none")
+            .select_related("group").prefetch_related("skips")
+            .order_by("id").iterator(chunk_size=FEED_CHUNK)   # one skips query per chunk
+    )
+    for t in tasks:
+        rule = task_rrule(t)
+        if rule is None:
+            continue
+        first, rrule = rule
+        exdates = ",".join(f"{s.date:%Y%m%d}" for s in t.skips.all())
+        lines = [
+            "BEGIN:VTODO",
+            f"UID:task-{t.id}@{host}",
+            f"DTSTAMP:{_utc(max(t.updated_at, t.group.updated_at))}",
+            f"DTSTART;VALUE=DATE:{first:%Y%m%d}",
+            f"RRULE:{rrule}",
+            *([f"EXDATE;VALUE=DATE:{exdates}"] if exdates else []),
+            f"SUMMARY:{escape(t.title)}",
+            f"CATEGORIES:{escape(t.group.name)}",
+            f"PRIORITY:{min(max(11 - 2 * t.priority, 1), 9)}",   # 5 (most important) -> 1, 1 -> 9
+            *([f"DESCRIPTION:{escape(t.description_text)}"] if t.description_type == "text" and t.description_text else []),
+            "END:VTODO",
+        ]
+        yield "".join(fold(line) for line in lines)
+
+
+def _calendar(host, since):
+    yield "".join(fold(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Agenda", "X-PUBLISHED-TTL:PT5M",
+    ))
+    yield from _events(host, since)
+    yield from _todos(host)
+    yield fold("END:VCALENDAR")
+
+
+def _basic_or_session(view):
+    """login_required for calendar apps: a logged-in session, or HTTP Basic credentials, else 401."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            kind, _, credentials = request.headers.get("Authorization", "").partition(" ")
+            user = None
+            if kind.lower() == "basic":
+                try:
+                    username, _, password = base64.b64decode(credentials, validate=True).decode("utf-8").partition(":")
+                except (ValueError, UnicodeDecodeError):
+                    username = password = None
+                if username:
+                    user = authenticate(request, username=username, password=password)
+            if user is None or not user.is_active:
+                response = HttpResponse("Authentication required", status=401, content_type="text/plain")
+                response["WWW-Authenticate"] = 'Basic realm="agenda", charset="UTF-8"'
+                return response
+            request.user = user
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+@query_budget(6)   # counted until the response starts: the streamed rows are read after the view returns
+@_basic_or_session
+@require_GET
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def ics_feed(request):
+    """GET /agenda/feed.ics"""
+    response = StreamingHttpResponse(_calendar(request.get_host().split(":")[0], _since()),
+                                     content_type="text/calendar; charset=utf-8")
+    response["Content-Disposition"] = 'inline; filename="agenda.ics"'
+    return _private(response)
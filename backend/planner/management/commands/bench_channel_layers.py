@@ -0,0 +1,162 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+from abhijitongit_be.channel_layers import SQLiteChannelLayer
+
+LAYERS = ("memory", "sqlite")
+PAYLOAD = {"type": "plan.diff", "date": "2026-01-01", "version": 1,
+           "upsert": [{"id": i, "start": "09:00", "end": "09:30", "done": False} for i in range(5)]}
+
+
+def _make(name, path):
+    if name == "memory":
+        return InMemoryChannelLayer(capacity=1000)
+    return SQLiteChannelLayer(path=path, capacity=1000)
+
+
+async def _throughput(layer, n):
+    """Send n messages to one channel, then drain it; returns seconds per message."""
+    channel = await layer.new_channel()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await layer.send(channel, PAYLOAD)
+    for _ in range(n):
+        await layer.receive(channel)
+    return (time.perf_counter() - t0) / n
+
+
+async def _ping_pong(layer, rounds):
+    """Round trips between two tasks of this process; returns per-round-trip seconds."""
+    a, b = await layer.new_channel(), await layer.new_channel()
+
+    async def echo():
+        for _ in range(rounds):
+            msg = await layer.receive(b)
+            await layer.send(a, msg)
+
+    task = asyncio.ensure_future(echo())
+    runs = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await layer.send(b, PAYLOAD)
+        await layer.receive(a)
+        runs.append(time.perf_counter() - t0)
+    await task
+    return runs
+
+
+async def _fanout(layer, members, rounds):
+    """group_send to `members` channels; returns seconds until the last one has received."""
+    channels = [await layer.new_channel() for _ in range(members)]
+    for c in channels:
+        await layer.group_add("bench", c)
+    runs = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await layer.group_send("bench", PAYLOAD)
+        await asyncio.gather(*(layer.receive(c) for c in channels))
+        runs.append(time.perf_counter() - t0)
+    for c in channels:
+        await layer.group_discard("bench", c)
+    return runs
+
+
+def _echo_process(path, ready, rounds):
+    async def serve():
+        layer = SQLiteChannelLayer(path=path)
+        ready.set()
+        for _ in range(rounds):
+            msg = await layer.receive("bench.echo")
+            await layer.send(msg["reply"], msg)
+        await layer.close()
+    asyncio.run(serve())
+
+
+async def _cross_process(path, rounds):
+    """Round trips to an echo consumer in another process (SQLite layer only)."""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    proc = ctx.Process(target=_echo_process, args=(path, ready, rounds + 1), daemon=True)
+    proc.start()
+    try:
+        if not await asyncio.to_thread(ready.wait, 30):
+            raise CommandError("echo process did not start")
+        layer = SQLiteChannelLayer(path=path)
+        reply = await layer.new_channel()
+        runs = []
+        for k in range(rounds + 1):   # the first round trip warms up both sides
+            t0 = time.perf_counter()
+            await layer.send("bench.echo", {**PAYLOAD, "reply": reply})
+            await layer.receive(reply)
+            if k:
+                runs.append(time.perf_counter() - t0)
+        await layer.close()
+        return runs
+    finally:
+        proc.join(10)
+        if proc.is_alive():
+            proc.kill()
+
+
+async def bench_layer(name, path, messages, rounds, members):
+    # imported here: the spawned echo process imports this module before Django is set up
+    from planner.management.commands.bench_planner import _summary
+
+    layer = _make(name, path)
+    await layer.flush()
+    per_msg = [await _throughput(layer, messages) for _ in range(3)]
+    cases = {
+        "throughput": _summary(per_msg, messages=messages, msgs_per_s=round(1 / min(per_msg))),
+        "ping_pong": _summary(await _ping_pong(layer, rounds)),
+        "group_fanout": _summary(await _fanout(layer, members, rounds), members=members),
+    }
+    if name == "sqlite":
+        cases["cross_process"] = _summary(await _cross_process(path, rounds))
+    await layer.flush()
+    await layer.close()
+    return cases
+
+
+class Command(BaseCommand):
+    help = ("Compare channel layers: send/receive throughput, round-trip latency, group fan-out "
+            "and (SQLite layer) round trips to another process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--layers", default=",".join(LAYERS), help=f"comma separated, from {', '.join(LAYERS)}")
+        parser.add_argument("--messages", type=int, default=500, help="messages per throughput run (default: 500)")
+        parser.add_argument("--rounds", type=int, default=200, help="timed round trips per latency case (default: 200)")
+        parser.add_argument("--members", type=int, default=50, help="channels in the fan-out group (default: 50)")
+        parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    def handle(self, *args, **opts):
+        names = [x.strip() for x in opts["layers"].split(",") if x.strip()]
+        unknown = [n for n in names if n not in LAYERS]
+        if unknown:
+            raise CommandError(f"Unknown layer(s): {', '.join(unknown)}")
+        if opts["messages"] > 1000:
+            raise CommandError("--messages is limited to the benchmark layers' capacity (1000)")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "channels.sqlite3")
+            for name in names:
+                results[name] = asyncio.run(
+                    bench_layer(name, path, opts["messages"], opts["rounds"], opts["members"]))
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, cases in results.items():
+            self.stdout.write(name)
+            for case, c in cases.items():
+                line = f"  {case:<14} median {c['median_ms']:>8.3f} ms  p95 {c['p95_ms']:>8.3f} ms"
+                if "msgs_per_s" in c:
+                    line += f"  {c['msgs_per_s']:>7} msg/s"
+                self.stdout.write(line)
@@ -0,0 +1,81 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from planner.services.intervals import IntervalConflict, IntervalIndex
+
+
+def synthetic_intervals(n, seed=0, overlap=0.05):
+    """n intervals packed into one (long) plan; about `overlap` of them collide with a neighbour."""
+    rnd = random.Random(seed)
+    out = []
+    cur = 0
+    for i in range(n):
+        dur = rnd.choice([5, 10, 15, 30, 45, 60])
+        start = cur - rnd.randint(1, 5) if out and rnd.random() < overlap else cur
+        out.append((start, start + dur, i))
+        cur = start + dur + rnd.choice([0, 0, 5, 15])
+    return out
+
+
+def _best(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - t0)
+    return result, min(runs)
+
+
+class Command(BaseCommand):
+    help = "Time services.intervals.IntervalIndex on plans with thousands of items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,5000,20000",
+                            help="comma separated items per plan (default: 1000,5000,20000)")
+        parser.add_argument("--repeat", type=int, default=5, help="runs per size; best is reported")
+        parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    def handle(self, *args, **opts):
+        results = []
+        for n in [int(x) for x in opts["sizes"].split(",") if x.strip()]:
+            intervals = synthetic_intervals(n)
+            horizon = max(e for _, e, _ in intervals)
+            index, build = _best(lambda: IntervalIndex(intervals), opts["repeat"])
+            pairs, conflicts = _best(index.conflicts, opts["repeat"])
+            windows = [(lo, lo + 240) for lo in range(0, horizon, max(horizon // 1000, 1))]
+            _, free = _best(lambda: [index.free(lo, hi) for lo, hi in windows], opts["repeat"])
+
+            def inserts():
+                idx = IntervalIndex(intervals)
+                accepted = 0
+                for k, (lo, _) in enumerate(windows):
+                    try:
+                        idx.add(lo, lo + 5, key=("new", k))
+                        accepted += 1
+                    except IntervalConflict:
+                        pass
+                return accepted
+
+            accepted, add = _best(inserts, opts["repeat"])
+            add -= build   # inserts() rebuilds its own copy first
+            results.append({
+                "items": n, "conflicts": len(pairs),
+                "build_ms": round(build * 1000, 2),
+                "conflicts_ms": round(conflicts * 1000, 2),
+                "free_us_per_query": round(free / len(windows) * 1e6, 2),
+                "add_us_per_insert": round(max(add, 0) / len(windows) * 1e6, 2),
+                "inserts_accepted": accepted,
+            })
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"{r['items']:>7} items  {r['conflicts']:>5} conflicts  "
+                f"build {r['build_ms']:>8.2f} ms  sweep {r['conflicts_ms']:>8.2f} ms  "
+                f"free {r['free_us_per_query']:>7.2f} us  add {r['add_us_per_insert']:>7.2f} us"
+            )
@@ -0,0 +1,184 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from planner.management.commands.seed_planner import generate
+from planner.models import PlanItem, Task
+from planner.services.occurrences import tasks_occurring_on
+from planner.services.recurrence import occurs_on
+
+# name -> (tasks, days of plans)
+SIZES = {
+    "small": (200, 90),
+    "medium": (2000, 730),
+    "large": (5000, 1825),
+}
+SCHEMA = 1
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _timed(fn, repeat, rollback=False):
+    """Per-run seconds of fn() (after one warm-up run), and the last result.
+
+    With rollback=True each run happens in a savepoint that is rolled back, so
+    writes do not pile up between runs.
+    """
+    runs, result = [], None
+    for k in range(repeat + 1):
+        t0 = time.perf_counter()
+        if rollback:
+            try:
+                with transaction.atomic():
+                    result = fn()
+                    raise _Rollback
+            except _Rollback:
+                pass
+        else:
+            result = fn()
+        if k:
+            runs.append(time.perf_counter() - t0)
+    return runs, result
+
+
+def _summary(runs, **extra):
+    ms = sorted(r * 1000 for r in runs)
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))], 3),
+        **extra,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_size(tasks, days, repeat, seed):
+    """Seed one data size and time the planner's hot paths against it."""
+    counts = generate(tasks, days, seed=seed)
+    client = Client()
+    user = get_user_model().objects.create_user("bench")
+    client.force_login(user)
+    today = timezone.localdate()
+    cases = {}
+
+    def request(name, method, url, data=None, rollback=False):
+        send = getattr(client, method)
+        runs, resp = _timed(lambda: send(url, data) if data is not None else send(url), repeat, rollback)
+        if resp.status_code >= 400:
+            raise CommandError(f"{name}: {method.upper()} {url} returned {resp.status_code}")
+        cases[name] = _summary(runs, queries=resp.query_stats["queries"])
+
+    request("agenda_today", "get", "/agenda/")
+    request("agenda_edit_get", "get", "/agenda/edit/")
+    today_items = list(PlanItem.objects.filter(plan__date=today).chronological())
+    rows = [{"item_id": it.id, "task_id": it.task_id, "start": it.start_hhmm, "end": it.end_hhmm}
+            for it in today_items]
+    request("agenda_edit_post", "post", "/agenda/edit/", {"items_json": json.dumps(rows)}, rollback=True)
+    first = next(it for it in today_items if it.start_min >= 6 * 60)
+    request("delay_after", "post", f"/agenda/item/{first.id}/delay/", {"minutes": "15"}, rollback=True)
+    request("agendas_list", "get", "/agenda/manage/agendas/")
+    request("tasks_list", "get", "/agenda/manage/tasks/")
+
+    catalog = list(Task.objects.prefetch_related("skips"))
+    week = [today + timedelta(days=k) for k in range(7)]
+    runs, hits = _timed(lambda: sum(occurs_on(t, d) for d in week for t in catalog), repeat)
+    cases["occurs_on"] = _summary(runs, calls=len(catalog) * len(week), hits=hits,
+                                  us_per_call=round(min(runs) / (len(catalog) * len(week)) * 1e6, 3))
+    runs, n = _timed(lambda: sum(len(tasks_occurring_on(d)) for d in week), repeat)
+    cases["tasks_occurring_on"] = _summary(runs, days=len(week), hits=n)
+    return counts, cases
+
+
+class Command(BaseCommand):
+    help = ("Time the planner views and recurrence checks on synthetic data of several sizes. "
+            "Runs in a throwaway test database; your data is not touched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="small,medium",
+                            help=f"comma separated sizes from {', '.join(SIZES)} (default: small,medium)")
+        parser.add_argument("--repeat", type=int, default=10, help="timed runs per case (default: 10)")
+        parser.add_argument("--seed", type=int, default=0, help="data seed (default: 0)")
+        parser.add_argument("--output", help="write the JSON results to this file")
+        parser.add_argument("--compare", help="earlier --output file to compare medians against")
+        parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    def handle(self, *args, **opts):
+        names = [x.strip() for x in opts["sizes"].split(",") if x.strip()]
+        unknown = [n for n in names if n not in SIZES]
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(unknown)}")
+        baseline = None
+        if opts["compare"]:
+            with open(opts["compare"]) as fh:
+                baseline = json.load(fh)
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = []
+            with override_settings(ALLOWED_HOSTS=["testserver"], DEBUG=False):
+                for name in names:
+                    tasks, days = SIZES[name]
+                    with transaction.atomic():
+                        counts, cases = bench_size(tasks, days, opts["repeat"], opts["seed"])
+                        transaction.set_rollback(True)
+                    results.append({"size": name, "tasks": tasks, "days": days, "rows": counts, "cases": cases})
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            "schema": SCHEMA,
+            "meta": {
+                "revision": _git_revision(),
+                "created": timezone.now().isoformat(timespec="seconds"),
+                "today": str(timezone.localdate()),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "seed": opts["seed"],
+                "repeat": opts["repeat"],
+            },
+            "results": results,
+        }
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        before = {}
+        if baseline:
+            before = {(r["size"], case): c["median_ms"]
+                      for r in baseline["results"] for case, c in r["cases"].items()}
+        for r in results:
+            self.stdout.write(f"{r['size']}: {r['tasks']} tasks, {r['rows']['plan_items']} plan items")
+            for case, c in r["cases"].items():
+                line = f"  {case:<20} median {c['median_ms']:>9.3f} ms  p95 {c['p95_ms']:>9.3f} ms"
+                if "queries" in c:
+                    line += f"  {c['queries']:>3} queries"
+                old = before.get((r["size"], case))
+                if old:
+                    line += f"  x{c['median_ms'] / old:.2f} vs baseline"
+                self.stdout.write(line)
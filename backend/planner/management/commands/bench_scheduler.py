@@ -0,0 +1,68 @@
+import json
+import random
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from planner.models import Task
+from planner.services.scheduler import schedule
+
+DESIRED = [k for k, _ in Task.DESIRED_CHOICES]
+
+
+def synthetic_tasks(n, day, seed=0):
+    """Unsaved Task objects with a realistic mix of windows, priorities and deadlines."""
+    rnd = random.Random(seed)
+    tz = timezone.get_current_timezone()
+    tasks = []
+    for i in range(n):
+        deadline = None
+        if rnd.random() < 0.2:
+            due = day + timedelta(days=rnd.randint(-1, 5))
+            deadline = datetime.combine(due, dtime(rnd.randint(8, 22), rnd.choice([0, 30])), tz)
+        tasks.append(Task(
+            pk=i + 1, title=f"task {i}",
+            duration_min=rnd.choice([5, 10, 15, 20, 30, 45, 60, 90, 120]),
+            priority=rnd.randint(1, 5),
+            desired_time=rnd.choice(DESIRED),
+            deadline_at=deadline,
+        ))
+    return tasks
+
+
+class Command(BaseCommand):
+    help = "Time services.scheduler.schedule() over synthetic task catalogs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,5000",
+                            help="comma separated catalog sizes (default: 100,1000,5000)")
+        parser.add_argument("--repeat", type=int, default=5, help="runs per size; best is reported")
+        parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    def handle(self, *args, **opts):
+        day = timezone.localdate()
+        busy = [(0, 6 * 60), (22 * 60, 24 * 60 - 1)]   # the seeded sleep blocks
+        results = []
+        for n in [int(x) for x in opts["sizes"].split(",") if x.strip()]:
+            tasks = synthetic_tasks(n, day)
+            runs = []
+            for _ in range(opts["repeat"]):
+                t0 = time.perf_counter()
+                placed = schedule(tasks, busy, day)
+                runs.append(time.perf_counter() - t0)
+            results.append({
+                "tasks": n, "placed": len(placed),
+                "best_ms": round(min(runs) * 1000, 2),
+                "mean_ms": round(sum(runs) / len(runs) * 1000, 2),
+            })
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"{r['tasks']:>7} tasks  placed {r['placed']:>4}  "
+                f"best {r['best_ms']:>8.2f} ms  mean {r['mean_ms']:>8.2f} ms"
+            )
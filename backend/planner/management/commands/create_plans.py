@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.models import DayPlan, DayTemplate
+from planner.services.dayplans import ensure_plans, template_for
+
+
+class Command(BaseCommand):
+    help = "Create the day plans of START..END (inclusive) from their day templates; existing plans are kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", help="YYYY-MM-DD")
+        parser.add_argument("end", help="YYYY-MM-DD")
+        parser.add_argument("--template", help="clone this template for every day instead of the weekday/default one")
+
+    def handle(self, *args, **opts):
+        try:
+            start, end = date.fromisoformat(opts["start"]), date.fromisoformat(opts["end"])
+        except ValueError:
+            raise CommandError("Dates look like YYYY-MM-DD")
+        if end < start:
+            raise CommandError("END is before START")
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        try:
+            template_for(start, opts["template"])   # an unknown name is an error even if every day exists
+        except DayTemplate.DoesNotExist as e:
+            raise CommandError(str(e))
+        existing = DayPlan.objects.filter(date__range=(start, end)).count()
+        plans = ensure_plans(days, template=opts["template"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(plans) - existing} plan(s) for {start}..{end} ({existing} already existed)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from planner.services.uploads import STALE_AFTER, expire
+
+
+class Command(BaseCommand):
+    help = f"Delete resumable attachment uploads untouched for {STALE_AFTER} and their partial files."
+
+    def handle(self, *args, **opts):
+        n = expire()
+        self.stdout.write(self.style.SUCCESS(f"Expired {n} stale upload(s)"))
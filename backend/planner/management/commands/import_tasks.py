@@ -0,0 +1,47 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.services.importer import ImportFileError, import_tasks, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import tasks in bulk from a CSV or iCalendar (.ics) file (see planner.services.importer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or .ics file")
+        parser.add_argument("--dry-run", action="store_true", help="validate and report, write nothing")
+        parser.add_argument("--skip-invalid", action="store_true",
+                            help="import the valid rows even if some are not (default: all or nothing)")
+        parser.add_argument("--no-create-groups", action="store_true",
+                            help="reject rows whose group does not exist yet")
+
+    def handle(self, *args, **opts):
+        path = Path(opts["path"])
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        t0 = time.perf_counter()
+        try:
+            report = import_tasks(read_rows(path.name, data), dry_run=opts["dry_run"],
+                                  skip_invalid=opts["skip_invalid"], create_groups=not opts["no_create_groups"])
+        except ImportFileError as e:
+            raise CommandError(str(e))
+        seconds = time.perf_counter() - t0
+
+        for row, field, message in report.errors:
+            self.stderr.write(f"row {row}" + (f" [{field}]" if field else "") + f": {message}")
+        groups = f", {len(report.groups_created)} new group(s)" if report.groups_created else ""
+        if report.dry_run:
+            self.stdout.write(f"Dry run: {report.rows} row(s), {len(report.errors)} error(s){groups}")
+        elif report.errors and not opts["skip_invalid"]:
+            raise CommandError(f"{len(report.errors)} invalid row(s); nothing imported (use --skip-invalid)")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {report.created} task(s), {report.skips} skipped date(s), "
+                f"{report.occurrences} occurrence(s){groups} in {seconds:.2f}s "
+                f"({report.statements} INSERT statements)"
+            ))
@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from planner.services.occurrences import HORIZON_DAYS, rebuild, repair
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or repair) the materialized TaskOccurrence horizon in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                            help="first date (YYYY-MM-DD, default: today)")
+        parser.add_argument("--days", type=int, default=HORIZON_DAYS,
+                            help=f"horizon length in days (default: {HORIZON_DAYS})")
+        parser.add_argument("--repair", action="store_true",
+                            help="only add missing / remove stray rows instead of rewriting")
+
+    def handle(self, *args, **opts):
+        start = opts["start"] or timezone.localdate()
+        through = start + timedelta(days=opts["days"])
+        if opts["repair"]:
+            added, removed = repair(start, through)
+            self.stdout.write(self.style.SUCCESS(
+                f"Repaired {start}..{through}: +{added} / -{removed} occurrences"
+            ))
+        else:
+            n = rebuild(start, through)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {start}..{through}: {n} occurrences"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from planner.models import Blob
+from planner.services.blobs import recount
+
+
+class Command(BaseCommand):
+    help = "Recount Blob references from attachments and drawings; delete unreferenced blobs and their files."
+
+    def handle(self, *args, **opts):
+        deleted = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted {Blob.objects.count()} blob(s); deleted {deleted} unreferenced"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from planner.services.counters import drifted, recount
+
+
+class Command(BaseCommand):
+    help = "Recompute DayPlan.total_items / done_items / planned_minutes from PlanItem in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="only report plans whose counters have drifted")
+
+    def handle(self, *args, **opts):
+        stale = list(drifted().values_list("date", flat=True))
+        if opts["check"]:
+            for d in stale:
+                self.stdout.write(f"drifted: {d}")
+            self.stdout.write(self.style.SUCCESS(f"{len(stale)} plan(s) out of date"))
+            return
+        n = recount()
+        self.stdout.write(self.style.SUCCESS(f"Recounted {n} plans ({len(stale)} had drifted)"))
@@ -0,0 +1,184 @@
+import random
+from datetime import datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from planner.models import (
+    DayPlan, PlanItem, Task, TaskAttachment, TaskChecklistItem, TaskGroup, TaskOccurrence, TaskSkip,
+    OccurrenceHorizon,
+)
+from planner.services import counters, occurrences
+from planner.services.checklist import ORDER_GAP
+from planner.services.dayplans import ensure_plans
+
+DESIRED = [k for k, _ in Task.DESIRED_CHOICES]
+WD = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+# (recurrence, weight): roughly what a real catalog looks like
+RECURRENCE_MIX = [
+    ("none", 40), ("daily", 12), ("weekly", 15), ("weekdays", 8),
+    ("weekends", 5), ("monthly", 12), ("custom", 8),
+]
+RRULES = [
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU",
+    "FREQ=MONTHLY;BYDAY=2TU",
+    "FREQ=MONTHLY;BYDAY=-1FR",
+    "FREQ=MONTHLY;BYMONTHDAY=1,15",
+    "FREQ=DAILY;INTERVAL=3",
+    "FREQ=YEARLY;BYMONTH=3,9;BYMONTHDAY=1",
+]
+ATTACHMENT_KINDS = [("jpg", "image/jpeg"), ("png", "image/png"), ("m4a", "audio/mp4"), ("mp4", "video/mp4")]
+DAY_START, DAY_END = 6 * 60, 22 * 60   # between the seeded sleep blocks
+
+
+def _task(rnd, i, group, today):
+    rec = rnd.choices([r for r, _ in RECURRENCE_MIX], [w for _, w in RECURRENCE_MIX])[0]
+    t = Task(
+        title=f"Task {i}", group=group,
+        duration_min=rnd.choice([5, 10, 15, 20, 30, 45, 60, 90]),
+        priority=rnd.randint(1, 5),
+        desired_time=rnd.choice(DESIRED),
+        recurrence=rec,
+        recur_interval=rnd.choice([1, 1, 1, 2, 3]),
+        active=rnd.random() < 0.9,
+    )
+    if rec != "none" or rnd.random() < 0.5:
+        t.start_date = today - timedelta(days=rnd.randint(0, 1000))
+        if rnd.random() < 0.15:
+            t.end_date = t.start_date + timedelta(days=rnd.randint(30, 1500))
+    if rec == "weekly":
+        t.recur_weekdays = ",".join(sorted(rnd.sample(WD, rnd.randint(1, 3)), key=WD.index))
+    elif rec == "monthly":
+        t.recur_monthday = rnd.randint(1, 28)
+    elif rec == "custom":
+        t.rrule_text = rnd.choice(RRULES)
+    if rec == "none" and rnd.random() < 0.5:
+        due = today + timedelta(days=rnd.randint(-30, 60))
+        if rnd.random() < 0.5:
+            t.deadline = due
+        else:
+            t.deadline_at = datetime.combine(due, dtime(rnd.randint(8, 21), rnd.choice([0, 30])),
+                                             timezone.get_current_timezone())
+    t.description_type = rnd.choices(["none", "text", "check", "attachments"], [40, 20, 25, 15])[0]
+    if t.description_type == "text":
+        t.description_text = f"Notes for task {i}"
+    return t
+
+
+def _day_items(rnd, plan, tasks, past, per_day):
+    """Non-overlapping items packed between the sleep blocks."""
+    out = []
+    cur = DAY_START + rnd.choice([0, 15, 30])
+    for order in range(1, per_day + 1):
+        task = rnd.choice(tasks)
+        end = cur + task.duration_min
+        if end > DAY_END:
+            break
+        out.append(PlanItem(
+            plan=plan, task=task, group_name=task.group.name,
+            start_min=cur, end_min=end, order=order,
+            done=past and rnd.random() < 0.7, auto=rnd.random() < 0.3,
+        ))
+        cur = end + rnd.choice([0, 0, 5, 15, 30])
+    return out
+
+
+def generate(tasks=2000, days=730, per_day=12, seed=0, stdout=None):
+    """Fill the planner tables with a reproducible synthetic catalog and history.
+
+    `days` of DayPlans end a week after today. Returns row counts per model.
+    """
+    rnd = random.Random(seed)
+    today = timezone.localdate()
+    say = stdout.write if stdout else (lambda msg: None)
+
+    with transaction.atomic():
+        groups = TaskGroup.objects.bulk_create(
+            [TaskGroup(name=f"Synthetic group {g}") for g in range(max(tasks // 40, 1))]
+        )
+        catalog = Task.objects.bulk_create(
+            [_task(rnd, i, rnd.choice(groups), today) for i in range(tasks)], batch_size=500
+        )
+        say(f"  {len(catalog)} tasks in {len(groups)} groups")
+
+        checks, files, skips = [], [], []
+        for t in catalog:
+            if t.recurrence != "none" and rnd.random() < 0.3:
+                skips += [
+                    TaskSkip(task=t, date=d)
+                    for d in {today + timedelta(days=rnd.randint(-60, 60)) for _ in range(rnd.randint(1, 6))}
+                ]
+            if t.description_type == "check":
+                checks += [
+                    TaskChecklistItem(task=t, text=f"Step {k}", order=k * ORDER_GAP, done=rnd.random() < 0.3)
+                    for k in range(rnd.randint(2, 8))
+                ]
+            elif t.description_type == "attachments":
+                for k in range(rnd.randint(1, 4)):
+                    ext, ct = rnd.choice(ATTACHMENT_KINDS)
+                    files.append(TaskAttachment(
+                        task=t, file=f"task_attachments/synthetic/{t.pk}-{k}.{ext}",
+                        original_name=f"file-{k}.{ext}", content_type=ct,
+                        size=rnd.randint(10_000, 20_000_000),
+                    ))
+        TaskChecklistItem.objects.bulk_create(checks, batch_size=2000)
+        TaskAttachment.objects.bulk_create(files, batch_size=2000)
+        TaskSkip.objects.bulk_create(skips, batch_size=2000)
+        say(f"  {len(checks)} checklist items, {len(files)} attachments, {len(skips)} skipped dates")
+
+        first = today - timedelta(days=days - 8)
+        plans = ensure_plans(first + timedelta(days=k) for k in range(days))
+        active = [t for t in catalog if t.active]
+        items = [
+            it for d, plan in sorted(plans.items())
+            for it in _day_items(rnd, plan, active, d < today, per_day)
+        ]
+        PlanItem.objects.bulk_create(items, batch_size=2000)
+        counters.recount()
+        say(f"  {len(plans)} day plans, {len(items)} planned items")
+
+        occurrences.rebuild(today, today + timedelta(days=occurrences.HORIZON_DAYS))
+
+    return {
+        "groups": TaskGroup.objects.count(),
+        "tasks": Task.objects.count(),
+        "checklist_items": TaskChecklistItem.objects.count(),
+        "attachments": TaskAttachment.objects.count(),
+        "skips": TaskSkip.objects.count(),
+        "day_plans": DayPlan.objects.count(),
+        "plan_items": PlanItem.objects.count(),
+        "occurrences": TaskOccurrence.objects.count(),
+    }
+
+
+def flush():
+    """Delete every planner row but the day templates and their tasks (plan items first: they PROTECT their tasks)."""
+    with transaction.atomic():
+        for model in (PlanItem, DayPlan, TaskOccurrence, OccurrenceHorizon):
+            model.objects.all().delete()
+        Task.objects.filter(template_items__isnull=True).delete()
+        TaskGroup.objects.filter(tasks__isnull=True).delete()
+
+
+class Command(BaseCommand):
+    help = "Fill the planner with reproducible synthetic tasks, recurrences and years of day plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=2000, help="tasks to create (default: 2000)")
+        parser.add_argument("--days", type=int, default=730, help="days of plans, ending a week from today (default: 730)")
+        parser.add_argument("--per-day", type=int, default=12, help="max items per day besides sleep (default: 12)")
+        parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+        parser.add_argument("--flush", action="store_true", help="delete all existing planner data first")
+
+    def handle(self, *args, **opts):
+        if opts["flush"]:
+            flush()
+        elif Task.objects.filter(template_items__isnull=True).exists():
+            raise CommandError("The planner already has tasks; pass --flush to replace them.")
+        counts = generate(opts["tasks"], opts["days"], opts["per_day"], opts["seed"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items())
+        ))
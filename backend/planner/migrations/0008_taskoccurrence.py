@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_alter_task_description_type_taskattachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccurrenceHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='planner.task')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'task'), name='planner_occurrence_date_task')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_taskoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planitem',
+            name='auto',
+            field=models.BooleanField(default=False),
+        ),
+    ]
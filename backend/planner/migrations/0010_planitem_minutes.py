@@ -0,0 +1,101 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def _to_min(hhmm, end=False):
+    try:
+        h, m = map(int, (hhmm or "").split(":"))
+    except ValueError:
+        return 0
+    total = h * 60 + m
+    return 24 * 60 if end and total == 0 else total
+
+
+def _batches(PlanItem, fields):
+    """Walk PlanItems by primary key, BATCH_SIZE rows at a time."""
+    last = 0
+    while True:
+        batch = list(PlanItem.objects.filter(pk__gt=last).order_by("pk").only(*fields)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def hhmm_to_minutes(apps, schema_editor):
+    PlanItem = apps.get_model("planner", "PlanItem")
+    for batch in _batches(PlanItem, ["start_hhmm", "end_hhmm"]):
+        for it in batch:
+            it.start_min = _to_min(it.start_hhmm)
+            it.end_min = _to_min(it.end_hhmm, end=True)
+        PlanItem.objects.bulk_update(batch, ["start_min", "end_min"])
+
+
+def minutes_to_hhmm(apps, schema_editor):
+    PlanItem = apps.get_model("planner", "PlanItem")
+    for batch in _batches(PlanItem, ["start_min", "end_min"]):
+        for it in batch:
+            it.start_hhmm = f"{it.start_min // 60 % 24:02d}:{it.start_min % 60:02d}"
+            it.end_hhmm = f"{it.end_min // 60 % 24:02d}:{it.end_min % 60:02d}"
+        PlanItem.objects.bulk_update(batch, ["start_hhmm", "end_hhmm"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0009_planitem_auto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planitem',
+            name='start_min',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='planitem',
+            name='end_min',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # nullable while both representations exist, so the migration can be reversed
+        migrations.AlterField(
+            model_name='planitem',
+            name='start_hhmm',
+            field=models.CharField(max_length=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='planitem',
+            name='end_hhmm',
+            field=models.CharField(max_length=5, null=True),
+        ),
+        migrations.RunPython(hhmm_to_minutes, minutes_to_hhmm),
+        migrations.AlterField(
+            model_name='planitem',
+            name='start_min',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='planitem',
+            name='end_min',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterModelOptions(
+            name='planitem',
+            options={'ordering': ['start_min', 'order']},
+        ),
+        migrations.RemoveField(
+            model_name='planitem',
+            name='start_hhmm',
+        ),
+        migrations.RemoveField(
+            model_name='planitem',
+            name='end_hhmm',
+        ),
+        migrations.AddIndex(
+            model_name='planitem',
+            index=models.Index(fields=['plan', 'start_min'], name='planner_item_plan_start'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    DayPlan = apps.get_model("planner", "DayPlan")
+    PlanItem = apps.get_model("planner", "PlanItem")
+    items = PlanItem.objects.filter(plan=OuterRef("pk")).order_by().values("plan")
+
+    def agg(expr):
+        return Coalesce(Subquery(items.annotate(v=expr).values("v"), output_field=IntegerField()), 0)
+
+    DayPlan.objects.update(
+        total_items=agg(Count("id")),
+        done_items=agg(Count("id", filter=Q(done=True))),
+        planned_minutes=agg(Sum(F("end_min") - F("start_min"))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0010_planitem_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dayplan',
+            name='done_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dayplan',
+            name='planned_minutes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dayplan',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
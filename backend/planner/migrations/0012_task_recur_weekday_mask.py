@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+
+def text_to_mask(apps, schema_editor):
+    Task = apps.get_model("planner", "Task")
+    changed = []
+    for t in Task.objects.exclude(recur_weekdays="").only("id", "recur_weekdays").iterator(chunk_size=2000):
+        codes = {x.strip().upper() for x in t.recur_weekdays.split(",")}
+        t.recur_weekday_mask = sum(1 << i for i, c in enumerate(CODES) if c in codes)
+        changed.append(t)
+    Task.objects.bulk_update(changed, ["recur_weekday_mask"], batch_size=2000)
+
+
+def mask_to_text(apps, schema_editor):
+    Task = apps.get_model("planner", "Task")
+    changed = []
+    for t in Task.objects.exclude(recur_weekday_mask=0).only("id", "recur_weekday_mask").iterator(chunk_size=2000):
+        t.recur_weekdays = ",".join(c for i, c in enumerate(CODES) if t.recur_weekday_mask >> i & 1)
+        changed.append(t)
+    Task.objects.bulk_update(changed, ["recur_weekdays"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_dayplan_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='recur_weekday_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(text_to_mask, mask_to_text),
+        migrations.RemoveField(
+            model_name='task',
+            name='recur_weekdays',
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:10
+
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def json_to_rows(apps, schema_editor):
+    Task = apps.get_model("planner", "Task")
+    TaskSkip = apps.get_model("planner", "TaskSkip")
+    rows = []
+    for pk, skips in Task.objects.exclude(skip_dates=[]).values_list("id", "skip_dates").iterator(chunk_size=2000):
+        days = set()
+        for s in skips or []:
+            try:
+                d = date.fromisoformat(s)
+            except (TypeError, ValueError):
+                continue
+            if str(d) == s:   # occurs_on only ever matched exact "YYYY-MM-DD" strings
+                days.add(d)
+        rows += [TaskSkip(task_id=pk, date=d) for d in days]
+    TaskSkip.objects.bulk_create(rows, batch_size=2000)
+
+
+def rows_to_json(apps, schema_editor):
+    Task = apps.get_model("planner", "Task")
+    TaskSkip = apps.get_model("planner", "TaskSkip")
+    by_task = {}
+    for pk, d in TaskSkip.objects.order_by("task_id", "date").values_list("task_id", "date").iterator(chunk_size=2000):
+        by_task.setdefault(pk, []).append(str(d))
+    tasks = list(Task.objects.filter(pk__in=by_task).only("id"))
+    for t in tasks:
+        t.skip_dates = by_task[t.pk]
+    Task.objects.bulk_update(tasks, ["skip_dates"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0012_task_recur_weekday_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSkip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skips', to='planner.task')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('task', 'date'), name='planner_skip_task_date')],
+            },
+        ),
+        migrations.RunPython(json_to_rows, rows_to_json),
+        migrations.RemoveField(
+            model_name='task',
+            name='skip_dates',
+        ),
+    ]
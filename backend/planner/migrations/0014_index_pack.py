@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0013_taskskip'),
+    ]
+
+    # new indexes first, so the columns are never unindexed in between
+    operations = [
+        migrations.AlterModelOptions(
+            name='planitem',
+            options={'ordering': ['start_min', 'end_min', 'order']},
+        ),
+        migrations.AddIndex(
+            model_name='planitem',
+            index=models.Index(fields=['plan', 'start_min', 'end_min', 'order'], name='planner_item_plan_chrono'),
+        ),
+        migrations.AddIndex(
+            model_name='planitem',
+            index=models.Index(fields=['task', 'plan'], name='planner_item_task_plan'),
+        ),
+        migrations.RemoveIndex(
+            model_name='planitem',
+            name='planner_item_plan_start',
+        ),
+        migrations.AlterField(
+            model_name='planitem',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='planner.task'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('active', True), ('deadline_at__isnull', False)), fields=['deadline_at'], name='planner_task_due_active'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('active', True)), fields=['-priority', 'duration_min'], name='planner_task_active_rank'),
+        ),
+    ]
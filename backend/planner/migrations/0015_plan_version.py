@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0014_index_pack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dayplan',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='taskgroup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
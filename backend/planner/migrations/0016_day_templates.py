@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def sleep_template(apps, schema_editor):
+    """The default template: the two sleep blocks that used to be hard-coded into every new plan."""
+    TaskGroup = apps.get_model("planner", "TaskGroup")
+    Task = apps.get_model("planner", "Task")
+    DayTemplate = apps.get_model("planner", "DayTemplate")
+    DayTemplateItem = apps.get_model("planner", "DayTemplateItem")
+    group, _ = TaskGroup.objects.get_or_create(name="Necessities")
+    common = dict(group=group, priority=5, desired_time="night", recurrence="daily", active=True,
+                  description_type="none")
+    deep, _ = Task.objects.get_or_create(title="Deep Sleep", defaults=dict(duration_min=360, **common))
+    light, _ = Task.objects.get_or_create(title="Light Sleep", defaults=dict(duration_min=120, **common))
+    template = DayTemplate.objects.create(name="Default", is_default=True)
+    DayTemplateItem.objects.bulk_create([
+        DayTemplateItem(template=template, task=deep, start_min=0, end_min=6 * 60, order=0),
+        DayTemplateItem(template=template, task=light, start_min=22 * 60, end_min=24 * 60, order=999),
+    ])
+
+
+def drop_templates(apps, schema_editor):
+    apps.get_model("planner", "DayTemplate").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0015_plan_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120, unique=True)),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], null=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('weekday__isnull', False)), fields=('weekday',), name='planner_template_weekday'), models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='planner_template_default')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DayTemplateItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_min', models.PositiveSmallIntegerField()),
+                ('end_min', models.PositiveSmallIntegerField()),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='template_items', to='planner.task')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='planner.daytemplate')),
+            ],
+            options={
+                'ordering': ['start_min', 'end_min', 'order'],
+            },
+        ),
+        migrations.RunPython(sleep_template, drop_templates),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0016_day_templates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dayplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
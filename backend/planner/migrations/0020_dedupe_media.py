@@ -0,0 +1,95 @@
+"""Move existing attachment and drawing files into the blob store (planner.services.blobs).
+
+Rows are handled BATCH at a time, each batch in its own transaction: every
+file is hashed in chunks, the first copy of each content is copied to its
+blob name, and the rows are pointed at the blob with one bulk_update. The
+old files (moved or duplicate) are deleted only after their batch commits,
+so an interrupted run can simply be re-run; rows already on a blob are
+skipped. Rows whose file cannot be read keep their path and no blob.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH = 200
+CHUNK_SIZE = 64 * 1024
+
+
+def _blob_name(sha256, original_name):
+    # frozen copy of services.blobs.blob_name
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext if len(ext) <= 10 else ''}"
+
+
+def _hash(name):
+    h, size = hashlib.sha256(), 0
+    with default_storage.open(name, "rb") as f:
+        for chunk in f.chunks(CHUNK_SIZE):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+def dedupe(apps, schema_editor):
+    Blob = apps.get_model("planner", "Blob")
+    for model_name, field in (("TaskAttachment", "file"), ("TaskDrawing", "image")):
+        model = apps.get_model("planner", model_name)
+        update = ["blob", field] + (["sha256"] if model_name == "TaskAttachment" else [])
+        rows = model.objects.filter(blob__isnull=True).exclude(**{field: ""}).order_by("pk")
+        last = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last)[:BATCH])
+            if not batch:
+                break
+            last = batch[-1].pk
+            obsolete, changed = set(), []
+            with transaction.atomic():
+                for row in batch:
+                    name = getattr(row, field).name
+                    try:
+                        sha256, size = _hash(name)
+                    except (OSError, ValueError):
+                        continue
+                    blob = Blob.objects.filter(sha256=sha256).first()
+                    if blob is None:
+                        target = _blob_name(sha256, name)
+                        if not default_storage.exists(target):
+                            with default_storage.open(name, "rb") as f:
+                                target = default_storage.save(target, f)
+                        blob = Blob.objects.create(sha256=sha256, file=target, size=size)
+                    if name != blob.file.name:
+                        obsolete.add(name)
+                    row.blob = blob
+                    setattr(row, field, blob.file.name)
+                    if "sha256" in update:
+                        row.sha256 = sha256
+                    changed.append(row)
+                model.objects.bulk_update(changed, update)
+            # rows not yet migrated may still name the same file (a row copied by hand, say)
+            still_used = set(rows.filter(**{f"{field}__in": obsolete}).values_list(field, flat=True))
+            for name in obsolete - still_used:
+                default_storage.delete(name)
+
+    def refs(model_name):
+        model = apps.get_model("planner", model_name)
+        return Coalesce(Subquery(
+            model.objects.filter(blob=OuterRef("pk")).values("blob").annotate(n=Count("*")).values("n"),
+            output_field=IntegerField(),
+        ), Value(0))
+    Blob.objects.update(refcount=refs("TaskAttachment") + refs("TaskDrawing"))
+
+
+class Migration(migrations.Migration):
+    atomic = False   # one transaction per batch
+
+    dependencies = [
+        ('planner', '0019_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+    ]
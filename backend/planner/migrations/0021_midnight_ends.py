@@ -0,0 +1,40 @@
+"""The seeded Light Sleep block (22:00-"23:59") meant "until midnight": store its 1439 end as 1440.
+
+Only that block is rewritten, in plans and templates. An end the user typed
+as 23:59 means 23:59 and is left alone.
+"""
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F
+
+OLD_START, OLD_END, MIDNIGHT = 22 * 60, 24 * 60 - 1, 24 * 60
+LIGHT_SLEEP = dict(task__title="Light Sleep", start_min=OLD_START, end_min=OLD_END)
+
+
+def midnight_ends(apps, schema_editor):
+    PlanItem = apps.get_model("planner", "PlanItem")
+    DayPlan = apps.get_model("planner", "DayPlan")
+    DayTemplateItem = apps.get_model("planner", "DayTemplateItem")
+
+    # each moved end adds a minute to its plan's planned_minutes
+    by_count = defaultdict(list)
+    for row in PlanItem.objects.filter(**LIGHT_SLEEP).values("plan").annotate(n=Count("id")):
+        by_count[row["n"]].append(row["plan"])
+    for n, plan_ids in by_count.items():
+        DayPlan.objects.filter(pk__in=plan_ids).update(
+            planned_minutes=F("planned_minutes") + n, version=F("version") + 1)
+    PlanItem.objects.filter(**LIGHT_SLEEP).update(end_min=MIDNIGHT)
+    DayTemplateItem.objects.filter(**LIGHT_SLEEP).update(end_min=MIDNIGHT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0020_dedupe_media'),
+    ]
+
+    operations = [
+        # the seeded blocks created since also end at 1440, so there is nothing to tell apart going back
+        migrations.RunPython(midnight_ends, migrations.RunPython.noop),
+    ]
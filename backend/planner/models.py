@@ -1,13 +1,81 @@
 from django.db import models
+from django.db.models.functions import (
+    Coalesce, ExtractDay, ExtractMonth, ExtractYear, Greatest, Mod, NullIf,
+)
 from django.utils import timezone
 
 class TaskGroup(models.Model):
     name = models.CharField(max_length=120, unique=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+WEEKDAY_CODES = ["MO","TU","WE","TH","FR","SA","SU"]
+
+def weekday_mask(text) -> int:
+    """"MO,we" -> 0b101 (bit 0 = Monday). Unknown codes are ignored; 0 means no restriction."""
+    codes = {x.strip().upper() for x in (text or "").split(",")}
+    return sum(1 << i for i, c in enumerate(WEEKDAY_CODES) if c in codes)
+
+def weekday_text(mask) -> str:
+    return ",".join(c for i, c in enumerate(WEEKDAY_CODES) if mask >> i & 1)
+
+
+class DayNumber(models.Func):
+    """Days since a fixed epoch for a date expression, so date differences are plain integers."""
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return self.as_sql(compiler, connection, template="CAST(julianday(%(expressions)s) AS INTEGER)", **extra)
+
+    def as_postgresql(self, compiler, connection, **extra):
+        return self.as_sql(compiler, connection, template="(%(expressions)s - DATE '1970-01-01')", **extra)
+
+    def as_mysql(self, compiler, connection, **extra):
+        return self.as_sql(compiler, connection, function="TO_DAYS", **extra)
+
+
+class TaskQuerySet(models.QuerySet):
+    def occurring_on(self, d):
+        """Tasks whose recurrence includes `d`, decided in SQL (same answers as services.recurrence.occurs_on).
+
+        Custom RRULEs cannot be expressed as a filter; they are looked up in the
+        materialized TaskOccurrence rows, so `d` must be inside the horizon for them.
+        """
+        no_start = models.Q(start_date__isnull=True)
+        interval = Greatest(models.F("recur_interval"), 1)
+        days = DayNumber(models.Value(d, output_field=models.DateField())) - DayNumber("start_date")
+        months = (d.year - ExtractYear("start_date")) * 12 + (d.month - ExtractMonth("start_date"))
+        dom = Coalesce(NullIf("recur_monthday", 0), ExtractDay("start_date"), d.day)
+        weekday = 1 << d.weekday()
+
+        rules = models.Q(recurrence="none")
+        rules |= models.Q(recurrence="daily") & (no_start | models.Q(_days__gte=0, _days_mod=0))
+        rules |= models.Q(recurrence="weekdays" if d.weekday() < 5 else "weekends")
+        rules |= models.Q(recurrence="weekly") & (no_start | (
+            models.Q(_days__gte=0, _weeks_mod=0)
+            & (models.Q(recur_weekday_mask=0) | models.Q(_on_weekday__gt=0))
+        ))
+        rules |= models.Q(recurrence="monthly", _dom=d.day) & (no_start | models.Q(_months__gte=0, _months_mod=0))
+        rules |= models.Q(recurrence="custom") & models.Q(models.Exists(
+            TaskOccurrence.objects.filter(task=models.OuterRef("pk"), date=d)
+        ))
+
+        return (
+            self.alias(
+                _days=days, _days_mod=Mod(days, interval), _weeks_mod=Mod(days / 7, interval),
+                _on_weekday=models.F("recur_weekday_mask").bitand(weekday),
+                _months=months, _months_mod=Mod(months, interval), _dom=dom,
+            )
+            .filter(no_start | models.Q(start_date__lte=d))
+            .filter(models.Q(end_date__isnull=True) | models.Q(end_date__gte=d))
+            .exclude(models.Exists(TaskSkip.objects.filter(task=models.OuterRef("pk"), date=d)))
+            .filter(rules)
+        )
+
+
 class Task(models.Model):
     DESIRED_CHOICES = [
         ("early_morning","Early morning"),
@@ -36,12 +104,11 @@ class Task(models.Model):
     ]
     recurrence = models.CharField(max_length=16, choices=RECURRENCE, default="none")
     recur_interval = models.PositiveIntegerField(default=1)             # every N days/weeks/months
-    recur_weekdays = models.CharField(max_length=20, blank=True)        # e.g. "MO,TU,WE"
+    recur_weekday_mask = models.PositiveSmallIntegerField(default=0)    # bit 0 = Monday; 0 = any day (see recur_weekdays)
     recur_monthday = models.PositiveIntegerField(null=True, blank=True) # 1..31
     start_date = models.DateField(null=True, blank=True)
     end_date   = models.DateField(null=True, blank=True)
-    skip_dates = models.JSONField(default=list, blank=True)             # ["2025-09-10", ...]
-    rrule_text = models.CharField(max_length=160, blank=True)           # for "custom" if you want later
+    rrule_text = models.CharField(max_length=160, blank=True)           # RFC 5545 RRULE for "custom" (services/rrule.py)
     DESC_TYPES = [
         ("none","None"),
         ("text","Plain text"),
@@ -51,11 +118,47 @@ class Task(models.Model):
     ]
     description_type = models.CharField(max_length=15, choices=DESC_TYPES, default="none")
     description_text = models.TextField(blank=True, default="")  # used when description_type="text"
+    updated_at = models.DateTimeField(auto_now=True)   # catalog ETag (planner.api); set it in .update() calls too
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # services.horizon.unscheduled_due
+            models.Index(fields=["deadline_at"], name="planner_task_due_active",
+                         condition=models.Q(active=True, deadline_at__isnull=False)),
+            # agenda_edit drawer ordering
+            models.Index(fields=["-priority", "duration_min"], name="planner_task_active_rank",
+                         condition=models.Q(active=True)),
+        ]
 
     def __str__(self):
         return self.title
 
+    # "MO,TU,WE" view of recur_weekday_mask, for forms and constructors
+    @property
+    def recur_weekdays(self):
+        return weekday_text(self.recur_weekday_mask)
+
+    @recur_weekdays.setter
+    def recur_weekdays(self, text):
+        self.recur_weekday_mask = weekday_mask(text)
+
+
+class TaskSkip(models.Model):
+    """A date a recurring task does not occur on."""
+    task = models.ForeignKey(Task, related_name="skips", on_delete=models.CASCADE)
+    date = models.DateField()
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(fields=["task", "date"], name="planner_skip_task_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} skips {self.date}"
+
 
 class TaskChecklistItem(models.Model):
     task = models.ForeignKey(Task, related_name="check_items", on_delete=models.CASCADE)
@@ -74,6 +177,9 @@ class TaskDrawing(models.Model):
         upload_to="task_drawings/%Y/%m/%d",
         validators=[FileExtensionValidator(["png"])],
     )
+    # image.name is the blob's file (services.blobs); null only for files the dedupe migration could not read.
+    # Blobs are deleted by refcount, never by cascade: the FK constraint refuses one still in use.
+    blob = models.ForeignKey("Blob", null=True, blank=True, related_name="drawings", on_delete=models.DO_NOTHING)
     title = models.CharField(max_length=120, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -87,25 +193,121 @@ class TaskDrawing(models.Model):
 class DayPlan(models.Model):
     date = models.DateField(default=timezone.localdate, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # maintained by services.counters; repair with manage.py repair_plan_counters
+    total_items = models.PositiveIntegerField(default=0)
+    done_items = models.PositiveIntegerField(default=0)
+    planned_minutes = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=0)   # +1 on every item write (services.counters.adjust)
+    updated_at = models.DateTimeField(auto_now=True)   # set with version by counters.adjust (.update() skips auto_now)
 
     def __str__(self):
         return f"Plan {self.date}"
 
+MIDNIGHT = 24 * 60
+
+def hhmm_to_min(hhmm: str, end=False) -> int:
+    h, m = map(int, hhmm.split(":"))
+    total = h * 60 + m
+    return MIDNIGHT if end and total == 0 else total   # "00:00" as an end means midnight
+
+def min_to_hhmm(total: int) -> str:
+    return f"{total // 60 % 24:02d}:{total % 60:02d}"   # midnight (1440) shows as "00:00"
+
+
+class PlanItemQuerySet(models.QuerySet):
+    def chronological(self):
+        return self.order_by("start_min", "end_min", "order", "id")   # walks planner_item_plan_chrono
+
+    def starting_from(self, minute):
+        return self.filter(start_min__gte=minute)
+
+    def overlapping(self, start, end):
+        """Items sharing at least one minute with [start, end)."""
+        return self.filter(start_min__lt=end, end_min__gt=start)
+
+    def with_overlaps(self):
+        """Items that collide with another item of the same plan."""
+        others = PlanItem.objects.filter(
+            plan=models.OuterRef("plan"),
+            start_min__lt=models.OuterRef("end_min"),
+            end_min__gt=models.OuterRef("start_min"),
+        ).exclude(pk=models.OuterRef("pk"))
+        return self.filter(models.Exists(others))
+
+
 class PlanItem(models.Model):
     plan = models.ForeignKey(DayPlan, on_delete=models.CASCADE, related_name="items")
-    task = models.ForeignKey(Task, on_delete=models.PROTECT)
+    task = models.ForeignKey(Task, on_delete=models.PROTECT, db_index=False)   # covered by planner_item_task_plan
     group_name = models.CharField(max_length=120)  # denormalized for display
-    start_hhmm = models.CharField(max_length=5)    # "09:00"
-    end_hhmm = models.CharField(max_length=5)
+    start_min = models.PositiveSmallIntegerField()  # minutes after 00:00 (540 = 09:00)
+    end_min = models.PositiveSmallIntegerField()    # exclusive; 1440 = midnight
     done = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    auto = models.BooleanField(default=False)      # placed by services.scheduler / services.horizon
+
+    objects = PlanItemQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["start_min", "end_min", "order"]   # = chronological(), served by planner_item_plan_chrono
+        indexes = [
+            models.Index(fields=["plan", "start_min", "end_min", "order"], name="planner_item_plan_chrono"),
+            models.Index(fields=["task", "plan"], name="planner_item_task_plan"),
+        ]
+
+    # "HH:MM" for templates
+    @property
+    def start_hhmm(self):
+        return min_to_hhmm(self.start_min)
+
+    @property
+    def end_hhmm(self):
+        return min_to_hhmm(self.end_min)
+
+
+class DayTemplate(models.Model):
+    """The items a new DayPlan starts with (services.dayplans).
+
+    A plan takes the template of its weekday, else the default one; named
+    templates without either are applied on request (manage.py create_plans).
+    """
+    WEEKDAY_CHOICES = [(i, name) for i, name in enumerate(
+        ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])]
+
+    name = models.CharField(max_length=120, unique=True)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, null=True, blank=True)
+    is_default = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+        constraints = [
+            models.UniqueConstraint(fields=["weekday"], condition=models.Q(weekday__isnull=False),
+                                    name="planner_template_weekday"),
+            models.UniqueConstraint(fields=["is_default"], condition=models.Q(is_default=True),
+                                    name="planner_template_default"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class DayTemplateItem(models.Model):
+    template = models.ForeignKey(DayTemplate, related_name="items", on_delete=models.CASCADE)
+    task = models.ForeignKey(Task, related_name="template_items", on_delete=models.CASCADE)
+    start_min = models.PositiveSmallIntegerField()
+    end_min = models.PositiveSmallIntegerField()
+    order = models.PositiveIntegerField(default=0)
 
     class Meta:
-        ordering = ["start_hhmm", "order"]
+        ordering = ["start_min", "end_min", "order"]
+
+    def __str__(self):
+        return f"{self.task_id} {min_to_hhmm(self.start_min)}-{min_to_hhmm(self.end_min)}"
 
 
 
 import mimetypes
+import uuid
 from django.core.validators import FileExtensionValidator
 
 def _guess_ct(path):
@@ -127,6 +329,9 @@ class TaskAttachment(models.Model):
     original_name = models.CharField(max_length=255, blank=True, default="")
     content_type = models.CharField(max_length=80, blank=True, default="")
     size = models.PositiveIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default="")   # hex digest, computed while receiving
+    # file.name is the blob's file (services.blobs), shared by every attachment of the same bytes
+    blob = models.ForeignKey("Blob", null=True, blank=True, related_name="attachments", on_delete=models.DO_NOTHING)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -150,3 +355,49 @@ class TaskAttachment(models.Model):
             try: self.size = self.file.size
             except Exception: pass
         super().save(*args, **kwargs)
+
+
+class TaskOccurrence(models.Model):
+    """Materialized recurrence: one row per day a task occurs (see services.occurrences)."""
+    date = models.DateField()
+    task = models.ForeignKey(Task, related_name="occurrences", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "task"], name="planner_occurrence_date_task"),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} on {self.date}"
+
+class OccurrenceHorizon(models.Model):
+    """Single row: TaskOccurrence is complete for every task up to `through`."""
+    through = models.DateField()
+
+
+class AttachmentUpload(models.Model):
+    """A resumable upload in progress (services.uploads); becomes a TaskAttachment when `offset` reaches `size`."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(Task, related_name="uploads", on_delete=models.CASCADE)
+    original_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=80, blank=True, default="")
+    size = models.PositiveBigIntegerField()                 # declared by the client up front
+    offset = models.PositiveBigIntegerField(default=0)      # bytes committed to the partial file
+    sha256 = models.CharField(max_length=64, blank=True, default="")   # expected digest, if the client sent one
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.original_name} {self.offset}/{self.size}"
+
+
+class Blob(models.Model):
+    """One stored file per distinct content (services.blobs); `refcount` counts the rows pointing at it."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=200)   # blobs/ab/cd/<sha256><ext>
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} x{self.refcount}"
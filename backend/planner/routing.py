@@ -0,0 +1,7 @@
+from django.urls import re_path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r"ws/agenda/(?P<day>today|\d{4}-\d{2}-\d{2})/$", consumers.PlanConsumer.as_asgi()),
+]
@@ -0,0 +1,109 @@
+"""Content-addressed storage for attachment and drawing files.
+
+Every distinct content is stored once, as a Blob named by its SHA-256
+(blobs/ab/cd/<sha256><ext>). TaskAttachment.file and TaskDrawing.image hold
+the blob's file name, so templates and URLs are unchanged, and `blob` points
+at the row whose `refcount` counts them.
+
+store() takes one reference: an UPDATE ... refcount + 1 when the content is
+known, else it writes the file (a move, for files that have a
+temporary_file_path) and inserts the Blob. A new Blob always gets a file of
+its own, under a suffixed name if an old one is still there, so the
+collector can never delete a file a live row points to. Deleting an attachment or drawing
+releases its reference (planner.signals). Releases are buffered per
+transaction (services.oncommit) and applied after commit with one
+UPDATE per distinct count. The files of blobs left with no reference are then
+deleted. A crash in between leaves refcounts too high, never too low:
+manage.py repair_blobs recounts them from the rows and collects the rest.
+"""
+import hashlib
+import os
+from collections import Counter, defaultdict
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from ..models import Blob, TaskAttachment, TaskDrawing
+from . import oncommit
+
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(sha256, original_name=""):
+    ext = os.path.splitext(original_name)[1].lower()
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext if len(ext) <= 10 else ''}"
+
+
+def digest(content):
+    """SHA-256 of a django File, read in chunks."""
+    h = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def store(content, original_name, sha256=None) -> Blob:
+    """The Blob holding `content` (a django File), with one more reference; bytes are written only if new."""
+    sha256 = sha256 or digest(content)
+    if Blob.objects.filter(sha256=sha256).update(refcount=F("refcount") + 1):
+        return Blob.objects.get(sha256=sha256)
+    # never adopt a file already at blob_name(): it may belong to a blob being collected
+    name = default_storage.save(blob_name(sha256, original_name), content)
+    try:
+        with transaction.atomic():
+            return Blob.objects.create(sha256=sha256, file=name, size=content.size, refcount=1)
+    except IntegrityError:   # the same bytes were stored concurrently
+        default_storage.delete(name)
+        Blob.objects.filter(sha256=sha256).update(refcount=F("refcount") + 1)
+        return Blob.objects.get(sha256=sha256)
+
+
+class _Pending(Counter):
+    def flush(self):
+        collect(self)
+
+
+def release(blob_id):
+    """Drop one reference to the blob, once the current transaction commits."""
+    def add(pending):
+        pending[blob_id] += 1
+    oncommit.record("blob_release", _Pending, add)
+
+
+def collect(released):
+    """Apply a Counter of blob id -> references dropped; delete the blobs (and files) left unreferenced."""
+    by_count = defaultdict(list)
+    for blob_id, n in released.items():
+        by_count[n].append(blob_id)
+    for n, ids in by_count.items():
+        Blob.objects.filter(pk__in=ids).update(refcount=F("refcount") - n)
+    _delete_unreferenced(Blob.objects.filter(pk__in=list(released), refcount=0))
+
+
+def _delete_unreferenced(blobs):
+    dead = {b.pk: b.file.name for b in blobs.only("id", "file")}
+    if not dead:
+        return 0
+    Blob.objects.filter(pk__in=list(dead), refcount=0).delete()
+    # a blob referenced again between the SELECT and the DELETE keeps its file
+    kept = set(Blob.objects.filter(pk__in=list(dead)).values_list("pk", flat=True))
+    for pk, name in dead.items():
+        if pk not in kept:
+            default_storage.delete(name)
+    return len(dead) - len(kept)
+
+
+def recount():
+    """Set every refcount from the rows pointing at the blob (one UPDATE); delete unreferenced blobs.
+
+    Returns how many blobs were deleted.
+    """
+    def refs(model):
+        return Coalesce(Subquery(
+            model.objects.filter(blob=OuterRef("pk")).values("blob").annotate(n=Count("*")).values("n"),
+            output_field=IntegerField(),
+        ), Value(0))
+    Blob.objects.update(refcount=refs(TaskAttachment) + refs(TaskDrawing))
+    return _delete_unreferenced(Blob.objects.filter(refcount=0))
@@ -0,0 +1,127 @@
+"""Push committed planner changes to open agendas over the Channels layer.
+
+Writers do not talk to Channels themselves. counters.adjust(), which every
+PlanItem writer already calls, records the plans it bumped and, when the
+caller passes `changed`, the (plan_id, item_id) pairs it wrote or deleted;
+the checklist views record checklist rows. Nothing is sent before the
+transaction commits, and everything recorded in one transaction goes out as
+one message per plan, built from the committed rows (two queries) rather than
+from what the writers held in memory, so a rolled-back savepoint can at worst
+cause a redundant diff, never a wrong one.
+
+    {"type": "plan.diff", "date": "2026-10-17", "version": 12,
+     "counters": {"total_items": 9, "done_items": 3, "planned_minutes": 600},
+     "upsert": [item, ...], "delete": [item_id, ...], "replace": false}
+
+"replace" is true when some writer did not say which rows it touched; then
+`upsert` holds every item of the plan and clients drop rows not in it.
+Checklist changes go to the catalog group, since a task shows on many days:
+
+    {"type": "task.checklist", "task_id": 3, "upsert": [row, ...], "delete": [row_id, ...]}
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from . import oncommit
+
+logger = logging.getLogger(__name__)
+
+TASKS_GROUP = "planner.tasks"
+
+
+def plan_group(d):
+    return f"planner.plan.{d.isoformat()}"
+
+
+def item_payload(it):
+    """The JSON shape of a PlanItem (shared with the read API); `it.task` should be loaded."""
+    return {
+        "id": it.id, "task_id": it.task_id, "title": it.task.title, "group": it.group_name,
+        "start": it.start_hhmm, "end": it.end_hhmm, "start_min": it.start_min, "end_min": it.end_min,
+        "done": it.done, "auto": it.auto, "order": it.order,
+    }
+
+
+class _Pending:
+    """What one transaction changed: {plan_id: item ids, or None for "send it whole"}, {task_id: row ids}."""
+
+    def __init__(self):
+        self.plans = {}
+        self.checklists = {}
+
+    def flush(self):
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        try:
+            for group, message in self.messages():
+                async_to_sync(layer.group_send)(group, message)
+        except Exception:
+            # the write already committed; clients catch up from the version on their next diff or load
+            logger.exception("planner broadcast failed")
+
+    def messages(self):
+        from ..models import DayPlan, PlanItem, TaskChecklistItem
+        out = []
+        if self.plans:
+            ids = set().union(*(s for s in self.plans.values() if s))
+            whole = [p for p, s in self.plans.items() if s is None]
+            rows = (PlanItem.objects.filter(id__in=ids) | PlanItem.objects.filter(plan_id__in=whole))
+            rows = list(rows.select_related("task").chronological())
+            # a delayed item can move to another day: announce it there too
+            plan_ids = self.plans.keys() | {it.plan_id for it in rows}
+            plans = DayPlan.objects.filter(id__in=plan_ids).values(
+                "id", "date", "version", "total_items", "done_items", "planned_minutes")
+            for p in sorted(plans, key=lambda p: p["date"]):
+                wanted = self.plans.get(p["id"])
+                live = [it for it in rows if it.plan_id == p["id"] and (wanted is None or it.id in ids)]
+                live_ids = {it.id for it in live}
+                out.append((plan_group(p["date"]), {
+                    "type": "plan.diff",
+                    "date": str(p["date"]),
+                    "version": p["version"],
+                    "counters": {k: p[k] for k in ("total_items", "done_items", "planned_minutes")},
+                    "upsert": [item_payload(it) for it in live],
+                    "delete": sorted((wanted or set()) - live_ids),
+                    "replace": wanted is None,
+                }))
+        for task_id, row_ids in sorted(self.checklists.items()):
+            live = list(TaskChecklistItem.objects.filter(task_id=task_id, id__in=row_ids))
+            out.append((TASKS_GROUP, {
+                "type": "task.checklist",
+                "task_id": task_id,
+                "upsert": [{"id": r.id, "text": r.text, "done": r.done, "order": r.order} for r in live],
+                "delete": sorted(row_ids - {r.id for r in live}),
+            }))
+        return out
+
+
+def _record(fn):
+    oncommit.record("broadcast", _Pending, fn)
+
+
+def plans_changed(plan_ids, changed=None):
+    """Record plans bumped by counters.adjust(); `changed` is (plan_id, item_id) pairs, or None if unknown."""
+    def add(pending):
+        for plan_id in plan_ids:
+            if changed is None:
+                pending.plans[plan_id] = None
+            else:
+                pending.plans.setdefault(plan_id, set())
+        for plan_id, item_id in changed or ():
+            ids = pending.plans.setdefault(plan_id, set())
+            if ids is None:
+                continue
+            if item_id is None:   # unsaved row (backend without RETURNING): send the plan whole
+                pending.plans[plan_id] = None
+            else:
+                ids.add(item_id)
+    _record(add)
+
+
+def checklist_changed(task_id, row_ids):
+    def add(pending):
+        pending.checklists.setdefault(task_id, set()).update(row_ids)
+    _record(add)
@@ -0,0 +1,78 @@
+"""Week and month calendars: every day of a date range, read at once.
+
+One query loads the range's DayPlans, one prefetch their items, and the
+recurring tasks that still have to be placed come from expanding each active
+recurring task over the whole range (services.recurrence), with the range's
+skips loaded in one more query. Four queries (five while the day template
+cache is cold), whatever the range length or the size of the catalog. Days
+without a plan are shown as such, not created; the tasks their day template
+will bring (the sleep blocks) are not pending.
+"""
+from datetime import timedelta
+
+from django.db.models import Prefetch
+
+from ..models import DayPlan, PlanItem, Task, TaskSkip
+from .dayplans import template_for
+from .recurrence import occurrences_by_date
+
+
+class CalendarDay:
+    __slots__ = ("date", "plan", "items", "pending")
+
+    def __init__(self, d, plan, items, pending):
+        self.date = d
+        self.plan = plan
+        self.items = items       # PlanItems, chronological, task loaded
+        self.pending = pending   # recurring Tasks due that day with nothing scheduled for them
+
+    @property
+    def total(self):
+        return self.plan.total_items if self.plan else 0
+
+    @property
+    def done(self):
+        return self.plan.done_items if self.plan else 0
+
+    @property
+    def minutes(self):
+        return self.plan.planned_minutes if self.plan else 0
+
+    @property
+    def hours(self):
+        return self.minutes / 60
+
+
+def calendar_days(start, end, counted=None):
+    """([CalendarDay for start..end], totals) where totals sums the DayPlan counters and pending tasks.
+
+    `counted` is a (first, last) range of the days to total, e.g. a month shown
+    padded to whole weeks; by default every day is counted.
+    """
+    lo, hi = counted or (start, end)
+    plans = {
+        p.date: p
+        for p in DayPlan.objects.filter(date__range=(start, end)).prefetch_related(
+            Prefetch("items", queryset=PlanItem.objects.select_related("task").chronological()))
+    }
+    recurring = list(Task.objects.filter(active=True).exclude(recurrence="none").select_related("group"))
+    skips = {}
+    for task_id, d in TaskSkip.objects.filter(date__range=(start, end), task__active=True).values_list("task_id", "date"):
+        skips.setdefault(task_id, set()).add(d)
+    due = occurrences_by_date(recurring, start, end, skips)
+
+    days, totals = [], {"total": 0, "done": 0, "minutes": 0, "pending": 0}
+    d = start
+    while d <= end:
+        plan = plans.get(d)
+        items = list(plan.items.all()) if plan else []
+        scheduled = {it.task_id for it in items} if plan else {s.task_id for s in template_for(d)}
+        day = CalendarDay(d, plan, items, [t for t in due.get(d, ()) if t.id not in scheduled])
+        if lo <= d <= hi:
+            totals["total"] += day.total
+            totals["done"] += day.done
+            totals["minutes"] += day.minutes
+            totals["pending"] += len(day.pending)
+        days.append(day)
+        d += timedelta(days=1)
+    return days, totals
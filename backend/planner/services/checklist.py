@@ -0,0 +1,176 @@
+"""Checklist edits in batches, with gap-based ordering.
+
+TaskChecklistItem.order values are spaced ORDER_GAP apart, so an item that
+is added or moved between two others takes a key between theirs and is the
+only row written. When two neighbours have no integer left between them the
+task's whole list is renumbered (rebalanced) in the same bulk_update.
+
+apply() takes a list of operations:
+
+    {"op": "add", "text": "...", "after": item_id | null}   # no "after": append
+    {"op": "toggle", "id": item_id, "done": true}             # no "done": flip
+    {"op": "delete", "id": item_id}
+    {"op": "move", "id": item_id, "after": item_id | null}    # null: to the top
+
+and runs them in order against one read of the task's items, then writes
+with at most one DELETE, one bulk_create and one bulk_update in a single
+transaction. "after" names a saved item; an invalid operation rejects the
+whole batch with ChecklistError before anything is written.
+"""
+from django.db import transaction
+from django.db.models import Max, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from ..models import TaskChecklistItem
+from . import broadcast
+
+ORDER_GAP = 1024
+MAX_ORDER = 2 ** 31 - 1   # PositiveIntegerField on every backend
+MAX_BATCH = 500
+
+
+class ChecklistError(ValueError):
+    """An operation that cannot be applied; `index` is its position in the batch."""
+
+    def __init__(self, index, message):
+        super().__init__(f"operation {index}: {message}")
+        self.index = index
+
+
+class ChecklistResult:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.rebalanced = False
+
+    def as_dict(self):
+        row = lambda r: {"id": r.id, "text": r.text, "done": r.done, "order": r.order}
+        return {
+            "created": [row(r) for r in self.created],
+            "updated": [row(r) for r in self.updated],
+            "deleted": self.deleted,
+        }
+
+
+def _id(op, index, key="id"):
+    try:
+        return int(op[key])
+    except (KeyError, TypeError, ValueError):
+        raise ChecklistError(index, f"{key!r} must be an item id")
+
+
+def _text(op, index):
+    text = (op.get("text") or "").strip() if isinstance(op.get("text", ""), str) else ""
+    if not text:
+        raise ChecklistError(index, "empty item")
+    if len(text) > TaskChecklistItem._meta.get_field("text").max_length:
+        raise ChecklistError(index, "item text is too long")
+    return text
+
+
+def _position(seq, op, index):
+    """Index in `seq` to insert at: after op["after"], at the top for null, at the end when absent."""
+    if "after" not in op:
+        return len(seq)
+    if op["after"] is None:
+        return 0
+    after = _id(op, index, "after")
+    for i, it in enumerate(seq):
+        if it.id == after:
+            return i + 1
+    raise ChecklistError(index, f"no item {after} to place after")
+
+
+def _place(seq, placed):
+    """Give every item in `placed` (a set of id()s) an order between its neighbours'; False if there is no room."""
+    i = 0
+    while i < len(seq):
+        if id(seq[i]) not in placed:
+            i += 1
+            continue
+        j = i
+        while j < len(seq) and id(seq[j]) in placed:
+            j += 1
+        lo = seq[i - 1].order if i else (-ORDER_GAP if j == len(seq) else -1)
+        hi = seq[j].order if j < len(seq) else min(MAX_ORDER + 1, lo + (j - i + 1) * ORDER_GAP)
+        step = min(ORDER_GAP, (hi - lo) // (j - i + 1))
+        if step < 1:
+            return False
+        for k in range(i, j):
+            seq[k].order = lo + step * (k - i + 1)
+        i = j
+    return True
+
+
+def _rebalance(seq):
+    for n, it in enumerate(seq):
+        it.order = n * ORDER_GAP
+
+
+def apply(task, ops) -> ChecklistResult:
+    """Run `ops` (see the module docstring) against `task`'s checklist."""
+    if not isinstance(ops, list) or not ops:
+        raise ChecklistError(0, "expected a non-empty list of operations")
+    if len(ops) > MAX_BATCH:
+        raise ChecklistError(MAX_BATCH, f"at most {MAX_BATCH} operations per batch")
+
+    seq = list(task.check_items.all())
+    by_id = {it.id: it for it in seq}
+    placed, toggled, deleted = set(), set(), []   # id()s: unsaved instances are not hashable
+
+    for index, op in enumerate(ops):
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind == "add":
+            item = TaskChecklistItem(task=task, text=_text(op, index))
+            seq.insert(_position(seq, op, index), item)
+            placed.add(id(item))
+        elif kind in ("toggle", "delete", "move"):
+            item = by_id.get(_id(op, index))
+            if item is None:
+                raise ChecklistError(index, f"no item {op['id']} on this checklist")
+            if kind == "toggle":
+                if "done" in op and not isinstance(op["done"], bool):
+                    raise ChecklistError(index, '"done" must be true or false')
+                item.done = op["done"] if "done" in op else not item.done
+                toggled.add(id(item))
+            elif kind == "delete":
+                seq.remove(item)
+                del by_id[item.id]
+                placed.discard(id(item))
+                toggled.discard(id(item))
+                deleted.append(item.id)
+            else:
+                seq.remove(item)
+                seq.insert(_position(seq, op, index), item)
+                placed.add(id(item))
+        else:
+            raise ChecklistError(index, f"unknown operation {kind!r}")
+
+    result = ChecklistResult()
+    if not _place(seq, placed):
+        _rebalance(seq)
+        placed = {id(it) for it in seq}
+        result.rebalanced = True
+    result.created = [it for it in seq if it.pk is None]
+    result.updated = [it for it in seq if it.pk is not None and (id(it) in placed or id(it) in toggled)]
+    result.deleted = deleted
+
+    with transaction.atomic():
+        if deleted:
+            TaskChecklistItem.objects.filter(task=task, id__in=deleted).delete()
+        if result.created:
+            TaskChecklistItem.objects.bulk_create(result.created)
+        if result.updated:
+            TaskChecklistItem.objects.bulk_update(result.updated, ["done", "order"])
+        broadcast.checklist_changed(task.id, [it.id for it in result.created + result.updated] + deleted)
+    return result
+
+
+def append(task, text) -> TaskChecklistItem:
+    """Add one item at the end; its order is computed by the INSERT itself (no read first)."""
+    last = TaskChecklistItem.objects.filter(task=task).values("task").annotate(m=Max("order")).values("m")
+    item = TaskChecklistItem.objects.create(task=task, text=text, order=Coalesce(Subquery(last), Value(-ORDER_GAP)) + ORDER_GAP)
+    del item.order   # deferred: reading it loads the value the database computed
+    broadcast.checklist_changed(task.id, [item.id])
+    return item
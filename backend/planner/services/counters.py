@@ -0,0 +1,91 @@
+"""DayPlan.total_items / done_items / planned_minutes, kept exact by every PlanItem writer.
+
+Writers describe what they changed as a Counter of (plan_id, field) -> delta
+(tally() of the rows before with sign=-1, plus tally() of the rows after) and
+call adjust() in the same transaction. Each touched plan costs one
+UPDATE ... SET field = field + delta, so concurrent writers never lose an
+increment. The same UPDATE bumps DayPlan.version (even when the deltas net
+to zero, e.g. a reorder) and sets updated_at, which is what the JSON API's
+ETags and the .ics feed's Last-Modified are built on; adjust() also records
+the plans for services.broadcast to push after commit. recount() rebuilds
+the counters from PlanItem in one UPDATE when they drift
+(manage.py repair_plan_counters).
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import DayPlan, PlanItem
+from . import broadcast
+
+COUNTER_FIELDS = ("total_items", "done_items", "planned_minutes")
+
+
+def tally(items, sign=1):
+    """Counter of (plan_id, field) -> sign x what `items` contribute to the counters."""
+    out = Counter()
+    for it in items:
+        out[it.plan_id, "total_items"] += sign
+        if it.done:
+            out[it.plan_id, "done_items"] += sign
+        out[it.plan_id, "planned_minutes"] += sign * (it.end_min - it.start_min)
+    return out
+
+
+def preset(plan, items):
+    """Counters for a plan that is about to be created holding exactly `items`."""
+    plan.total_items = len(items)
+    plan.done_items = sum(1 for it in items if it.done)
+    plan.planned_minutes = sum(it.end_min - it.start_min for it in items)
+
+
+def adjust(deltas, plans=(), changed=None):
+    """Apply a tally()-style Counter with one F() update per touched plan.
+
+    Every plan named in `deltas` also gets version + 1 and a new updated_at.
+    In-memory `plans` get the same increments, so callers need not re-read
+    them. `changed` lists the (plan_id, item_id) pairs the caller wrote or
+    deleted, so open agendas are sent just those rows; without it they are
+    sent the touched plans whole.
+    """
+    now = timezone.now()
+    by_plan = defaultdict(lambda: {"version": F("version") + 1, "updated_at": now})
+    for (plan_id, field), n in deltas.items():
+        changes = by_plan[plan_id]
+        if n:
+            changes[field] = F(field) + n
+    for plan_id, changes in by_plan.items():
+        DayPlan.objects.filter(pk=plan_id).update(**changes)
+    for p in plans:
+        if p.id in by_plan:
+            p.version += 1
+            p.updated_at = now
+        for field in COUNTER_FIELDS:
+            setattr(p, field, getattr(p, field) + deltas.get((p.id, field), 0))
+    broadcast.plans_changed(by_plan, changed)
+
+
+def recount(plans=None):
+    """Recompute the counters of `plans` (default: every plan) from PlanItem in one UPDATE."""
+    items = PlanItem.objects.filter(plan=OuterRef("pk")).order_by().values("plan")
+
+    def agg(expr):
+        return Coalesce(Subquery(items.annotate(v=expr).values("v"), output_field=IntegerField()), 0)
+
+    qs = DayPlan.objects.all() if plans is None else DayPlan.objects.filter(pk__in=plans)
+    return qs.update(
+        total_items=agg(Count("id")),
+        done_items=agg(Count("id", filter=Q(done=True))),
+        planned_minutes=agg(Sum(F("end_min") - F("start_min"))),
+    )
+
+
+def drifted():
+    """Plans whose stored counters disagree with their items (for the repair command's --check)."""
+    return DayPlan.objects.annotate(
+        t=Count("items"),
+        d=Count("items", filter=Q(items__done=True)),
+        m=Coalesce(Sum(F("items__end_min") - F("items__start_min")), 0),
+    ).exclude(total_items=F("t"), done_items=F("d"), planned_minutes=F("m"))
@@ -0,0 +1,94 @@
+"""New day plans, cloned from day templates.
+
+A new DayPlan starts with the items of a DayTemplate: the template of its
+weekday, else the default one (migration 0016 made the default from the sleep
+blocks that used to be hard-coded). Templates are read once per process, all
+of them in one query, and reused until a template, template item, task or
+group is saved (signals.py calls clear_template_cache) or TEMPLATE_TTL
+seconds pass, which bounds how stale another process's edit can be. Creating
+plans for any number of days then costs one SELECT and two bulk INSERTs.
+"""
+import time
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+
+from ..models import DayPlan, DayTemplate, PlanItem
+from . import counters
+
+TEMPLATE_TTL = 60
+
+Slot = namedtuple("Slot", "task_id group_name start_min end_min order")
+
+_cache = {"loaded_at": None}
+
+
+def clear_template_cache():
+    _cache["loaded_at"] = None
+
+
+def _templates():
+    if _cache["loaded_at"] is None or time.monotonic() - _cache["loaded_at"] > TEMPLATE_TTL:
+        by_name, by_weekday, default = {}, {}, None
+        rows = DayTemplate.objects.values_list(
+            "name", "weekday", "is_default",
+            "items__task_id", "items__task__group__name", "items__start_min", "items__end_min", "items__order",
+        ).order_by("name", "items__start_min", "items__end_min", "items__order")
+        for name, weekday, is_default, *slot in rows:
+            slots = by_name.setdefault(name, [])
+            if slot[0] is not None:   # a template without items still counts: it makes empty days
+                slots.append(Slot(*slot))
+            if weekday is not None:
+                by_weekday[weekday] = name
+            if is_default:
+                default = name
+        _cache.update(
+            loaded_at=time.monotonic(), by_name={k: tuple(v) for k, v in by_name.items()},
+            by_weekday=by_weekday, default=default,
+        )
+    return _cache
+
+
+def template_for(d, name=None):
+    """The Slots a plan for `d` starts with: template `name`, else d's weekday template, else the default."""
+    cache = _templates()
+    if name is not None:
+        if name not in cache["by_name"]:
+            raise DayTemplate.DoesNotExist(f"No day template named {name!r}")
+    else:
+        name = cache["by_weekday"].get(d.weekday(), cache["default"])
+    return cache["by_name"].get(name, ())
+
+
+def _clone(plan, slots):
+    return [
+        PlanItem(plan=plan, task_id=s.task_id, group_name=s.group_name,
+                 start_min=s.start_min, end_min=s.end_min, order=s.order, done=False)
+        for s in slots
+    ]
+
+
+def ensure_plans(dates, template=None, _retry=True) -> dict:
+    """{date: DayPlan} for every date, creating the missing ones from their templates in bulk.
+
+    `template` names one template for every missing date instead of the
+    weekday/default choice. Existing plans are returned untouched.
+    """
+    dates = sorted(set(dates))
+    plans = {p.date: p for p in DayPlan.objects.filter(date__in=dates)}
+    missing = [DayPlan(date=d) for d in dates if d not in plans]
+    if not missing:
+        return plans
+    items = {p.date: _clone(p, template_for(p.date, template)) for p in missing}
+    for p in missing:
+        counters.preset(p, items[p.date])   # new plans: no UPDATE needed
+    try:
+        with transaction.atomic():
+            DayPlan.objects.bulk_create(missing)
+            PlanItem.objects.bulk_create([it for p in missing for it in items[p.date]])   # plan_id set from p.pk
+    except IntegrityError:
+        if not _retry:
+            raise
+        return ensure_plans(dates, template, _retry=False)   # a concurrent request created some of these days
+    plans.update({p.date: p for p in missing})
+    return plans
@@ -0,0 +1,159 @@
+"""Delays: extend an item and push everything after it, across midnight if needed.
+
+All delays of a request are applied to in-memory copies of the affected days;
+the result is written with one bulk_update (plus one bulk_create when an item
+had to be split at midnight).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+
+from ..models import MIDNIGHT, DayPlan, PlanItem
+from . import counters
+from .dayplans import ensure_plans
+
+MAX_CASCADE_DAYS = 7        # how far an overflow may push into the following days
+
+
+class DelayError(ValueError):
+    pass
+
+
+class _Days:
+    """Lazily loaded {date: [PlanItem]}."""
+
+    def __init__(self):
+        self.plans = {}
+        self.items = {}
+        self.dirty = set()
+        self.created = []
+        self.before = Counter()   # what the loaded rows contributed to the plan counters, negated
+
+    def load(self, plans):
+        plans = [p for p in plans if p.date not in self.items]
+        if not plans:
+            return
+        for p in plans:
+            self.plans[p.date] = p
+            self.items[p.date] = []
+        by_id = {p.id: p for p in plans}
+        loaded = list(PlanItem.objects.filter(plan__in=plans).select_related("task"))
+        self.before.update(counters.tally(loaded, -1))
+        for it in loaded:
+            it.plan = by_id[it.plan_id]
+            it.loaded_plan_id = it.plan_id
+            self.items[it.plan.date].append(it)
+
+    def day(self, d):
+        if d not in self.items:
+            self.load(ensure_plans([d]).values())
+        return self.items[d]
+
+
+def _shift_day(days, d, after, minutes, extend=None):
+    """Push items of day `d` starting at/after `after` by `minutes` (optionally extend one item)."""
+    for it in days.day(d):
+        if it is extend:
+            it.end_min += minutes
+            days.dirty.add(it)
+        elif it.start_min >= after:
+            it.start_min += minutes
+            it.end_min += minutes
+            days.dirty.add(it)
+
+
+def _spill(days, d, depth=0):
+    """Move whatever now runs past midnight on `d` into the next day, cascading."""
+    items = days.day(d)
+    over = [it for it in items if it.end_min > MIDNIGHT]
+    if not over:
+        return
+    if depth >= MAX_CASCADE_DAYS:
+        raise DelayError(f"Delay would cascade more than {MAX_CASCADE_DAYS} days")
+    nxt = d + timedelta(days=1)
+    spilled = []
+    for it in over:
+        if it.start_min >= MIDNIGHT:
+            # whole item lands on the next day
+            items.remove(it)
+            dur = it.end_min - it.start_min
+            it.start_min = max(it.start_min - MIDNIGHT, 0)
+            it.end_min = it.start_min + dur
+            spilled.append(it)
+        else:
+            # straddles midnight: keep the part up to midnight, continue after 00:00
+            rest = PlanItem(task=it.task, group_name=it.group_name, done=it.done, auto=it.auto,
+                            start_min=0, end_min=it.end_min - MIDNIGHT)
+            it.end_min = MIDNIGHT
+            spilled.append(rest)
+            days.created.append(rest)
+        days.dirty.add(it)
+
+    if not spilled:
+        return
+    nxt_items = days.day(nxt)
+    # cascade: next-day items are pushed only as far as they collide, so the
+    # first gap long enough absorbs the overflow
+    cursor = max(it.end_min for it in spilled)
+    for it in sorted(nxt_items, key=lambda x: (x.start_min, x.end_min)):
+        if it.start_min >= cursor:
+            break
+        shift = cursor - it.start_min
+        it.start_min += shift
+        it.end_min += shift
+        cursor = it.end_min
+        days.dirty.add(it)
+    for it in spilled:
+        it.plan = days.plans[nxt]
+        nxt_items.append(it)
+    _spill(days, nxt, depth + 1)
+
+
+@transaction.atomic
+def apply_delays(delays):
+    """delays: [(item_id, minutes), ...] applied in order. Returns the touched PlanItems.
+
+    For each delay the item is extended by `minutes` and every later item of
+    its day (start >= the item's original end) is pushed by the same amount.
+    """
+    delays = [(int(i), int(m)) for i, m in delays]
+    if any(m < 0 for _, m in delays):
+        raise DelayError("Negative delay is not supported.")
+    delays = [(i, m) for i, m in delays if m]
+    if not delays:
+        return []
+
+    ids = {i for i, _ in delays}
+    plans = DayPlan.objects.filter(items__id__in=ids).distinct()
+    days = _Days()
+    days.load(plans)
+    by_id = {it.id: it for items in days.items.values() for it in items}
+    missing = ids - by_id.keys()
+    if missing:
+        raise DelayError(f"Unknown item(s): {', '.join(map(str, sorted(missing)))}")
+
+    for item_id, minutes in delays:
+        it = by_id[item_id]
+        _shift_day(days, it.plan.date, it.end_min, minutes, extend=it)
+        _spill(days, it.plan.date)
+
+    # keep 'order' chronological on every touched day
+    for d in {it.plan.date for it in list(days.dirty) + days.created}:
+        ordered = sorted(days.items[d], key=lambda x: (x.start_min, x.end_min, x.id or 0))
+        for idx, x in enumerate(ordered):
+            if x.order != idx:
+                x.order = idx
+                if x.id:
+                    days.dirty.add(x)
+
+    final = [it for items in days.items.values() for it in items]
+    updates = [it for it in days.dirty if it.id]
+    PlanItem.objects.bulk_update(updates, ["plan", "start_min", "end_min", "order"])
+    PlanItem.objects.bulk_create(days.created)
+    days.before.update(counters.tally(final))
+    # a moved item is announced on the day it left as well as the day it landed on
+    counters.adjust(days.before, plans=days.plans.values(), changed=[
+        (plan_id, it.id) for it in updates for plan_id in {it.loaded_plan_id, it.plan_id}
+    ] + [(it.plan_id, it.id) for it in days.created])
+    return updates + days.created
@@ -0,0 +1,151 @@
+"""Multi-day planner: spread deadline-bound tasks over the next N DayPlans.
+
+Tasks go earliest-deadline-first; each picks the least loaded day on or before
+its deadline that still has capacity (per day and per desired_time window) and
+a free slot (services.scheduler.FreeSlots). Placed items are never moved, so a
+run only ever touches tasks that have nothing scheduled yet, and only the
+plans of days those tasks can land on. replan_day() re-places just the tasks
+whose planner items were dropped from an edited day: it reads and writes the
+plans up to their deadlines, and leaves every other unscheduled task alone.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from ..models import PlanItem, Task
+from . import counters
+from .dayplans import ensure_plans
+from .scheduler import DAY_END, WINDOWS, FreeSlots
+
+HORIZON_DAYS = 7
+DAY_CAPACITY_MIN = 240      # deadline work the planner may add to one day
+WINDOW_CAPACITY_MIN = 120   # ... and to one desired_time window of that day
+
+
+def _day_start(d):
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def unscheduled_due(start, through, task_ids=()):
+    """Active tasks due by `through` with nothing scheduled on `start` or later.
+
+    One-time tasks in `task_ids` count even when inactive: placing them
+    deactivated them, and their item has since been dropped.
+    """
+    return (
+        Task.objects.filter(Q(active=True) | Q(id__in=task_ids, recurrence="none"), deadline_at__isnull=False,
+                            deadline_at__lt=_day_start(through + timedelta(days=1)))
+            .exclude(Exists(PlanItem.objects.filter(task=OuterRef("pk"), plan__date__gte=start)))
+            .select_related("group")
+    )
+
+
+class _Day:
+    def __init__(self, plan, not_before):
+        self.plan = plan
+        self.slots = FreeSlots(not_before, DAY_END)
+        self.load = 0
+        self.window_load = {}
+        self.next_order = 0
+
+    def take(self, task, s, e):
+        self.slots.reserve(s, e)
+        self.load += e - s
+        self.window_load[task.desired_time] = self.window_load.get(task.desired_time, 0) + e - s
+
+
+def _fits(day, task, day_capacity, window_capacity):
+    dur = task.duration_min
+    if day.load and day.load + dur > day_capacity:
+        return False
+    if task.desired_time != "any" and day.window_load.get(task.desired_time, 0) + dur > window_capacity:
+        return False
+    return True
+
+
+def _feasible(task, dates):
+    due = timezone.localdate(task.deadline_at)
+    return [d for d in dates if d <= due] or dates[:1]   # overdue: as soon as possible
+
+
+@transaction.atomic
+def plan_horizon(start=None, days=HORIZON_DAYS, skip=(), task_ids=None,
+                 day_capacity=DAY_CAPACITY_MIN, window_capacity=WINDOW_CAPACITY_MIN):
+    """Place unscheduled deadline tasks within [start, start + days); returns new PlanItems.
+
+    Dates in `skip` are left untouched (e.g. a day the user just edited by hand).
+    With `task_ids`, only those tasks are placed. Either way, only the plans of
+    days some task can land on (up to its deadline) are created and read.
+    """
+    now = timezone.localtime()
+    start = start or now.date()
+    dates = [start + timedelta(days=i) for i in range(days)]
+    dates = [d for d in dates if d not in skip]
+    if not dates:
+        return []
+    tasks = unscheduled_due(start, dates[-1], task_ids or ()).filter(duration_min__gt=0)
+    if task_ids is not None:
+        tasks = tasks.filter(id__in=task_ids)
+    tasks = list(tasks.order_by("deadline_at", "-priority", "duration_min"))
+    if not tasks:
+        return []
+    dates = sorted({d for t in tasks for d in _feasible(t, dates)})
+
+    plans = ensure_plans(dates)
+    state = {
+        d: _Day(p, now.hour * 60 + now.minute if d == now.date() else 0)
+        for d, p in plans.items()
+    }
+    by_plan = {p.id: state[d] for d, p in plans.items()}
+    for it in PlanItem.objects.filter(plan__in=list(plans.values())).select_related("task") \
+                              .only("plan_id", "start_min", "end_min", "order", "auto", "task__desired_time"):
+        day = by_plan[it.plan_id]
+        day.next_order = max(day.next_order, it.order + 1)
+        s, e = it.start_min, it.end_min
+        if it.auto:
+            day.take(it.task, s, e)   # earlier planner output counts against capacity
+        else:
+            day.slots.reserve(s, e)
+
+    created = []
+    for t in tasks:
+        due = timezone.localtime(t.deadline_at)
+        for d in sorted(_feasible(t, dates), key=lambda d: (state[d].load, d)):
+            day = state[d]
+            if not _fits(day, t, day_capacity, window_capacity):
+                continue
+            lo, hi = WINDOWS.get(t.desired_time, WINDOWS["any"])
+            due_min = due.hour * 60 + due.minute if d == due.date() else None
+            if due_min is not None:
+                hi = min(hi, due_min)
+            s = day.slots.first_fit(t.duration_min, lo, hi)
+            if s is None and (due_min is not None or due.date() < start):
+                s = day.slots.first_fit(t.duration_min, 0, DAY_END if due_min is None else due_min)
+            if s is None:
+                continue
+            e = s + t.duration_min
+            day.take(t, s, e)
+            created.append(PlanItem(
+                plan=day.plan, task=t, group_name=t.group.name,
+                start_min=s, end_min=e,
+                order=day.next_order, done=False, auto=True,
+            ))
+            day.next_order += 1
+            break
+
+    PlanItem.objects.bulk_create(created)
+    counters.adjust(counters.tally(created), plans=plans.values(),
+                    changed=[(it.plan_id, it.id) for it in created])
+    one_time = [it.task_id for it in created if it.task.recurrence == "none"]
+    if one_time:
+        Task.objects.filter(id__in=one_time).update(active=False, updated_at=timezone.now())  # as plan_day does
+    return created
+
+
+def replan_day(day, task_ids, days=HORIZON_DAYS):
+    """`day` was edited by hand and lost the planner items of `task_ids`: re-place those tasks on other days."""
+    if not task_ids:
+        return []
+    return plan_horizon(start=timezone.localdate(), days=days, skip={day}, task_ids=task_ids)
@@ -0,0 +1,334 @@
+"""Bulk task import from CSV or iCalendar files (manage.py import_tasks, /agenda/add/import/).
+
+CSV files have a header row naming Task fields (FIELDS), plus "group" for
+the group's name; only "title" and "group" are required. iCalendar files
+give one task per VTODO or VEVENT: SUMMARY, the first CATEGORIES value (else
+ICS_GROUP), DESCRIPTION, DTSTART, DUE, DURATION or DTEND, PRIORITY, and an
+RRULE (a "custom" recurrence) with its EXDATEs, so planner.ics output
+imports back.
+
+Every row is validated in one pass with the model fields' own clean(), with
+no query per row: group names are resolved against one read of TaskGroup.
+Any error rejects the whole file unless skip_invalid is set; the report
+lists them all by row (CSV line, or the component's BEGIN line). A dry run
+stops after validation. Otherwise groups, tasks, skipped dates and the new
+tasks' TaskOccurrence rows (up to the materialized horizon) are written with
+bulk INSERTs of at most IMPORT_BATCH rows in one transaction. bulk_create
+sends no post_save, so those occurrence rows are written here.
+"""
+import csv
+import io
+import re
+from datetime import datetime, time
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import WEEKDAY_CODES, Task, TaskGroup, TaskOccurrence, TaskSkip
+from . import occurrences
+from .recurrence import expand_occurrences
+from .rrule import DEFAULT_DTSTART, RRule, RRuleError
+
+IMPORT_BATCH = 500
+ICS_GROUP = "Imported"
+
+# CSV columns besides "group", cleaned by the Task field of the same name
+FIELDS = (
+    "title", "duration_min", "priority", "desired_time", "active",
+    "recurrence", "recur_interval", "recur_monthday", "rrule_text", "start_date", "end_date",
+    "deadline_at", "description_type", "description_text",
+)
+COLUMNS = FIELDS + ("group", "recur_weekdays")
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be read (encoding, header, format)."""
+
+
+class ImportReport:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.skips = 0
+        self.occurrences = 0
+        self.groups_created = []
+        self.errors = []       # (row, field, message)
+        self.statements = 0    # batched INSERTs run (views add them to their query budget)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {
+            "dry_run": self.dry_run, "rows": self.rows, "created": self.created, "skips": self.skips,
+            "groups_created": self.groups_created,
+            "errors": [{"row": r, "field": f, "message": m} for r, f, m in self.errors],
+        }
+
+
+# ---------- reading ----------
+
+def _text(data):
+    if isinstance(data, str):
+        return data
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("The file is not UTF-8 text")
+
+
+def read_csv(data):
+    """(row number, {column: value}) per data row; row numbers are file lines, the header is row 1."""
+    reader = csv.DictReader(io.StringIO(_text(data), newline=""))
+    header = [c.strip() for c in reader.fieldnames or ()]
+    unknown = [c for c in header if c not in COLUMNS]
+    if unknown:
+        raise ImportFileError(f"Unknown column(s): {', '.join(unknown)}. Columns are {', '.join(COLUMNS)}.")
+    for required in ("title", "group"):
+        if required not in header:
+            raise ImportFileError(f"The header has no {required!r} column")
+    reader.fieldnames = header
+    for raw in reader:
+        if any((v or "").strip() for v in raw.values() if isinstance(v, str)):
+            yield reader.line_num, raw
+
+
+def _unfold(text):
+    """Content lines with their line numbers; folded continuations are joined."""
+    lines = []
+    for n, line in enumerate(text.splitlines(), start=1):
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1][1] += line[1:]
+        elif line.strip():
+            lines.append([n, line])
+    return lines
+
+
+def _unescape(value):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _split(value):
+    """A multi-valued property (CATEGORIES, EXDATE) on unescaped commas."""
+    return [_unescape(v) for v in re.split(r"(?<!\\),", value) if v]
+
+
+def _ics_when(value, params):
+    """A DATE or DATE-TIME value: a date, or an aware datetime (floating and TZID times are taken as local)."""
+    if "T" not in value:
+        return datetime.strptime(value[:8], "%Y%m%d").date()
+    dt = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return dt.replace(tzinfo=timezone.get_fixed_timezone(0))
+    return timezone.make_aware(dt)
+
+
+_DURATION = re.compile(r"^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def _ics_minutes(value):
+    m = _DURATION.match(value)
+    if not m:
+        raise ValueError(value)
+    w, d, h, mi, s = (int(x or 0) for x in m.groups())
+    return ((w * 7 + d) * 24 + h) * 60 + mi + (s + 59) // 60
+
+
+def _local_date(when):
+    return when if not isinstance(when, datetime) else timezone.localdate(when)
+
+
+def _component_row(props):
+    """VTODO / VEVENT properties ({NAME: [(value, params), ...]}) -> the row validate() reads."""
+    def first(name):
+        return props[name][0] if props.get(name) else None
+
+    row = {"title": _unescape(first("SUMMARY")[0]) if first("SUMMARY") else "", "group": ICS_GROUP, "_skips": []}
+    if first("CATEGORIES"):
+        row["group"] = _split(first("CATEGORIES")[0])[0]
+    if first("DESCRIPTION"):
+        row["description_text"] = _unescape(first("DESCRIPTION")[0])
+        row["description_type"] = "text"
+    start = first("DTSTART") and _ics_when(*first("DTSTART"))
+    if start:
+        row["start_date"] = _local_date(start)
+    if first("DUE"):
+        due = _ics_when(*first("DUE"))
+        row["deadline_at"] = due if isinstance(due, datetime) else timezone.make_aware(datetime.combine(due, time(23, 59)))
+    if first("DURATION"):
+        row["duration_min"] = _ics_minutes(first("DURATION")[0])
+    elif first("DTEND") and start:
+        row["duration_min"] = int((_ics_when(*first("DTEND")) - start).total_seconds() // 60)
+    if first("PRIORITY") and first("PRIORITY")[0] not in ("", "0"):
+        row["priority"] = 5 - (int(first("PRIORITY")[0]) - 1) // 2   # iCalendar 1 (highest) .. 9
+    if first("RRULE"):
+        row["recurrence"] = "custom"
+        row["rrule_text"] = first("RRULE")[0]
+    for value, params in props.get("EXDATE", ()):
+        row["_skips"] += [_local_date(_ics_when(v, params)) for v in _split(value)]
+    return row
+
+
+def read_ics(data):
+    """(BEGIN line number, row) per VTODO / VEVENT."""
+    text = _text(data)
+    if not text.lstrip().upper().startswith("BEGIN:VCALENDAR"):
+        raise ImportFileError("Not an iCalendar file (no BEGIN:VCALENDAR)")
+    depth, begin, props = [], None, None
+    for n, line in _unfold(text):
+        name, _, value = line.partition(":")
+        name, *params = name.split(";")
+        name = name.upper()
+        if name == "BEGIN":
+            depth.append(value.upper())
+            if len(depth) == 2 and depth[1] in ("VTODO", "VEVENT"):
+                begin, props = n, {}
+        elif name == "END":
+            if depth:
+                depth.pop()
+            if props is not None and len(depth) == 1:
+                try:
+                    row = _component_row(props)
+                except (ValueError, TypeError) as e:
+                    row = {"_error": f"Unreadable date, duration or priority ({e})"}
+                yield begin, row
+                props = None
+        elif props is not None and len(depth) == 2:   # VALARMs and other nested components are ignored
+            props.setdefault(name, []).append((value, params))
+
+
+def read_rows(name, data):
+    """Rows of an uploaded file, picked by extension (.csv / .ics) or, failing that, by content."""
+    lowered = (name or "").lower()
+    if lowered.endswith(".ics") or (not lowered.endswith(".csv") and _text(data).lstrip().upper().startswith("BEGIN:VCALENDAR")):
+        return read_ics(data)
+    return read_csv(data)
+
+
+# ---------- validation ----------
+
+_task_fields = {f: Task._meta.get_field(f) for f in FIELDS}
+
+
+def _clean(field, value):
+    """The column's value as the Task field stores it; None for a missing or blank cell (the field default)."""
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        return None
+    value = _task_fields[field].clean(value, None)
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _weekdays(value):
+    codes = [x.strip().upper() for x in (value or "").split(",") if x.strip()]
+    bad = [c for c in codes if c not in WEEKDAY_CODES]
+    if bad:
+        raise ValidationError(f"Unknown weekday(s): {', '.join(bad)}. Use {','.join(WEEKDAY_CODES)}.")
+    return ",".join(codes)
+
+
+def validate(rows, groups, report):
+    """[(row number, unsaved Task with .group_name, skipped dates)] for the valid rows; errors go to the report.
+
+    `groups` is {name: id} of the existing groups; unknown names are collected
+    in report.groups_created (the tasks get their id once they exist).
+    """
+    valid = []
+    for n, raw in rows:
+        report.rows += 1
+        if "_error" in raw:
+            report.errors.append((n, "", raw["_error"]))
+            continue
+        values, errors = {}, []
+        for field in FIELDS:
+            try:
+                value = _clean(field, raw.get(field))
+            except ValidationError as e:
+                errors.append((n, field, " ".join(e.messages)))
+                continue
+            if value is not None:
+                values[field] = value
+        try:
+            values["recur_weekdays"] = _weekdays(raw.get("recur_weekdays"))
+        except ValidationError as e:
+            errors.append((n, "recur_weekdays", " ".join(e.messages)))
+        group = (raw.get("group") or "").strip()
+        if not group:
+            errors.append((n, "group", "This field is required."))
+        elif len(group) > TaskGroup._meta.get_field("name").max_length:
+            errors.append((n, "group", "Group names are at most 120 characters."))
+        if "title" not in values and not any(f == "title" for _, f, _ in errors):
+            errors.append((n, "title", "This field is required."))
+        if values.get("recurrence") == "custom":
+            try:
+                RRule.parse(values.get("rrule_text") or "", values.get("start_date") or DEFAULT_DTSTART)
+            except RRuleError as e:
+                errors.append((n, "rrule_text", f"Invalid RRULE: {e}"))
+        if errors:
+            report.errors += errors
+            continue
+        if group not in groups and group not in report.groups_created:
+            report.groups_created.append(group)
+        task = Task(**values)
+        task.group_name = group
+        valid.append((n, task, sorted(set(raw.get("_skips", ())))))
+    return valid
+
+
+# ---------- writing ----------
+
+def _bulk(model, objs, report):
+    """bulk_create in batches that are one INSERT each: IMPORT_BATCH rows, or fewer if the backend needs it."""
+    if not objs:
+        return objs
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    size = max(1, min(IMPORT_BATCH, connection.ops.bulk_batch_size(fields, objs)))
+    for i in range(0, len(objs), size):
+        model.objects.bulk_create(objs[i:i + size], batch_size=size)
+        report.statements += 1
+    return objs
+
+
+def import_tasks(rows, dry_run=False, skip_invalid=False, create_groups=True) -> ImportReport:
+    """Validate `rows` (read_csv / read_ics / read_rows output) and, unless dry_run, write them."""
+    report = ImportReport(dry_run)
+    groups = dict(TaskGroup.objects.values_list("name", "id"))
+    valid = validate(rows, groups, report)
+    if report.groups_created and not create_groups:
+        missing = set(report.groups_created)
+        report.errors += [(n, "group", f"No group named {t.group_name!r}.") for n, t, _ in valid if t.group_name in missing]
+        valid = [v for v in valid if v[1].group_name not in missing]
+        report.groups_created = []
+    report.errors.sort()
+    if dry_run or (report.errors and not skip_invalid):
+        return report
+
+    with transaction.atomic():
+        for g in _bulk(TaskGroup, [TaskGroup(name=name) for name in report.groups_created], report):
+            groups[g.name] = g.id
+        tasks = [t for _, t, _ in valid]
+        for t in tasks:
+            t.group_id = groups[t.group_name]
+        _bulk(Task, tasks, report)
+        skips = _bulk(TaskSkip, [TaskSkip(task=t, date=d) for _, t, days in valid for d in days], report)
+
+        through = occurrences.horizon_through()
+        if through is not None:
+            start = timezone.localdate()
+            by_task = {}
+            for s in skips:
+                by_task.setdefault(s.task_id, set()).add(s.date)
+            rows = [
+                TaskOccurrence(task_id=pk, date=d)
+                for pk, days in expand_occurrences(tasks, start, through, by_task).items()
+                for d in days
+            ]
+            report.occurrences = len(_bulk(TaskOccurrence, rows, report))
+    report.created, report.skips = len(tasks), len(skips)
+    return report
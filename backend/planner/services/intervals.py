@@ -0,0 +1,116 @@
+"""Interval index over the items of one plan (or of several plans, one index each).
+
+Items are kept sorted by (start, end) next to the union of their busy time as
+two parallel sorted lists of disjoint blocks (like scheduler.FreeSlots, which is
+its complement). That gives:
+
+- conflicts(): every overlapping pair, one sweep with a heap, O(n log n + k);
+- free(lo, hi): the gaps between lo and hi, a bisect plus the blocks in range;
+- is_free(s, e): an O(log n) bisect on the busy blocks;
+- add(s, e): the same check, then O(n) list inserts (a memmove, fast for the
+  few thousand items a plan holds).
+
+agenda_edit validates the posted rows with it, delay_after checks the day it
+just shifted, and the scheduler takes its busy time from it.
+"""
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from ..models import PlanItem
+
+
+class IntervalConflict(ValueError):
+    pass
+
+
+def _by_range(iv):
+    return iv[0], iv[1]
+
+
+class IntervalIndex:
+    """Half-open intervals [start, end) in minutes, each with a key (item id, row number, ...)."""
+
+    def __init__(self, intervals=()):
+        self._items = sorted(((s, e, k) for s, e, k in intervals if e > s), key=_by_range)
+        self._starts, self._ends = [], []
+        for s, e, _ in self._items:
+            if self._ends and s <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], e)
+            else:
+                self._starts.append(s)
+                self._ends.append(e)
+
+    @classmethod
+    def for_plan(cls, plan):
+        return cls(plan.items.values_list("start_min", "end_min", "id"))
+
+    @classmethod
+    def for_plans(cls, plans):
+        """{plan_id: IntervalIndex} for several plans from one query."""
+        rows = defaultdict(list)
+        for plan_id, s, e, pk in PlanItem.objects.filter(plan__in=plans) \
+                .values_list("plan_id", "start_min", "end_min", "id"):
+            rows[plan_id].append((s, e, pk))
+        return {p.id: cls(rows.get(p.id, ())) for p in plans}
+
+    @classmethod
+    def for_dates(cls, start, end):
+        """{date: IntervalIndex} for every plan dated within [start, end], from one query."""
+        rows = defaultdict(list)
+        for d, s, e, pk in PlanItem.objects.filter(plan__date__range=(start, end)) \
+                .values_list("plan__date", "start_min", "end_min", "id"):
+            rows[d].append((s, e, pk))
+        return {d: cls(ivs) for d, ivs in rows.items()}
+
+    def __len__(self):
+        return len(self._items)
+
+    def blocks(self):
+        """Busy time as disjoint (start, end) blocks."""
+        return list(zip(self._starts, self._ends))
+
+    def conflicts(self):
+        """[(key_a, key_b), ...] for every pair of intervals sharing at least one minute."""
+        out = []
+        active = []   # heap of (end, seq, key) for intervals that started but may still run
+        for seq, (s, e, k) in enumerate(self._items):
+            while active and active[0][0] <= s:
+                heapq.heappop(active)
+            out.extend((other, k) for _, _, other in active)
+            heapq.heappush(active, (e, seq, k))
+        return out
+
+    def is_free(self, s, e):
+        i = bisect_right(self._ends, s)
+        return i == len(self._starts) or self._starts[i] >= e
+
+    def free(self, lo, hi, min_len=1):
+        """Free (start, end) gaps inside [lo, hi) that are at least `min_len` long."""
+        gaps = []
+        cur = lo
+        i = bisect_right(self._ends, lo)
+        while cur < hi:
+            nxt = self._starts[i] if i < len(self._starts) else hi
+            if min(nxt, hi) - cur >= min_len:
+                gaps.append((cur, min(nxt, hi)))
+            if i >= len(self._starts):
+                break
+            cur = max(cur, self._ends[i])
+            i += 1
+        return gaps
+
+    def add(self, s, e, key=None, allow_overlap=False):
+        """Insert [s, e) in O(n) (list inserts); raises IntervalConflict if it collides (unless allow_overlap)."""
+        if e <= s:
+            raise IntervalConflict(f"Empty or inverted range {s}-{e}")
+        if not allow_overlap and not self.is_free(s, e):
+            raise IntervalConflict(f"{s}-{e} overlaps existing items")
+        insort(self._items, (s, e, key), key=_by_range)
+        # merge [s, e) into the busy blocks it touches
+        i = bisect_left(self._ends, s)
+        j = bisect_right(self._starts, e)
+        if i < j:
+            s, e = min(s, self._starts[i]), max(e, self._ends[j - 1])
+        self._starts[i:j] = [s]
+        self._ends[i:j] = [e]
@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Task, TaskOccurrence, OccurrenceHorizon
+from .recurrence import expand_occurrences
+
+HORIZON_DAYS = 90
+
+# Task fields that change which days a task occurs on
+RECURRENCE_FIELDS = (
+    "recurrence", "recur_interval", "recur_weekday_mask", "recur_monthday",
+    "start_date", "end_date", "rrule_text",
+)
+
+
+def materialize(tasks, start: date, end: date, batch_size=2000) -> int:
+    """Replace the occurrence rows of `tasks` in [start, end]. Returns rows written."""
+    tasks = list(tasks)
+    if not tasks or end < start:
+        return 0
+    pks = [t.pk for t in tasks]
+    for i in range(0, len(pks), 500):
+        TaskOccurrence.objects.filter(task_id__in=pks[i:i + 500], date__range=(start, end)).delete()
+    rows = [
+        TaskOccurrence(task_id=pk, date=d)
+        for pk, days in expand_occurrences(tasks, start, end).items()
+        for d in days
+    ]
+    TaskOccurrence.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def horizon_through():
+    return OccurrenceHorizon.objects.values_list("through", flat=True).first()
+
+
+def _set_through(d):
+    OccurrenceHorizon.objects.update_or_create(pk=1, defaults={"through": d})
+
+
+def ensure_horizon(through: date = None):
+    """Extend the materialized window so it covers `through` (default: today + HORIZON_DAYS)."""
+    today = timezone.localdate()
+    through = through or today + timedelta(days=HORIZON_DAYS)
+    current = horizon_through()
+    if current and current >= through:
+        return
+    start = current + timedelta(days=1) if current else today
+    with transaction.atomic():
+        materialize(Task.objects.all(), start, through)
+        _set_through(through)
+
+
+def rebuild(start: date, through: date) -> int:
+    """Recompute every task over [start, through] and move the horizon there."""
+    with transaction.atomic():
+        n = materialize(Task.objects.all(), start, through)
+        _set_through(through)
+    return n
+
+
+def repair(start: date, through: date) -> tuple:
+    """Insert missing / delete stray rows in [start, through]. Returns (added, removed)."""
+    tasks = list(Task.objects.all())
+    want = {
+        (pk, d)
+        for pk, days in expand_occurrences(tasks, start, through).items()
+        for d in days
+    }
+    have = {
+        (pk, d): occ_id
+        for occ_id, pk, d in TaskOccurrence.objects.filter(date__range=(start, through))
+                                                   .values_list("id", "task_id", "date")
+    }
+    missing = want - have.keys()
+    stray = [occ_id for key, occ_id in have.items() if key not in want]
+    with transaction.atomic():
+        TaskOccurrence.objects.bulk_create(
+            [TaskOccurrence(task_id=pk, date=d) for pk, d in missing], batch_size=2000
+        )
+        for i in range(0, len(stray), 500):
+            TaskOccurrence.objects.filter(id__in=stray[i:i + 500]).delete()
+        if (horizon_through() or start) < through:
+            _set_through(through)
+    return len(missing), len(stray)
+
+
+def refresh_task(task):
+    """Re-materialize one task from today up to the current horizon."""
+    through = horizon_through()
+    if through is None:
+        return  # nothing materialized yet; ensure_horizon() will include this task
+    materialize([task], timezone.localdate(), through)
+
+
+def refresh_day(task, d: date):
+    """Re-materialize one task on one date (after a TaskSkip is added or removed)."""
+    through = horizon_through()
+    if through is None or not timezone.localdate() <= d <= through:
+        return
+    materialize([task], d, d)
+
+
+def tasks_occurring_on(d: date):
+    """Task ids occurring on `d`, as a subquery-friendly queryset (one indexed lookup)."""
+    ensure_horizon(max(d, timezone.localdate() + timedelta(days=HORIZON_DAYS)))
+    return TaskOccurrence.objects.filter(date=d).values("task_id")
@@ -0,0 +1,34 @@
+"""Per-transaction buffers flushed once after commit (services.broadcast, services.blobs).
+
+Django has no handle on "the current transaction" and no rollback hook, so a
+buffer lives on the connection next to the on_commit callback that flushes
+it. A buffer whose callback is no longer queued belongs to a transaction (or
+savepoint) that rolled back: it is dropped and a fresh one started.
+"""
+from django.db import connection, transaction
+
+
+def record(name, factory, fn):
+    """Apply `fn` to the current transaction's `name` buffer (made by `factory`); its flush() runs after commit.
+
+    In autocommit the write is already durable, so `fn` gets a fresh buffer
+    that is flushed at once.
+    """
+    if not connection.in_atomic_block:
+        buf = factory()
+        fn(buf)
+        buf.flush()
+        return
+    attr = f"_planner_oncommit_{name}"
+    buf, callback = getattr(connection, attr, (None, None))
+    if buf is None or not any(cb is callback for _, cb, _ in connection.run_on_commit):
+        buf = factory()
+
+        def callback():
+            if getattr(connection, attr, (None,))[0] is buf:
+                delattr(connection, attr)
+            buf.flush()
+
+        setattr(connection, attr, (buf, callback))
+        transaction.on_commit(callback)
+    fn(buf)
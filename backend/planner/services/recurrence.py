@@ -1,15 +1,39 @@
 from datetime import date, timedelta
 
-WD = ["MO","TU","WE","TH","FR","SA","SU"]
+from .rrule import rule_for
 
 def _in_range(d, start, end):
     if start and d < start: return False
     if end and d > end: return False
     return True
 
-def occurs_on(task, d: date) -> bool:
+def skip_map(tasks, start: date = None, end: date = None) -> dict:
+    """{task.pk: {date, ...}} of TaskSkip rows for saved `tasks`, optionally within [start, end]."""
+    from ..models import TaskSkip
+    pks = [t.pk for t in tasks if t.pk is not None]
+    out = {}
+    for i in range(0, len(pks), 500):
+        qs = TaskSkip.objects.filter(task_id__in=pks[i:i + 500])
+        if start and end:
+            qs = qs.filter(date__range=(start, end))
+        for pk, d in qs.values_list("task_id", "date"):
+            out.setdefault(pk, set()).add(d)
+    return out
+
+def task_skips(task) -> set:
+    """Skipped dates of one task, loaded once per instance (uses prefetch_related("skips") if present)."""
+    if not hasattr(task, "_skip_dates"):
+        cache = getattr(task, "_prefetched_objects_cache", {})
+        if "skips" in cache:
+            task._skip_dates = {s.date for s in cache["skips"]}
+        else:
+            task._skip_dates = skip_map([task]).get(task.pk, set())
+    return task._skip_dates
+
+def occurs_on(task, d: date, skips=None) -> bool:
+    """`skips`: the task's skipped dates, when the caller already has them (default: task_skips)."""
     if not _in_range(d, task.start_date, task.end_date): return False
-    if str(d) in (task.skip_dates or []): return False
+    if d in (task_skips(task) if skips is None else skips): return False
     rec = task.recurrence or "none"
     if rec == "none":
         return True  # one-time; you decide how to surface it (e.g., until scheduled)
@@ -27,17 +51,15 @@ def occurs_on(task, d: date) -> bool:
         weeks = (d - task.start_date).days // 7
         if weeks < 0 or (weeks % max(task.recur_interval,1)) != 0:
             return False
-        if task.recur_weekdays:
-            want = set(x.strip().upper() for x in task.recur_weekdays.split(",") if x.strip())
-            return WD[d.weekday()] in want
-        return True
+        mask = task.recur_weekday_mask
+        return not mask or bool(mask >> d.weekday() & 1)
     if rec == "monthly":
         # by day-of-month
         dom = task.recur_monthday or (task.start_date.day if task.start_date else d.day)
         return d.day == dom and _monthly_interval_ok(task, d)
     if rec == "custom":
-        # keep simple now; later you can parse rrule_text
-        return False
+        rule = rule_for(task)
+        return rule is not None and rule.occurs_on(d)
     return False
 
 def _monthly_interval_ok(task, d: date) -> bool:
@@ -45,3 +67,147 @@ def _monthly_interval_ok(task, d: date) -> bool:
     # months since start_date (approx)
     months = (d.year - task.start_date.year) * 12 + (d.month - task.start_date.month)
     return months >= 0 and months % max(task.recur_interval,1) == 0
+
+
+# ---------- range expansion ----------
+# A range [start, end] is a bitmap (plain int): bit i set <=> start + i days occurs.
+# Periodic rules are built with integer arithmetic instead of per-day loops, so
+# a whole month (or year) for one task costs a handful of big-int operations.
+
+def _ones(n: int) -> int:
+    return (1 << n) - 1 if n > 0 else 0
+
+def _repeat(pattern: int, period: int, n: int) -> int:
+    """Tile a `period`-bit pattern across n bits (pattern * 0b..0001 0001)."""
+    reps = -(-n // period)
+    unit = _ones(period * reps) // _ones(period)   # bit every `period` positions
+    return (pattern * unit) & _ones(n)
+
+def _rotate(pattern: int, period: int, shift: int) -> int:
+    """Drop the first `shift` bits of a periodic pattern (phase alignment)."""
+    shift %= period
+    return ((pattern >> shift) | (pattern << (period - shift))) & _ones(period)
+
+WEEKDAYS_BITS = 0b0011111
+WEEKENDS_BITS = 0b1100000
+
+
+class CompiledRule:
+    """A Task's recurrence parsed once; `mask()` answers a whole date range."""
+
+    def __init__(self, task, skips=()):
+        self.task_id = task.pk
+        self.rec = task.recurrence or "none"
+        self.start_date = task.start_date
+        self.end_date = task.end_date
+        self.interval = max(task.recur_interval or 0, 1)
+        self.monthday = task.recur_monthday
+        self.rrule = rule_for(task) if self.rec == "custom" else None
+        self.weekdays = task.recur_weekday_mask or None
+        self.skips = skips
+
+    def mask(self, start: date, end: date) -> int:
+        lo = max(start, self.start_date) if self.start_date else start
+        hi = min(end, self.end_date) if self.end_date else end
+        if hi < lo:
+            return 0
+        n = (end - start).days + 1
+        bits = self._periodic(start, n) & (_ones((hi - start).days + 1) ^ _ones((lo - start).days))
+        for d in self.skips:
+            if lo <= d <= hi:
+                bits &= ~(1 << (d - start).days)
+        return bits
+
+    def _periodic(self, start: date, n: int) -> int:
+        rec, s = self.rec, self.start_date
+        if rec == "none":
+            return _ones(n)
+        if rec == "daily":
+            if not s:
+                return _ones(n)
+            return _repeat(1, self.interval, n) << ((s - start).days % self.interval) & _ones(n)
+        if rec in ("weekdays", "weekends"):
+            week = WEEKDAYS_BITS if rec == "weekdays" else WEEKENDS_BITS
+            return _repeat(_rotate(week, 7, start.weekday()), 7, n)
+        if rec == "weekly":
+            if not s:
+                return _ones(n)
+            period = 7 * self.interval
+            week = _ones(7)
+            if self.weekdays is not None:
+                week = _rotate(self.weekdays, 7, s.weekday())   # bit 0 = start_date's weekday
+            return _repeat(_rotate(week, period, (start - s).days), period, n)
+        if rec == "monthly":
+            if not s and not self.monthday:
+                return _ones(n)   # occurs_on: dom falls back to d.day
+            return self._monthly(start, n)
+        if rec == "custom" and self.rrule:
+            end = start + timedelta(days=n - 1)
+            return sum(1 << (d - start).days for d in self.rrule.between(start, end))
+        return 0
+
+    def _monthly(self, start: date, n: int) -> int:
+        s = self.start_date
+        dom = self.monthday or s.day
+        end = start + timedelta(days=n - 1)
+        y, m = start.year, start.month
+        if s:
+            # jump to the first month on the interval grid
+            months = (y - s.year) * 12 + (m - s.month)
+            if months < 0:
+                y, m, months = s.year, s.month, 0
+            step = -months % self.interval
+            m += step
+            y, m = y + (m - 1) // 12, (m - 1) % 12 + 1
+        bits = 0
+        while (y, m) <= (end.year, end.month):
+            try:
+                d = date(y, m, dom)
+            except ValueError:
+                d = None   # e.g. the 31st in a 30-day month never matches
+            if d and start <= d <= end:
+                bits |= 1 << (d - start).days
+            m += self.interval if s else 1
+            y, m = y + (m - 1) // 12, (m - 1) % 12 + 1
+        return bits
+
+
+def compile_rule(task, skips=()) -> CompiledRule:
+    return CompiledRule(task, skips)
+
+def _days(start: date, end: date) -> list:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+def iter_mask(start: date, bits: int, days=None):
+    """Yield the dates whose bits are set, in order (`days` = precomputed _days())."""
+    while bits:
+        low = bits & -bits
+        i = low.bit_length() - 1
+        yield days[i] if days is not None else start + timedelta(days=i)
+        bits ^= low
+
+def expand_occurrences(tasks, start: date, end: date, skips=None) -> dict:
+    """{task.pk: [date, ...]} for every task over [start, end]; same answers as occurs_on.
+
+    `skips` is a skip_map(); by default it is loaded with one query per 500 tasks.
+    """
+    if end < start:
+        return {t.pk: [] for t in tasks}
+    if skips is None:
+        skips = skip_map(tasks, start, end)
+    days = _days(start, end)
+    return {t.pk: list(iter_mask(start, compile_rule(t, skips.get(t.pk, ())).mask(start, end), days))
+            for t in tasks}
+
+def occurrences_by_date(tasks, start: date, end: date, skips=None) -> dict:
+    """{date: [task, ...]} over [start, end], tasks kept in input order."""
+    by_date = {}
+    if end < start:
+        return by_date
+    if skips is None:
+        skips = skip_map(tasks, start, end)
+    days = _days(start, end)
+    for t in tasks:
+        for d in iter_mask(start, compile_rule(t, skips.get(t.pk, ())).mask(start, end), days):
+            by_date.setdefault(d, []).append(t)
+    return by_date
@@ -0,0 +1,283 @@
+"""Date-level RFC 5545 RRULE support for Task.recurrence == "custom".
+
+Supported parts: FREQ (DAILY/WEEKLY/MONTHLY/YEARLY), INTERVAL, BYDAY (with
+ordinals like 2TU / -1FR), BYMONTHDAY, BYMONTH, BYSETPOS, COUNT, UNTIL, WKST.
+Time-of-day parts (BYHOUR, ...) are rejected: plan items carry their own times.
+
+Iteration walks *periods* (day / week / month / year), never single days, and
+jumps straight to the first period on the INTERVAL grid, so next_after() on
+"2nd Tuesday every 3 months" touches one or two months, not ninety days.
+"""
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from functools import lru_cache
+
+WD = ["MO","TU","WE","TH","FR","SA","SU"]
+FREQS = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+# give up after this many consecutive empty periods (e.g. BYMONTHDAY=30;BYMONTH=2)
+MAX_EMPTY = {"DAILY": 3000, "WEEKLY": 600, "MONTHLY": 600, "YEARLY": 100}
+MAX_COUNT = 10000
+
+# anchor for rules on tasks without a start_date
+DEFAULT_DTSTART = date(1970, 1, 1)
+
+
+class RRuleError(ValueError):
+    pass
+
+
+def _ints(value, key, lo, hi):
+    try:
+        out = [int(x) for x in value.split(",")]
+    except ValueError:
+        raise RRuleError(f"{key}: expected integers, got {value!r}")
+    for n in out:
+        if n == 0 or not (lo <= abs(n) <= hi):
+            raise RRuleError(f"{key}: {n} out of range")
+    return tuple(out)
+
+def _byday(value):
+    out = []
+    for tok in value.split(","):
+        tok = tok.strip().upper()
+        wd, num = tok[-2:], tok[:-2]
+        if wd not in WD:
+            raise RRuleError(f"BYDAY: bad weekday {tok!r}")
+        try:
+            n = int(num) if num not in ("", "+") else None
+        except ValueError:
+            raise RRuleError(f"BYDAY: bad ordinal {tok!r}")
+        if n is not None and (n == 0 or abs(n) > 53):
+            raise RRuleError(f"BYDAY: ordinal out of range in {tok!r}")
+        out.append((n, WD.index(wd)))
+    return tuple(out)
+
+def _until(value):
+    v = value.strip().upper()
+    try:
+        if len(v) >= 8 and v[:8].isdigit():
+            return date(int(v[:4]), int(v[4:6]), int(v[6:8]))
+        return date.fromisoformat(v)
+    except ValueError:
+        raise RRuleError(f"UNTIL: bad date {value!r}")
+
+
+class RRule:
+    def __init__(self, freq, dtstart, interval=1, byday=(), bymonthday=(), bymonth=(),
+                 bysetpos=(), count=None, until=None, wkst=0):
+        self.freq = freq
+        self.dtstart = dtstart
+        self.interval = interval
+        self.byday = byday
+        self.bymonthday = bymonthday
+        self.bymonth = bymonth
+        self.bysetpos = bysetpos
+        self.count = count
+        self.until = until
+        self.wkst = wkst
+        if freq in ("DAILY", "WEEKLY") and any(n is not None for n, _ in byday):
+            raise RRuleError(f"BYDAY ordinals are not allowed with FREQ={freq}")
+        if freq == "YEARLY" and not bymonth and any(n is not None for n, _ in byday):
+            raise RRuleError("BYDAY ordinals with FREQ=YEARLY need BYMONTH")
+        if freq == "WEEKLY" and bymonthday:
+            raise RRuleError("BYMONTHDAY is not allowed with FREQ=WEEKLY")
+        self._all = None  # finite occurrence list, built lazily when COUNT is set
+
+    @classmethod
+    def parse(cls, text, dtstart):
+        text = (text or "").strip()
+        if text.upper().startswith("RRULE:"):
+            text = text[6:]
+        parts = {}
+        for chunk in text.split(";"):
+            if not chunk.strip():
+                continue
+            key, sep, value = chunk.partition("=")
+            key = key.strip().upper()
+            if not sep or not value.strip():
+                raise RRuleError(f"bad part {chunk!r}")
+            if key in parts:
+                raise RRuleError(f"{key} given twice")
+            parts[key] = value.strip()
+
+        freq = parts.pop("FREQ", "").upper()
+        if freq not in FREQS:
+            raise RRuleError(f"FREQ must be one of {', '.join(FREQS)}")
+        kw = {}
+        if "INTERVAL" in parts:
+            kw["interval"] = _ints(parts.pop("INTERVAL"), "INTERVAL", 1, 10000)[0]
+        if "BYDAY" in parts:
+            kw["byday"] = _byday(parts.pop("BYDAY"))
+        if "BYMONTHDAY" in parts:
+            kw["bymonthday"] = _ints(parts.pop("BYMONTHDAY"), "BYMONTHDAY", 1, 31)
+        if "BYMONTH" in parts:
+            kw["bymonth"] = tuple(sorted({n for n in _ints(parts.pop("BYMONTH"), "BYMONTH", 1, 12) if n > 0}))
+        if "BYSETPOS" in parts:
+            kw["bysetpos"] = _ints(parts.pop("BYSETPOS"), "BYSETPOS", 1, 366)
+        if "COUNT" in parts and "UNTIL" in parts:
+            raise RRuleError("COUNT and UNTIL are mutually exclusive")
+        if "COUNT" in parts:
+            kw["count"] = _ints(parts.pop("COUNT"), "COUNT", 1, MAX_COUNT)[0]
+        if "UNTIL" in parts:
+            kw["until"] = _until(parts.pop("UNTIL"))
+        if "WKST" in parts:
+            wkst = parts.pop("WKST").upper()
+            if wkst not in WD:
+                raise RRuleError(f"WKST: bad weekday {wkst!r}")
+            kw["wkst"] = WD.index(wkst)
+        if parts:
+            raise RRuleError(f"unsupported: {', '.join(sorted(parts))}")
+        return cls(freq, dtstart, **kw)
+
+    # ----- periods -----
+    def _period_of(self, d):
+        s = self.dtstart
+        if self.freq == "DAILY":
+            return (d - s).days
+        if self.freq == "WEEKLY":
+            return (self._week_start(d) - self._week_start(s)).days // 7
+        if self.freq == "MONTHLY":
+            return (d.year - s.year) * 12 + d.month - s.month
+        return d.year - s.year
+
+    def _week_start(self, d):
+        return d - timedelta(days=(d.weekday() - self.wkst) % 7)
+
+    def _period_start(self, p):
+        s = self.dtstart
+        if self.freq == "DAILY":
+            return s + timedelta(days=p)
+        if self.freq == "WEEKLY":
+            return self._week_start(s) + timedelta(weeks=p)
+        if self.freq == "MONTHLY":
+            y, m = divmod(s.month - 1 + p, 12)
+            return date(s.year + y, m + 1, 1)
+        return date(s.year + p, 1, 1)
+
+    def _month_days(self, y, m):
+        """Candidate days of one month for MONTHLY / YEARLY expansion."""
+        if self.bymonth and m not in self.bymonth:
+            return []
+        ndays = calendar.monthrange(y, m)[1]
+        days = None
+        if self.bymonthday:
+            days = {n if n > 0 else ndays + n + 1 for n in self.bymonthday if abs(n) <= ndays}
+        if self.byday:
+            first_wd = date(y, m, 1).weekday()
+            wd_days = set()
+            for n, wd in self.byday:
+                first = 1 + (wd - first_wd) % 7
+                hits = list(range(first, ndays + 1, 7))
+                if n is None:
+                    wd_days.update(hits)
+                elif -len(hits) <= n <= len(hits):
+                    wd_days.add(hits[n - 1] if n > 0 else hits[n])
+            days = wd_days if days is None else days & wd_days   # BYDAY limits BYMONTHDAY
+        if days is not None:
+            return [date(y, m, x) for x in sorted(days)]
+        if self.freq == "YEARLY" and not self.bymonth and m != self.dtstart.month:
+            return []
+        dom = self.dtstart.day
+        return [date(y, m, dom)] if dom <= ndays else []
+
+    def _candidates(self, p):
+        start = self._period_start(p)
+        if self.freq == "DAILY":
+            days = [start]
+        elif self.freq == "WEEKLY":
+            wds = {wd for _, wd in self.byday} or {self.dtstart.weekday()}
+            days = [start + timedelta(days=i) for i in range(7)
+                    if (start + timedelta(days=i)).weekday() in wds]
+        elif self.freq == "MONTHLY":
+            return self._setpos(self._month_days(start.year, start.month))
+        else:
+            months = self.bymonth or (range(1, 13) if self.bymonthday or self.byday else (self.dtstart.month,))
+            return self._setpos([d for m in sorted(months) for d in self._month_days(start.year, m)])
+        # DAILY / WEEKLY: BYxx parts only filter
+        if self.bymonth:
+            days = [d for d in days if d.month in self.bymonth]
+        if self.bymonthday:
+            days = [d for d in days if self._monthday_ok(d)]
+        if self.byday and self.freq == "DAILY":
+            wds = {wd for _, wd in self.byday}
+            days = [d for d in days if d.weekday() in wds]
+        return self._setpos(days)
+
+    def _monthday_ok(self, d):
+        ndays = calendar.monthrange(d.year, d.month)[1]
+        return any(d.day == (n if n > 0 else ndays + n + 1) for n in self.bymonthday)
+
+    def _setpos(self, days):
+        if not self.bysetpos or not days:
+            return days
+        picked = {days[n - 1] if n > 0 else days[n] for n in self.bysetpos if -len(days) <= n <= len(days)}
+        return sorted(picked)
+
+    # ----- iteration -----
+    def _iter_from(self, d, stop=None):
+        """Occurrences >= d in order (ignores COUNT), stopping after `stop` / UNTIL."""
+        d = max(d, self.dtstart)
+        last = min(x for x in (stop, self.until) if x) if (stop or self.until) else None
+        p = max(self._period_of(d), 0)
+        p += -p % self.interval
+        empty = 0
+        while empty < MAX_EMPTY[self.freq]:
+            if last and self._period_start(p) > last:
+                return
+            hits = [x for x in self._candidates(p) if x >= d]
+            empty = 0 if hits else empty + 1
+            for x in hits:
+                if last and x > last:
+                    return
+                yield x
+            p += self.interval
+
+    def _finite(self):
+        if self._all is None:
+            out = []
+            for x in self._iter_from(self.dtstart):
+                out.append(x)
+                if len(out) >= self.count:
+                    break
+            self._all = out
+        return self._all
+
+    def next_on_or_after(self, d):
+        if self.count:
+            occ = self._finite()
+            i = bisect_left(occ, d)
+            return occ[i] if i < len(occ) else None
+        return next(self._iter_from(d), None)
+
+    def next_after(self, d):
+        """First occurrence strictly after `d` (None when the rule is exhausted)."""
+        return self.next_on_or_after(d + timedelta(days=1))
+
+    def occurs_on(self, d):
+        return self.next_on_or_after(d) == d
+
+    def between(self, start, end):
+        """All occurrences in [start, end]."""
+        if self.count:
+            occ = self._finite()
+            return occ[bisect_left(occ, start):bisect_right(occ, end)]
+        return list(self._iter_from(start, stop=end))
+
+
+@lru_cache(maxsize=4096)
+def _compile(text, dtstart):
+    try:
+        return RRule.parse(text, dtstart)
+    except RRuleError:
+        return None
+
+def rule_for(task):
+    """Compiled RRule for a custom-recurrence task (None if missing or invalid).
+
+    Cached on (rrule_text, start_date), so editing either field recompiles.
+    """
+    if not task.rrule_text:
+        return None
+    return _compile(task.rrule_text, task.start_date or DEFAULT_DTSTART)
@@ -0,0 +1,156 @@
+"""Automatic day plan: fit today's eligible tasks into the free time of a DayPlan.
+
+Free time is kept as two parallel sorted lists (gap starts / gap ends), so each
+placement is a bisect plus a walk over the few gaps inside the task's window,
+never a rescan of every placed item.
+"""
+from bisect import bisect_right
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ..models import MIDNIGHT, PlanItem, Task
+from . import counters
+
+DAY_END = MIDNIGHT   # the last slot may run up to midnight (stored as 1440)
+
+# desired_time -> (start, end) in minutes
+WINDOWS = {
+    "early_morning": (5 * 60, 8 * 60),
+    "morning": (8 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 21 * 60),
+    "night": (21 * 60, DAY_END),
+    "any": (0, DAY_END),
+}
+
+
+class FreeSlots:
+    """Disjoint free intervals [start, end) of one day."""
+
+    def __init__(self, lo=0, hi=DAY_END):
+        self.starts = [lo] if hi > lo else []
+        self.ends = [hi] if hi > lo else []
+        self.free = max(hi - lo, 0)
+
+    def reserve(self, s, e):
+        """Mark [s, e) busy (it may span several gaps or none)."""
+        i = max(bisect_right(self.starts, s) - 1, 0)
+        while i < len(self.starts) and self.starts[i] < e:
+            gs, ge = self.starts[i], self.ends[i]
+            if ge <= s:
+                i += 1
+                continue
+            self.free -= min(ge, e) - max(gs, s)
+            pieces = [(a, b) for a, b in ((gs, s), (e, ge)) if b > a]
+            self.starts[i:i + 1] = [a for a, _ in pieces]
+            self.ends[i:i + 1] = [b for _, b in pieces]
+            i += len(pieces)
+
+    def first_fit(self, duration, lo, hi):
+        """Earliest start in [lo, hi - duration] whose slot is entirely free, else None."""
+        if duration > self.free:
+            return None
+        i = max(bisect_right(self.starts, lo) - 1, 0)
+        while i < len(self.starts) and self.starts[i] + duration <= hi:
+            s = max(self.starts[i], lo)
+            if s + duration <= min(self.ends[i], hi):
+                return s
+            i += 1
+        return None
+
+
+OVERDUE = -1   # _deadline_min of a task due on an earlier day: placed first, as soon as possible
+
+
+def _deadline_min(task, day):
+    """Minute of the day the task is due, OVERDUE if due on an earlier day, None if not due on `day`."""
+    if not task.deadline_at:
+        return None
+    due = timezone.localtime(task.deadline_at)
+    if due.date() > day:
+        return None
+    if due.date() < day:
+        return OVERDUE
+    return due.hour * 60 + due.minute
+
+def _rank(task, day):
+    due = _deadline_min(task, day)
+    far = task.deadline_at or datetime.max.replace(tzinfo=dt_timezone.utc)
+    # overdue, then due-today (earliest deadline first), then priority, then sooner deadlines, then short tasks
+    return (due is None, due if due is not None else 0, -task.priority, far, task.duration_min, task.pk or 0)
+
+
+def schedule(tasks, busy, day, not_before=0):
+    """Pure placement step: returns [(task, start_min, end_min), ...] sorted by start.
+
+    `busy` is an iterable of (start_min, end_min) already taken on `day`.
+    Tasks are tried in rank order inside their desired_time window; a task due
+    today may fall back to any free time before its deadline, an overdue one
+    to any free time left in the day.
+    """
+    slots = FreeSlots(not_before, DAY_END)
+    for s, e in busy:
+        slots.reserve(s, e)
+
+    placed = []
+    for t in sorted(tasks, key=lambda t: _rank(t, day)):
+        dur = t.duration_min or 0
+        if dur <= 0:
+            continue
+        lo, hi = WINDOWS.get(t.desired_time, WINDOWS["any"])
+        due = _deadline_min(t, day)
+        if due is not None and due != OVERDUE:
+            hi = min(hi, due)
+        start = slots.first_fit(dur, lo, hi)
+        if start is None and due is not None:
+            start = slots.first_fit(dur, not_before, DAY_END if due == OVERDUE else due)
+        if start is None:
+            continue
+        slots.reserve(start, start + dur)
+        placed.append((t, start, start + dur))
+    placed.sort(key=lambda p: p[1])
+    return placed
+
+
+def candidate_tasks(plan):
+    """Active tasks occurring on the plan's date that are not on the plan yet."""
+    from .occurrences import tasks_occurring_on
+    on_plan = PlanItem.objects.filter(plan=plan, task=OuterRef("pk"))
+    return (
+        Task.objects.filter(active=True, id__in=tasks_occurring_on(plan.date))
+            .exclude(Exists(on_plan))
+            .select_related("group")
+    )
+
+
+@transaction.atomic
+def plan_day(plan, tasks=None, not_before=None):
+    """Place eligible tasks into the free time of `plan`; returns the created PlanItems."""
+    if tasks is None:
+        tasks = candidate_tasks(plan)
+    if not_before is None:
+        now = timezone.localtime()
+        not_before = now.hour * 60 + now.minute if plan.date == now.date() else 0
+
+    from .intervals import IntervalIndex
+    index = IntervalIndex.for_plan(plan)
+    existing = len(index)
+
+    placed = schedule(tasks, index.blocks(), plan.date, not_before=not_before)
+    items = [
+        PlanItem(
+            plan=plan, task=t, group_name=t.group.name,
+            start_min=s, end_min=e,
+            order=existing + i, done=False, auto=True,
+        )
+        for i, (t, s, e) in enumerate(placed)
+    ]
+    PlanItem.objects.bulk_create(items)
+    counters.adjust(counters.tally(items), plans=[plan], changed=[(plan.id, it.id) for it in items])
+    one_time = [t.id for t, _, _ in placed if t.recurrence == "none"]
+    if one_time:
+        Task.objects.filter(id__in=one_time).update(active=False, updated_at=timezone.now())  # same as placing by hand
+    return items
@@ -0,0 +1,239 @@
+"""Attachment uploads that never hold a whole file in memory.
+
+Resumable protocol (views attach_upload_start / attach_upload_chunk):
+
+    POST  /agenda/task/<id>/attach/uploads/   {"name", "size", "content_type"?, "sha256"?}
+          -> 201 {"id", "offset": 0, "chunk_size"}
+    PATCH /agenda/attach/uploads/<id>/        Upload-Offset: n, body = the next bytes
+          -> {"offset"}; the chunk that reaches "size" returns the new attachment
+    GET   /agenda/attach/uploads/<id>/        -> {"offset", "size"}: where to resume
+          (plus "item" if every byte was in and the upload is finished now)
+    DELETE the same URL abandons the upload.
+
+start() checks the declared size against settings.ATTACHMENT_MAX_MB and
+the name against TaskAttachment's extension list. append() copies the
+request body to the partial file under MEDIA_ROOT/.partial in CHUNK_SIZE
+reads, refusing bytes past the declared size as they arrive, and commits
+the new offset. It holds an exclusive lock on the partial file (flock, so
+every worker on the host sees it) from the offset check to the commit; a
+request that finds it taken gets 409. A chunk that breaks off half-way is
+not committed; the next append truncates the file back to the committed
+offset, so a client resumes from GET's "offset". An upload whose offset
+reached its size but whose finish() failed is finished by the next GET or
+PATCH (complete()).
+
+The SHA-256 is fed as bytes are written. hashlib state cannot be stored,
+so it is kept per process (_hashers); a resume in another worker rehashes
+the committed prefix from disk, in chunks. finish() hands the partial
+file to services.blobs, which renames it into storage (same filesystem)
+unless a blob already has those bytes, and records size and digest on the
+TaskAttachment. Deleting an AttachmentUpload row, directly or with its
+task, removes the partial file (planner.signals).
+
+For the plain multipart view, LimitedHashingUploadHandler applies the
+same limit and hashing while Django parses the request.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import AttachmentUpload, TaskAttachment
+from . import blobs
+
+CHUNK_SIZE = 64 * 1024             # bytes read from the request / disk at a time
+CLIENT_CHUNK_SIZE = 1024 * 1024    # suggested PATCH size
+STALE_AFTER = timedelta(days=1)
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+_hashers = {}   # upload id -> (committed offset, sha256 object); this process only
+
+
+class UploadError(Exception):
+    """`status` is the HTTP status to answer with; `offset` the committed offset, when it matters."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def max_bytes():
+    return settings.ATTACHMENT_MAX_MB * 1024 * 1024
+
+
+def partial_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, ".partial", f"{upload.id}.part")
+
+
+def _check_name(name):
+    for validator in TaskAttachment._meta.get_field("file").validators:
+        try:
+            validator(File(None, name=name))
+        except ValidationError as e:
+            raise UploadError(" ".join(e.messages), status=415)
+
+
+def start(task, name, size, content_type="", sha256="") -> AttachmentUpload:
+    name = os.path.basename(name or "").strip()
+    if not name:
+        raise UploadError("Missing file name")
+    _check_name(name)
+    if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+        raise UploadError("size must be a positive number of bytes")
+    if size > max_bytes():
+        raise UploadError(f"{name}: too large (>{settings.ATTACHMENT_MAX_MB}MB)", status=413)
+    sha256 = sha256 or ""
+    if sha256 and not (isinstance(sha256, str) and _SHA256.fullmatch(sha256.lower())):
+        raise UploadError("sha256 must be 64 hexadecimal characters")
+    upload = AttachmentUpload.objects.create(task=task, original_name=name, size=size,
+                                             content_type=(content_type or "")[:80], sha256=sha256.lower())
+    os.makedirs(os.path.dirname(partial_path(upload)), exist_ok=True)
+    open(partial_path(upload), "wb").close()
+    _hashers[upload.id] = (0, hashlib.sha256())
+    return upload
+
+
+def _hasher(upload, f):
+    """The digest of the committed prefix, rebuilt from the open partial file if this process has none."""
+    cached = _hashers.get(upload.id)
+    if cached and cached[0] == upload.offset:
+        return cached[1]
+    h = hashlib.sha256()
+    f.seek(0)
+    left = upload.offset
+    while left:
+        block = f.read(min(CHUNK_SIZE, left))
+        if not block:
+            raise UploadError("The partial file is shorter than its offset; start over", status=410)
+        h.update(block)
+        left -= len(block)
+    return h
+
+
+def append(upload, offset, stream):
+    """Write `stream` (a file-like request body) at `offset`; the TaskAttachment once complete, else None."""
+    try:
+        f = open(partial_path(upload), "r+b")
+    except FileNotFoundError:
+        raise UploadError("This upload's data is gone; start over", status=410)
+    with f:
+        # a file lock rather than a row lock: on SQLite that would hold the
+        # database's write lock while the body streams in
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another request is writing to this upload", status=409, offset=upload.offset)
+        try:
+            upload.refresh_from_db(fields=["offset"])
+        except AttachmentUpload.DoesNotExist:   # finished or abandoned meanwhile
+            raise UploadError("This upload is closed; start over", status=410)
+        if offset != upload.offset:
+            raise UploadError("Upload-Offset does not match the committed offset", status=409, offset=upload.offset)
+        h = _hasher(upload, f)
+        f.seek(upload.offset)
+        f.truncate()
+        end = upload.offset
+        while True:
+            block = stream.read(CHUNK_SIZE)
+            if not block:
+                break
+            if end + len(block) > upload.size:
+                f.truncate(upload.offset)
+                raise UploadError(f"More than the declared {upload.size} bytes", status=413, offset=upload.offset)
+            f.write(block)
+            h.update(block)
+            end += len(block)
+        f.flush()
+        os.fsync(f.fileno())
+
+        if end != upload.offset:
+            AttachmentUpload.objects.filter(pk=upload.pk).update(offset=end, updated_at=timezone.now())
+            upload.offset = end
+        _hashers[upload.id] = (end, h)
+        # still under the lock, so a retry waits for this finish() rather than racing it
+        return finish(upload, h.hexdigest()) if end == upload.size else None
+
+
+def complete(upload):
+    """Finish an upload that has all its bytes (a finish() that failed after the last chunk); None if it has not."""
+    if upload.offset < upload.size:
+        return None
+    return append(upload, upload.offset, io.BytesIO())
+
+
+class _PartialFile(File):
+    # FileSystemStorage moves a file that has a temporary_file_path instead of copying it
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def finish(upload, digest) -> TaskAttachment:
+    if upload.sha256 and upload.sha256 != digest:
+        discard(upload)
+        raise UploadError("The received file does not match its sha256", status=422)
+    with transaction.atomic():
+        with open(partial_path(upload), "rb") as f:
+            blob = blobs.store(_PartialFile(f), upload.original_name, digest)
+        att = TaskAttachment.objects.create(
+            task_id=upload.task_id, blob=blob, file=blob.file.name, original_name=upload.original_name,
+            content_type=upload.content_type, size=upload.size, sha256=digest,
+        )
+        upload.delete()   # and, with it, the partial file when the blob already existed
+    return att
+
+
+def remove_partial(upload):
+    """Delete the partial file (post_delete of AttachmentUpload: finished, discarded or cascaded)."""
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    _hashers.pop(upload.id, None)
+
+
+def discard(upload):
+    upload.delete()
+
+
+def expire(now=None) -> int:
+    """Drop uploads nobody has written to for STALE_AFTER; returns how many."""
+    stale = list(AttachmentUpload.objects.filter(updated_at__lt=(now or timezone.now()) - STALE_AFTER))
+    for upload in stale:
+        discard(upload)
+    return len(stale)
+
+
+class LimitedHashingUploadHandler(FileUploadHandler):
+    """Goes first in request.upload_handlers: stops the parse once a file passes `limit` bytes, and
+    records each complete file's SHA-256 in `digests` (field name -> list, in upload order)."""
+
+    def __init__(self, request, limit):
+        super().__init__(request)
+        self.limit = limit
+        self.too_large = None
+        self.digests = {}
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self._sha = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limit:
+            self.too_large = self.file_name
+            raise StopUpload(connection_reset=True)
+        self._sha.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests.setdefault(self.field_name, []).append(self._sha.hexdigest())
+        return None
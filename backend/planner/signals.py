@@ -0,0 +1,84 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    AttachmentUpload, DayTemplate, DayTemplateItem, Task, TaskAttachment, TaskDrawing, TaskGroup, TaskSkip,
+)
+from .services import blobs
+from .services.dayplans import clear_template_cache
+from .services.occurrences import RECURRENCE_FIELDS, refresh_day, refresh_task
+from .services.uploads import remove_partial
+
+
+def _recurrence_state(task):
+    # read __dict__ directly so deferred fields are not fetched just for the snapshot
+    return tuple(
+        tuple(v) if isinstance(v, list) else v
+        for v in (task.__dict__.get(f) for f in RECURRENCE_FIELDS)
+    )
+
+
+@receiver(post_init, sender=Task)
+def _remember_recurrence(sender, instance, **kwargs):
+    instance._recurrence_state = _recurrence_state(instance)
+
+
+@receiver(post_save, sender=Task)
+def _refresh_occurrences(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Keep TaskOccurrence in step when a task's schedule changes.
+
+    Deleting a task needs no handler: its occurrence rows go with the FK cascade.
+    """
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(RECURRENCE_FIELDS):
+        return
+    state = _recurrence_state(instance)
+    if created or state != instance._recurrence_state:
+        refresh_task(instance)
+    instance._recurrence_state = state
+
+
+def _touch(task_id):
+    # a skip is part of the task's schedule: move the stamps the catalog ETag and .ics feed are built on
+    Task.objects.filter(pk=task_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=TaskSkip)
+def _skip_added(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_day(instance.task, instance.date)
+        _touch(instance.task_id)
+
+
+@receiver(post_delete, sender=TaskSkip)
+def _skip_removed(sender, instance, origin=None, **kwargs):
+    # skips cascading from a task (or group) delete need no refresh: the occurrences go too
+    if isinstance(origin, TaskSkip) or getattr(origin, "model", None) is TaskSkip:
+        refresh_day(instance.task, instance.date)
+        _touch(instance.task_id)
+
+
+@receiver(post_save, sender=DayTemplate)
+@receiver(post_delete, sender=DayTemplate)
+@receiver(post_save, sender=DayTemplateItem)
+@receiver(post_delete, sender=DayTemplateItem)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TaskGroup)
+def _templates_changed(sender, **kwargs):
+    # template slots carry the task's group name; cheap enough to drop on every task save
+    clear_template_cache()
+
+
+@receiver(post_delete, sender=AttachmentUpload)
+def _drop_partial_file(sender, instance, **kwargs):
+    # also when the upload goes with its task's cascade, which expire() would never see
+    remove_partial(instance)
+
+
+@receiver(post_delete, sender=TaskAttachment)
+@receiver(post_delete, sender=TaskDrawing)
+def _release_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        blobs.release(instance.blob_id)
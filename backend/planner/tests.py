@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import asyncio
+import base64
+import fcntl
+import hashlib
+import importlib
+import json
+import os
+import random
+import tempfile
+from datetime import date, datetime, time, timedelta
+from email.utils import format_datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+
+from .ics import _local, _utc, fold, task_rrule
+from .management.commands.bench_scheduler import synthetic_tasks
+from .management.commands.seed_planner import flush, generate
+from .models import (
+    WEEKDAY_CODES, AttachmentUpload, Blob, DayPlan, DayTemplate, DayTemplateItem, PlanItem, Task, TaskAttachment,
+    TaskChecklistItem, TaskDrawing, TaskGroup, TaskOccurrence, TaskSkip, hhmm_to_min,
+)
+from .routing import websocket_urlpatterns
+from .services import blobs, counters, occurrences, uploads
+from .services.broadcast import TASKS_GROUP, plan_group
+from .services.checklist import ORDER_GAP, ChecklistError, apply
+from .services.counters import drifted, recount
+from .services.dayplans import clear_template_cache, ensure_plans, template_for
+from .services.delays import apply_delays
+from .services.horizon import plan_horizon, replan_day, unscheduled_due
+from .services.importer import ImportFileError, import_tasks, read_rows
+from .services.intervals import IntervalConflict, IntervalIndex
+from .services.recurrence import occurs_on, expand_occurrences
+from .services.rrule import RRule, RRuleError
+from .services.scheduler import WINDOWS, plan_day, schedule
+from .views import AGENDAS_PAGE_SIZE
+from abhijitongit_be.channel_layers import SQLiteChannelLayer
+from abhijitongit_be.querybudget import QueryBudgetTestMixin, budget_for
+
+
+class LoggedInTestCase(TestCase):
+    """setUp logs the test client in (self.user) and creates the task group "G" (self.group)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("u", password="p")
+        self.client.force_login(self.user)
+        self.group = TaskGroup.objects.create(name="G")
+
+
+class ExpandOccurrencesTests(TestCase):
+    def _task(self, pk, **kw):
+        kw.setdefault("recurrence", "daily")
+        return Task(pk=pk, title=f"t{pk}", **kw)
+
+    def test_matches_occurs_on(self):
+        start, end = date(2025, 1, 1), date(2025, 12, 31)
+        tasks = []
+        pk = 0
+        for rec in ["none", "daily", "weekly", "weekdays", "weekends", "monthly", "custom"]:
+            for interval in [0, 1, 3]:
+                for sd in [None, date(2024, 11, 20), date(2025, 2, 14)]:
+                    for wd in ["", "MO,we", " , "]:
+                        for dom in [None, 0, 31]:
+                            pk += 1
+                            tasks.append(self._task(
+                                pk, recurrence=rec, recur_interval=interval, start_date=sd,
+                                end_date=date(2025, 9, 1) if pk % 4 == 0 else None,
+                                recur_weekdays=wd, recur_monthday=dom,
+                            ))
+        skipped = {date(2025, 3, 5), date(2025, 2, 14)}
+        skips = {t.pk: skipped for t in tasks if t.pk % 2}
+
+        got = expand_occurrences(tasks, start, end, skips)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        for t in tasks:
+            want = [d for d in days if occurs_on(t, d, skips.get(t.pk, set()))]
+            self.assertEqual(got[t.pk], want, t.__dict__)
+
+    def test_custom_rules_match_occurs_on(self):
+        start, end = date(2025, 1, 1), date(2026, 6, 30)
+        rules = ["FREQ=MONTHLY;INTERVAL=3;BYDAY=2TU", "FREQ=WEEKLY;BYDAY=MO,FR;COUNT=9",
+                 "FREQ=DAILY;INTERVAL=10;UNTIL=20250601", "FREQ=BOGUS", ""]
+        tasks = [self._task(i, recurrence="custom", rrule_text=r, start_date=date(2025, 2, 1))
+                 for i, r in enumerate(rules, 1)]
+        skips = {t.pk: {date(2025, 2, 7)} for t in tasks}
+        got = expand_occurrences(tasks, start, end, skips)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        for t in tasks:
+            self.assertEqual(got[t.pk], [d for d in days if occurs_on(t, d, skips[t.pk])], t.rrule_text)
+        self.assertEqual(len(got[2]), 8)  # COUNT=9 minus one skip date
+
+    def test_empty_range(self):
+        t = self._task(1)
+        self.assertEqual(expand_occurrences([t], date(2025, 1, 2), date(2025, 1, 1)), {1: []})
+
+
+class RRuleTests(TestCase):
+    def test_second_tuesday_every_three_months(self):
+        r = RRule.parse("RRULE:FREQ=MONTHLY;INTERVAL=3;BYDAY=2TU", date(2025, 1, 1))
+        self.assertEqual(r.between(date(2025, 1, 1), date(2025, 12, 31)),
+                         [date(2025, 1, 14), date(2025, 4, 8), date(2025, 7, 8), date(2025, 10, 14)])
+        self.assertEqual(r.next_after(date(2025, 1, 14)), date(2025, 4, 8))
+        self.assertEqual(r.next_after(date(2030, 5, 1)), date(2030, 7, 9))
+
+    def test_last_weekday_of_month_with_bysetpos(self):
+        r = RRule.parse("FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1", date(2025, 1, 1))
+        self.assertEqual(r.between(date(2025, 5, 1), date(2025, 8, 31)),
+                         [date(2025, 5, 30), date(2025, 6, 30), date(2025, 7, 31), date(2025, 8, 29)])
+
+    def test_count_and_until_end_the_rule(self):
+        r = RRule.parse("FREQ=WEEKLY;BYDAY=SA;COUNT=2", date(2025, 3, 1))
+        self.assertEqual(r.between(date(2025, 1, 1), date(2025, 12, 31)), [date(2025, 3, 1), date(2025, 3, 8)])
+        self.assertIsNone(r.next_after(date(2025, 3, 8)))
+        r = RRule.parse("FREQ=YEARLY;UNTIL=20270228T000000Z", date(2024, 2, 29))
+        self.assertEqual(r.between(date(2024, 1, 1), date(2032, 12, 31)), [date(2024, 2, 29)])
+        self.assertIsNone(r.next_after(date(2024, 2, 29)))
+
+    def test_invalid_rules(self):
+        for text in ["", "FREQ=HOURLY", "FREQ=DAILY;BYHOUR=9", "FREQ=WEEKLY;BYDAY=2MO",
+                     "FREQ=MONTHLY;COUNT=2;UNTIL=20250101", "FREQ=MONTHLY;BYMONTHDAY=32"]:
+            with self.assertRaises(RRuleError, msg=text):
+                RRule.parse(text, date(2025, 1, 1))
+
+
+class TaskOccurrenceTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.group = TaskGroup.objects.create(name="G")
+        occurrences.ensure_horizon(self.today + timedelta(days=13))
+
+    def _days(self, task):
+        return list(TaskOccurrence.objects.filter(task=task).order_by("date").values_list("date", flat=True))
+
+    def test_save_materializes_and_follows_changes(self):
+        t = Task.objects.create(title="t", group=self.group, recurrence="daily",
+                                recur_interval=2, start_date=self.today)
+        self.assertEqual(self._days(t), [self.today + timedelta(days=i) for i in range(0, 14, 2)])
+
+        skip = TaskSkip.objects.create(task=t, date=self.today)
+        self.assertEqual(self._days(t)[0], self.today + timedelta(days=2))
+        skip.delete()
+        self.assertEqual(self._days(t)[0], self.today)
+        TaskSkip.objects.create(task=t, date=self.today)
+
+        t = Task.objects.get(pk=t.pk)
+        t.end_date = self.today + timedelta(days=4)
+        t.save(update_fields=["end_date"])
+        self.assertEqual(len(self._days(t)), 2)
+
+        t.delete()   # skips cascade without re-materializing the task
+        self.assertFalse(TaskOccurrence.objects.filter(task_id=t.pk).exists())
+
+    def test_repair_restores_missing_rows(self):
+        t = Task.objects.create(title="t", group=self.group, recurrence="daily")
+        TaskOccurrence.objects.filter(task=t).delete()
+        added, removed = occurrences.repair(self.today, self.today + timedelta(days=13))
+        self.assertEqual((added, removed), (14, 0))
+
+
+class SchedulerTests(TestCase):
+    def test_schedule_avoids_busy_time_and_overlaps(self):
+        day = date(2025, 5, 5)
+        busy = [(0, 360), (720, 780), (1320, 1440)]
+        placed = schedule(synthetic_tasks(2000, day, seed=1), busy, day, not_before=420)
+        spans = sorted([(s, e) for _, s, e in placed] + busy)
+        self.assertTrue(placed)
+        for (s1, e1), (s2, e2) in zip(spans, spans[1:]):
+            self.assertLessEqual(e1, s2)
+        for t, s, e in placed:
+            self.assertGreaterEqual(s, 420)
+            self.assertEqual(e - s, t.duration_min)
+            if t.deadline_at is None:
+                lo, hi = WINDOWS[t.desired_time]
+                self.assertTrue(lo <= s and e <= hi)
+
+    def test_deadline_today_is_placed_before_it_is_due(self):
+        day = date(2025, 5, 5)
+        due = timezone.make_aware(timezone.datetime(2025, 5, 5, 10, 0))
+        t = Task(pk=1, title="report", duration_min=60, priority=1, desired_time="evening", deadline_at=due)
+        [(_, s, e)] = schedule([t], [(0, 360)], day)
+        self.assertLessEqual(e, 600)
+
+    def test_overdue_task_is_placed_first(self):
+        day = date(2025, 5, 5)
+        due = timezone.make_aware(timezone.datetime(2025, 5, 3, 10, 0))
+        late = Task(pk=1, title="late", duration_min=60, priority=1, desired_time="morning", deadline_at=due)
+        other = Task(pk=2, title="other", duration_min=60, priority=5, desired_time="any")
+        # the morning is taken: the overdue task falls back to the first free time after not_before
+        placed = schedule([other, late], [(0, 360), (480, 720)], day, not_before=400)
+        self.assertEqual([(t.title, s) for t, s, _ in placed], [("late", 400), ("other", 720)])
+
+    def test_plan_day_creates_items(self):
+        group = TaskGroup.objects.create(name="G")
+        Task.objects.create(title="a", group=group, recurrence="daily", duration_min=30)
+        Task.objects.create(title="b", group=group, recurrence="none", duration_min=45)
+        d = timezone.localdate() + timedelta(days=1)
+        plan = ensure_plans([d])[d]   # the template's sleep blocks are already on it
+        items = plan_day(plan)
+        self.assertEqual(len(items), 2)
+        self.assertFalse(Task.objects.get(title="b").active)
+        self.assertEqual(plan_day(plan), [])
+
+
+class HorizonPlannerTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.group = TaskGroup.objects.create(name="G")
+
+    def _due(self, days, hour=18):
+        d = self.today + timedelta(days=days)
+        return timezone.make_aware(timezone.datetime(d.year, d.month, d.day, hour, 0))
+
+    def test_spreads_tasks_before_their_deadlines(self):
+        for i in range(6):
+            Task.objects.create(title=f"t{i}", group=self.group, duration_min=60,
+                                desired_time="afternoon", deadline_at=self._due(3 + i % 2))
+        items = plan_horizon(start=self.today + timedelta(days=1), days=5)
+        self.assertEqual(len(items), 6)
+        per_day = {}
+        for it in items:
+            self.assertLessEqual(it.plan.date, timezone.localtime(it.task.deadline_at).date())
+            per_day[it.plan.date] = per_day.get(it.plan.date, 0) + 1
+        self.assertEqual(len(per_day), 4)
+        self.assertLessEqual(max(per_day.values()), 2)  # WINDOW_CAPACITY_MIN
+        self.assertEqual(plan_horizon(start=self.today + timedelta(days=1), days=5), [])
+        self.assertEqual(PlanItem.objects.filter(auto=True).count(), 6)
+
+    def test_placed_one_time_task_is_not_planned_again(self):
+        t = Task.objects.create(title="once", group=self.group, duration_min=30, deadline_at=self._due(2))
+        [it] = plan_horizon(start=self.today + timedelta(days=1), days=2)
+        t.refresh_from_db()
+        self.assertFalse(t.active)
+        other = ({self.today + timedelta(days=1), self.today + timedelta(days=2)} - {it.plan.date}).pop()
+        plan_day(ensure_plans([other])[other])
+        self.assertEqual(PlanItem.objects.filter(task=t).count(), 1)
+
+    def test_replan_day_moves_removed_items_elsewhere(self):
+        t = Task.objects.create(title="t", group=self.group, duration_min=30, deadline_at=self._due(4))
+        [it] = plan_horizon(start=self.today + timedelta(days=1), days=4)
+        day = it.plan.date
+        it.delete()
+        [again] = replan_day(day, [t.id])
+        self.assertNotEqual(again.plan.date, day)
+        self.assertEqual(PlanItem.objects.filter(task=t).count(), 1)
+
+    def test_replan_day_leaves_unrelated_tasks_alone(self):
+        t = Task.objects.create(title="t", group=self.group, duration_min=30, deadline_at=self._due(2))
+        [it] = plan_horizon(start=self.today, days=3)
+        other = Task.objects.create(title="other", group=self.group, duration_min=30, deadline_at=self._due(5))
+        day = it.plan.date
+        it.delete()
+        [again] = replan_day(day, [t.id])
+        self.assertEqual(again.task, t)
+        self.assertFalse(PlanItem.objects.filter(task=other).exists())
+        # only the days up to t's deadline were planned
+        self.assertFalse(DayPlan.objects.filter(date__gt=self.today + timedelta(days=2)).exists())
+
+
+class AgendaEditSaveTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = [Task.objects.create(title=f"t{i}", group=self.group, recurrence="daily") for i in range(60)]
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+
+    def _reset_items(self):
+        PlanItem.objects.filter(plan=self.plan).delete()
+        items = PlanItem.objects.bulk_create([
+            PlanItem(plan=self.plan, task=t, group_name="G", start_min=i * 15, end_min=i * 15 + 10)
+            for i, t in enumerate(self.tasks[:40])
+        ])
+        recount([self.plan.id])
+        return items
+
+    def _rows(self, n):
+        """Keep every other item of the first n (moved by a minute), drop the rest, add n/2 new rows."""
+        items = self._reset_items()
+        rows = []
+        for i, it in enumerate(items[:n:2]):
+            rows.append({"item_id": it.id, "task_id": it.task_id,
+                         "start": f"{i // 4:02d}:{i % 4 * 15 + 1:02d}", "end": f"{i // 4:02d}:{i % 4 * 15 + 11:02d}"})
+        for j, t in enumerate(self.tasks[40:40 + n // 2]):
+            rows.append({"task_id": t.id, "start": f"{12 + j // 4:02d}:{j % 4 * 15:02d}",
+                         "end": f"{12 + j // 4:02d}:{j % 4 * 15 + 14:02d}"})
+        return rows
+
+    def _post(self, rows):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)})
+        self.assertEqual(resp.status_code, 302)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small = self._post(self._rows(4))
+        large = self._post(self._rows(40))
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 11)  # session, user, savepoints, plan, items, tasks, 3 writes, counters
+        self.assertEqual(PlanItem.objects.filter(plan=self.plan).count(), 40)
+
+    def test_unknown_task_is_rejected(self):
+        resp = self.client.post("/agenda/edit/", {"items_json": json.dumps(
+            [{"task_id": 999999, "start": "10:00", "end": "10:30"}])})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_overlapping_rows_are_not_saved(self):
+        items = self._reset_items()
+        rows = [{"item_id": it.id, "task_id": it.task_id, "start": it.start_hhmm, "end": it.end_hhmm} for it in items]
+        rows[1]["start"] = "00:05"    # collides with the first item
+        resp = self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("Overlapping rows: 1 and 2.", str(list(resp.context["messages"])[0]))
+        self.assertEqual(PlanItem.objects.get(id=items[1].id).start_min, 15)
+
+
+class IntervalIndexTests(TestCase):
+    def test_conflicts_free_and_inserts(self):
+        index = IntervalIndex([(60, 120, "a"), (90, 150, "b"), (100, 110, "c"), (150, 180, "d"), (300, 330, "e")])
+        self.assertEqual(sorted(tuple(sorted(p)) for p in index.conflicts()),
+                         [("a", "b"), ("a", "c"), ("b", "c")])   # d only touches b
+        self.assertEqual(index.blocks(), [(60, 180), (300, 330)])
+        self.assertEqual(index.free(0, 400), [(0, 60), (180, 300), (330, 400)])
+        self.assertEqual(index.free(100, 310, min_len=60), [(180, 300)])
+
+        self.assertTrue(index.is_free(180, 300))
+        with self.assertRaises(IntervalConflict):
+            index.add(170, 200, "f")
+        index.add(180, 300, "f")
+        self.assertEqual(index.blocks(), [(60, 330)])
+        self.assertEqual(index.free(0, 400), [(0, 60), (330, 400)])
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(7)
+        for _ in range(50):
+            ivs = []
+            for k in range(rnd.randint(0, 40)):
+                s = rnd.randint(0, 1400)
+                ivs.append((s, s + rnd.randint(1, 90), k))
+            expected = {(a[2], b[2]) for a in ivs for b in ivs if a[2] < b[2] and a[0] < b[1] and b[0] < a[1]}
+            got = {tuple(sorted(p)) for p in IntervalIndex(ivs).conflicts()}
+            self.assertEqual(got, expected)
+
+    def test_for_dates_reads_a_range_of_plans_in_one_query(self):
+        task = Task.objects.create(title="t", group=TaskGroup.objects.create(name="G"))
+        today = timezone.localdate()
+        for i in range(3):
+            plan = DayPlan.objects.create(date=today + timedelta(days=i))
+            PlanItem.objects.create(plan=plan, task=task, group_name="G", start_min=60, end_min=120)
+            PlanItem.objects.create(plan=plan, task=task, group_name="G", start_min=100 + i * 20, end_min=200)
+        with self.assertNumQueries(1):
+            by_date = IntervalIndex.for_dates(today, today + timedelta(days=2))
+        self.assertEqual([len(by_date[today + timedelta(days=i)].conflicts()) for i in range(3)], [1, 0, 0])
+
+
+class PlanItemMinutesTests(TestCase):
+    def setUp(self):
+        group = TaskGroup.objects.create(name="G")
+        task = Task.objects.create(title="t", group=group)
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+        for s, e in [(22 * 60, 24 * 60), (9 * 60, 10 * 60), (22 * 60, 23 * 60), (9 * 60 + 30, 11 * 60)]:
+            PlanItem.objects.create(plan=self.plan, task=task, group_name="G", start_min=s, end_min=e)
+
+    def test_midnight_end_sorts_last_and_displays_as_00_00(self):
+        items = list(self.plan.items.chronological())
+        self.assertEqual([(i.start_hhmm, i.end_hhmm) for i in items],
+                         [("09:00", "10:00"), ("09:30", "11:00"), ("22:00", "23:00"), ("22:00", "00:00")])
+
+    def test_range_and_overlap_filters_run_in_sql(self):
+        self.assertEqual(self.plan.items.starting_from(12 * 60).count(), 2)
+        self.assertEqual(self.plan.items.overlapping(10 * 60, 10 * 60 + 30).count(), 1)
+        self.assertEqual(sorted(self.plan.items.with_overlaps().values_list("start_min", flat=True)),
+                         [9 * 60, 9 * 60 + 30, 22 * 60, 22 * 60])
+
+    def test_migration_moves_only_the_seeded_light_sleep_end(self):
+        migration = importlib.import_module("planner.migrations.0021_midnight_ends")
+        light = Task.objects.create(title="Light Sleep", group=TaskGroup.objects.get(name="G"))
+        seeded = PlanItem.objects.create(plan=self.plan, task=light, group_name="G", start_min=1320, end_min=1439)
+        typed = PlanItem.objects.create(plan=self.plan, task=Task.objects.get(title="t"), group_name="G",
+                                        start_min=1430, end_min=1439)
+        recount([self.plan.id])
+        migration.midnight_ends(apps, None)
+        seeded.refresh_from_db()
+        typed.refresh_from_db()
+        self.assertEqual((seeded.end_min, typed.end_min), (1440, 1439))
+        self.assertEqual(list(drifted()), [])
+
+
+class DelayTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.plan = DayPlan.objects.create(date=self.today)
+        self.a = self._item("a", "20:00", "21:00")
+        self.b = self._item("b", "21:00", "21:30")
+        self.c = self._item("c", "22:00", "23:00")
+
+    def _item(self, title, start, end, plan=None):
+        t = Task.objects.create(title=title, group=self.group)
+        return PlanItem.objects.create(plan=plan or self.plan, task=t, group_name="G",
+                                       start_min=hhmm_to_min(start), end_min=hhmm_to_min(end, end=True))
+
+    def _times(self, d):
+        return [(i.task.title, i.start_hhmm, i.end_hhmm)
+                for i in PlanItem.objects.filter(plan__date=d).select_related("task").order_by("order")]
+
+    def test_delay_pushes_later_items_in_one_write(self):
+        with self.assertNumQueries(6):   # savepoint, plans, items, bulk_update, counters, release
+            apply_delays([(self.a.id, 15)])
+        self.assertEqual(self._times(self.today), [
+            ("a", "20:00", "21:15"), ("b", "21:15", "21:45"), ("c", "22:15", "23:15"),
+        ])
+
+    def test_overflow_spills_into_next_day_and_cascades(self):
+        tomorrow = DayPlan.objects.create(date=self.today + timedelta(days=1))
+        self._item("early", "00:00", "01:00", plan=tomorrow)
+        self._item("late", "09:00", "10:00", plan=tomorrow)
+        apply_delays([(self.a.id, 60), (self.b.id, 45)])
+        self.assertEqual(self._times(self.today), [
+            ("a", "20:00", "22:00"), ("b", "22:00", "23:15"), ("c", "23:45", "00:00"),
+        ])
+        # c keeps 15 minutes today and continues after midnight; tomorrow moves down only as far as needed
+        self.assertEqual(self._times(tomorrow.date), [
+            ("c", "00:00", "00:45"), ("early", "00:45", "01:45"), ("late", "09:00", "10:00"),
+        ])
+
+    def test_batch_endpoint(self):
+        resp = self.client.post("/agenda/items/delay/", json.dumps({"delays": [
+            {"item_id": self.a.id, "minutes": 10}, {"item_id": self.b.id, "minutes": 5},
+        ]}), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._times(self.today)[1], ("b", "21:10", "21:45"))
+        resp = self.client.post("/agenda/items/delay/", json.dumps({"delays": [{"item_id": 0, "minutes": 5}]}),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class DayTemplateTests(TestCase):
+    def setUp(self):
+        clear_template_cache()
+        self.addCleanup(clear_template_cache)   # rolled-back templates must not outlive the test
+        self.group = TaskGroup.objects.create(name="G")
+        self.start = date(2025, 3, 1)
+
+    def _slots(self, plan):
+        return list(plan.items.order_by("start_min").values_list("task__title", "start_min", "end_min"))
+
+    def test_month_of_plans_in_a_handful_of_queries(self):
+        days = [self.start + timedelta(days=i) for i in range(31)]
+        # templates, existing plans, savepoint, plans, items, release
+        with self.assertNumQueries(6):
+            plans = ensure_plans(days)
+        self.assertEqual(len(plans), 31)
+        self.assertEqual(PlanItem.objects.filter(plan__date__in=days).count(), 62)
+        self.assertEqual(self._slots(plans[days[0]]), [("Deep Sleep", 0, 360), ("Light Sleep", 1320, 1440)])
+        self.assertFalse(counters.drifted().exists())
+        with self.assertNumQueries(1):   # existing plans are returned as they are
+            again = ensure_plans(days)
+        self.assertEqual(again[days[3]].pk, DayPlan.objects.get(date=days[3]).pk)
+
+    def test_weekday_and_named_templates(self):
+        gym = Task.objects.create(title="Gym", group=self.group)
+        monday = DayTemplate.objects.create(name="Monday", weekday=0)
+        DayTemplateItem.objects.create(template=monday, task=gym, start_min=420, end_min=480)
+        DayTemplate.objects.create(name="Blank")
+        mon, tue = date(2025, 3, 3), date(2025, 3, 4)
+        plans = ensure_plans([mon, tue])
+        self.assertEqual(self._slots(plans[mon]), [("Gym", 420, 480)])
+        self.assertEqual(len(self._slots(plans[tue])), 2)   # the default
+        self.assertEqual(self._slots(ensure_plans([mon + timedelta(days=7)], template="Blank")[mon + timedelta(days=7)]), [])
+        with self.assertRaises(DayTemplate.DoesNotExist):
+            ensure_plans([date(2025, 4, 1)], template="Nope")
+
+    def test_edits_clear_the_cache(self):
+        template_for(self.start)
+        with self.assertNumQueries(0):
+            template_for(self.start)
+        item = DayTemplate.objects.get(is_default=True).items.get(start_min=0)
+        item.end_min = 420
+        item.save()
+        self.assertEqual([(s.start_min, s.end_min) for s in template_for(self.start)], [(0, 420), (1320, 1440)])
+
+        item.task.group = self.group
+        item.task.save()
+        self.assertEqual(template_for(self.start)[0].group_name, "G")
+
+    def test_create_plans_command(self):
+        out = StringIO()
+        call_command("create_plans", "2025-03-01", "2025-03-10", stdout=out)
+        call_command("create_plans", "2025-03-05", "2025-03-12", stdout=out)
+        self.assertIn("Created 2 plan(s)", out.getvalue())
+        self.assertEqual(DayPlan.objects.count(), 12)
+        with self.assertRaises(CommandError):
+            call_command("create_plans", "2025-03-01", "2025-03-02", "--template", "Nope", stdout=out)
+
+
+class AgendasListTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title="t", group=self.group)
+        self.start = date(2025, 1, 1)
+
+    def _plans(self, n):
+        plans = DayPlan.objects.bulk_create([DayPlan(date=self.start + timedelta(days=i)) for i in range(n)])
+        PlanItem.objects.bulk_create([
+            PlanItem(plan=p, task=self.task, group_name="G", start_min=k * 60, end_min=k * 60 + 30, done=k < 1)
+            for p in plans for k in range(3)
+        ])
+        recount()
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/agenda/manage/agendas/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_history(self):
+        self._plans(3)
+        _, small = self._get()
+        DayPlan.objects.all().delete()
+        self._plans(AGENDAS_PAGE_SIZE * 3)
+        resp, large = self._get()
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 3)   # session, user, one annotated page query
+        rows = resp.context["rows"]
+        self.assertEqual(len(rows), AGENDAS_PAGE_SIZE)
+        self.assertEqual((rows[0]["total"], rows[0]["done"]), (3, 1))
+
+    def test_keyset_pages_cover_every_plan_once(self):
+        self._plans(AGENDAS_PAGE_SIZE * 2 + 5)
+        seen = []
+        resp, _ = self._get()
+        while True:
+            seen += [r["plan"].date for r in resp.context["rows"]]
+            cursor = resp.context["older_cursor"]
+            if not cursor:
+                break
+            resp, queries = self._get(before=cursor)
+            self.assertLessEqual(queries, 3)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(set(seen)), AGENDAS_PAGE_SIZE * 2 + 5)
+
+        back, _ = self._get(after=resp.context["newer_cursor"])
+        self.assertEqual(len(back.context["rows"]), AGENDAS_PAGE_SIZE)
+        self.assertEqual(back.context["rows"][-1]["plan"].date, seen[-6])
+
+    def test_bad_cursor(self):
+        resp = self.client.get("/agenda/manage/agendas/", {"before": "yesterday"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class CalendarTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.monday = date(2025, 3, 3)
+
+    def _catalog(self, n, prefix="r"):
+        Task.objects.bulk_create(
+            Task(title=f"{prefix}{i}", group=self.group, recurrence="weekly", recur_weekdays=WEEKDAY_CODES[i % 7],
+                 start_date=date(2025, 1, 1))
+            for i in range(n)
+        )
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(ctx.captured_queries)
+
+    def test_month_queries_do_not_grow_with_plans_or_catalog(self):
+        self._catalog(2)
+        _, small = self._get("/agenda/calendar/month/", month="2025-03")
+        self._catalog(200, prefix="s")
+        ensure_plans([date(2025, 3, 1) + timedelta(days=i) for i in range(31)])
+        TaskSkip.objects.create(task=Task.objects.get(title="r0"), date=self.monday)
+        resp, large = self._get("/agenda/calendar/month/", month="2025-03")
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 7)   # session, user, plans, items, recurring tasks, skips, templates
+        weeks = resp.context["weeks"]
+        self.assertEqual((weeks[0][0].date, weeks[-1][-1].date), (date(2025, 2, 24), date(2025, 4, 6)))
+        self.assertEqual(resp.context["totals"]["total"], 62)   # the padding days are not counted
+        first = weeks[1][0]   # Monday 3 March: r0 is skipped, s0, s7, ... are due
+        self.assertEqual({t.title for t in first.pending}, {f"s{i}" for i in range(0, 200, 7)})
+
+    def test_week_hides_scheduled_occurrences(self):
+        self._catalog(7)
+        plan = ensure_plans([self.monday])[self.monday]
+        PlanItem.objects.create(plan=plan, task=Task.objects.get(title="r0"), group_name="G", start_min=600, end_min=630)
+        resp, _ = self._get("/agenda/calendar/week/", start="2025-03-03")
+        days = resp.context["days"]
+        self.assertEqual([d.date for d in days], [self.monday + timedelta(days=i) for i in range(7)])
+        self.assertEqual([t.title for t in days[0].pending], [])
+        self.assertEqual([it.task.title for it in days[0].items], ["Deep Sleep", "r0", "Light Sleep"])
+        self.assertEqual([t.title for t in days[1].pending], ["r1"])
+        self.assertIsNone(days[1].plan)   # viewing a day does not create its plan
+        self.assertEqual(self.client.get("/agenda/calendar/week/", {"start": "soon"}).status_code, 400)
+
+    def test_dates_at_the_edge_of_the_calendar_are_rejected(self):
+        for url, params in [("/agenda/calendar/week/", {"start": "9999-12-31"}),
+                            ("/agenda/calendar/week/", {"start": "0001-01-01"}),
+                            ("/agenda/calendar/month/", {"month": "9999-12"}),
+                            ("/agenda/calendar/month/", {"month": "0001-01"})]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class PlanCounterTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+
+    def _assert_exact(self):
+        self.assertEqual(list(drifted().values_list("date", flat=True)), [])
+
+    def test_writers_keep_counters_exact(self):
+        self.client.get("/agenda/")   # seeds today's sleep blocks
+        plan = DayPlan.objects.get(date=self.today)
+        self.assertEqual((plan.total_items, plan.done_items, plan.planned_minutes), (2, 0, 360 + 120))
+
+        tasks = [Task.objects.create(title=f"t{i}", group=self.group) for i in range(3)]
+        rows = [{"item_id": it.id, "task_id": it.task_id, "start": it.start_hhmm, "end": it.end_hhmm}
+                for it in plan.items.all()]
+        rows += [{"task_id": t.id, "start": f"{20 + i}:00", "end": f"{20 + i}:30"} for i, t in enumerate(tasks[:2])]
+        self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)})
+        self._assert_exact()
+
+        item = PlanItem.objects.get(task=tasks[0])
+        self.client.post(f"/agenda/item/{item.id}/toggle-done/")
+        self._assert_exact()
+        apply_delays([(item.id, 90)])   # pushes the 22:00 sleep block past midnight
+        self._assert_exact()
+        self.client.post(f"/agenda/manage/tasks/{tasks[1].id}/purge/")
+        self._assert_exact()
+        plan.refresh_from_db()
+        self.assertEqual((plan.total_items, plan.done_items), (3, 1))
+
+    def test_repair_command(self):
+        self.client.get("/agenda/")
+        DayPlan.objects.update(total_items=99)
+        out = StringIO()
+        call_command("repair_plan_counters", "--check", stdout=out)
+        self.assertIn("1 plan(s) out of date", out.getvalue())
+        call_command("repair_plan_counters", stdout=StringIO())
+        self._assert_exact()
+
+
+class PlannerQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Every planner view runs within its declared @query_budget, with enough rows to expose N+1s."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        groups = [TaskGroup.objects.create(name=f"G{i}") for i in range(3)]
+        kinds = ["text", "check", "scribble", "attachments", "none"]
+        self.tasks = [
+            Task.objects.create(title=f"t{i}", group=groups[i % 3], description_type=kinds[i % 5],
+                                description_text="x", recurrence="daily", duration_min=20,
+                                deadline_at=timezone.now() + timedelta(days=2))
+            for i in range(10)
+        ]
+        for t in self.tasks:
+            for k in range(3):
+                TaskChecklistItem.objects.create(task=t, text=f"c{k}", order=k)
+                TaskDrawing.objects.create(task=t, image=f"task_drawings/{t.id}-{k}.png")
+                TaskAttachment.objects.create(task=t, file=f"task_attachments/{t.id}-{k}.png", size=1)
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+        self.items = PlanItem.objects.bulk_create([
+            PlanItem(plan=self.plan, task=t, group_name=t.group.name, start_min=60 * (i + 6), end_min=60 * (i + 6) + 30)
+            for i, t in enumerate(self.tasks)
+        ])
+        recount()
+        # steady state: the day templates are cached and the daily horizon extension is not per-request work
+        template_for(timezone.localdate())
+        occurrences.ensure_horizon()
+
+    def test_views_stay_within_budget(self):
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        # autoplan fills the day from "now": late in the evening its items would make
+        # the delays below spill into tomorrow, a different (and costlier) path
+        morning = timezone.make_aware(datetime.combine(timezone.localdate(), time(5, 0)))
+        self.enterContext(mock.patch("django.utils.timezone.now", return_value=morning))
+        t, it, check = self.tasks[0], self.items[0], self.tasks[1]
+        spare_group = TaskGroup.objects.create(name="spare")
+        spare_task = Task.objects.create(title="spare", group=spare_group, active=False)
+        png = "data:image/png;base64," + base64.b64encode(b"\x89PNG\r\n\x1a\n").decode()
+        requests = [
+            ("get", "/agenda/", None),
+            ("get", "/agenda/edit/", None),
+            ("post", "/agenda/edit/", {"items_json": json.dumps([
+                {"item_id": x.id, "task_id": x.task_id, "start": x.start_hhmm, "end": x.end_hhmm} for x in self.items])}),
+            ("post", "/agenda/edit/auto/", {}),
+            ("post", "/agenda/edit/week/", {}),
+            ("get", "/agenda/add/", None),
+            ("get", "/agenda/add/task/", None),
+            ("get", "/agenda/add/group/", None),
+            ("get", "/agenda/manage/", None),
+            ("post", f"/agenda/item/{it.id}/toggle-done/", {}),
+            ("get", "/agenda/manage/tasks/", None),
+            ("get", f"/agenda/manage/tasks/{t.id}/edit/", None),
+            ("get", "/agenda/manage/groups/", None),
+            ("get", f"/agenda/manage/groups/{t.group_id}/edit/", None),
+            ("get", "/agenda/manage/agendas/", None),
+            ("get", "/agenda/calendar/week/", None),
+            ("get", "/agenda/calendar/month/", None),
+            ("get", "/agenda/api/plans/today/", None),
+            ("get", "/agenda/api/plans/2020-01-01/", None),
+            ("get", "/agenda/api/tasks/", None),
+            ("get", "/agenda/feed.ics", None),
+            ("post", f"/agenda/item/{it.id}/delay/", {"minutes": "15"}),
+            ("post", "/agenda/items/delay/", json.dumps({"delays": [{"item_id": it.id, "minutes": 5}]})),
+            ("post", f"/agenda/task/{check.id}/check/add/", {"text": "more"}),
+            ("post", f"/agenda/task/{check.id}/check/toggle/{check.check_items.first().id}/", {}),
+            ("post", f"/agenda/task/{check.id}/check/delete/{check.check_items.last().id}/", {}),
+            ("post", f"/agenda/task/{check.id}/check/batch/", json.dumps({"ops": [
+                {"op": "add", "text": "x"}, {"op": "add", "text": "y", "after": None},
+                {"op": "toggle", "id": check.check_items.all()[1].id},
+                {"op": "move", "id": check.check_items.all()[1].id, "after": None},
+                {"op": "delete", "id": check.check_items.first().id}]})),   # the rows the requests above leave
+            ("post", f"/agenda/task/{t.id}/drawing/save/", {"png": png, "title": "d"}),
+            ("post", f"/agenda/drawing/{t.drawings.first().id}/delete/", {}),
+            ("post", f"/agenda/task/{t.id}/attach/upload/",
+             {"files": [SimpleUploadedFile("a.png", b"png", "image/png"), SimpleUploadedFile("b.mp3", b"mp3", "audio/mpeg")]}),
+            ("post", f"/agenda/attach/{t.attachments.first().id}/delete/", {}),
+            ("get", "/agenda/add/import/", None),
+            ("post", "/agenda/add/import/", {"file": SimpleUploadedFile(
+                "t.csv", ("title,group\n" + "".join(f"i{i},G{i % 4}\n" for i in range(30))).encode())}),
+            ("post", "/agenda/add/task/", {"title": "new", "group": t.group_id, "duration_min": 30, "priority": 3,
+                                           "desired_time": "any", "recurrence": "none", "description_type": "none"}),
+            ("post", f"/agenda/manage/tasks/{self.tasks[1].id}/purge/", {}),
+            ("post", f"/agenda/manage/tasks/{spare_task.id}/delete/", {}),
+            ("post", f"/agenda/manage/groups/{spare_group.id}/delete/", {}),
+            ("post", "/agenda/logout/", {}),
+            ("get", "/agenda/login/", None),
+        ]
+        for method, url, data in requests:
+            with self.subTest(url=url, method=method):
+                if method == "get":
+                    resp = self.client.get(url)
+                elif isinstance(data, str):
+                    resp = self.client.post(url, data, content_type="application/json")
+                else:
+                    resp = self.client.post(url, data)
+                self.assertLess(resp.status_code, 400, url)
+                self.assertWithinBudget(resp)
+
+    def test_worst_paths_stay_within_budget(self):
+        # dropping a planner-placed item re-plans the rest of the week
+        PlanItem.objects.filter(id=self.items[0].id).update(auto=True)
+        rows = [{"item_id": x.id, "task_id": x.task_id, "start": x.start_hhmm, "end": x.end_hhmm} for x in self.items[1:]]
+        self.assertWithinBudget(self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)}))
+
+        # first visit of the day creates and seeds the plan
+        for url in ["/agenda/", "/agenda/edit/"]:
+            with self.subTest(url=url):
+                PlanItem.objects.filter(plan__date=timezone.localdate()).delete()
+                DayPlan.objects.filter(date=timezone.localdate()).delete()
+                self.assertWithinBudget(self.client.get(url))
+
+    def test_resumable_upload_stays_within_budget(self):
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        resp = self.client.post(f"/agenda/task/{self.tasks[0].id}/attach/uploads/",
+                                json.dumps({"name": "v.mp4", "size": 10}), content_type="application/json")
+        self.assertWithinBudget(resp)
+        url = f"/agenda/attach/uploads/{resp.json()['id']}/"
+        for offset, body in [(0, b"01234"), (5, b"56789")]:
+            self.assertWithinBudget(self.client.patch(url, body, content_type="application/octet-stream",
+                                                      HTTP_UPLOAD_OFFSET=str(offset)))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_every_view_declares_a_budget(self):
+        missing = [p.name for p in get_resolver("planner.urls").url_patterns if budget_for(p.callback) is None]
+        self.assertEqual(missing, [])
+
+
+class SeedPlannerTests(TestCase):
+    def test_seed_is_consistent_and_reproducible(self):
+        counts = generate(tasks=60, days=20, seed=3)
+        self.assertEqual(counts["tasks"], 62)   # plus the two sleep tasks
+        self.assertEqual(counts["day_plans"], 20)
+        self.assertFalse(counters.drifted().exists())
+        self.assertFalse(PlanItem.objects.with_overlaps().exists())
+        first = list(Task.objects.order_by("title").values_list("title", "recurrence", "rrule_text"))
+
+        with self.assertRaises(CommandError):
+            call_command("seed_planner", "--tasks", "5", stdout=StringIO())
+
+        flush()
+        generate(tasks=60, days=20, seed=3)
+        self.assertEqual(list(Task.objects.order_by("title").values_list("title", "recurrence", "rrule_text")), first)
+
+
+class OccurringOnTests(TestCase):
+    def test_matches_occurs_on(self):
+        group = TaskGroup.objects.create(name="G")
+        n = 0
+        for rec in ["none", "daily", "weekly", "weekdays", "weekends", "monthly", "custom"]:
+            for interval in [0, 1, 3]:
+                for sd in [None, date(2024, 11, 20), date(2025, 2, 14)]:
+                    for wd in ["", "MO,we"]:
+                        for dom in [None, 0, 31]:
+                            n += 1
+                            Task.objects.create(
+                                title=f"t{n}", group=group, recurrence=rec, recur_interval=interval,
+                                start_date=sd, end_date=date(2025, 9, 1) if n % 4 == 0 else None,
+                                recur_weekdays=wd, recur_monthday=dom,
+                                rrule_text="FREQ=MONTHLY;BYDAY=2TU,-1FR" if n % 2 else "FREQ=WEEKLY;INTERVAL=2",
+                            )
+        TaskSkip.objects.bulk_create(
+            TaskSkip(task=t, date=d) for t in Task.objects.all()[::2] for d in [date(2025, 3, 5), date(2025, 2, 14)]
+        )
+        occurrences.rebuild(date(2025, 1, 1), date(2025, 12, 31))
+        tasks = list(Task.objects.prefetch_related("skips"))
+
+        d = date(2025, 1, 1)
+        while d <= date(2025, 12, 31):
+            with self.subTest(d=d):
+                got = set(Task.objects.occurring_on(d).values_list("id", flat=True))
+                self.assertEqual(got, {t.id for t in tasks if occurs_on(t, d)})
+            d += timedelta(days=11)
+
+    def test_weekday_mask_round_trip(self):
+        t = Task(recurrence="weekly", recur_weekdays=" fr, mo ,XX")
+        self.assertEqual(t.recur_weekday_mask, 0b10001)
+        self.assertEqual(t.recur_weekdays, "MO,FR")
+
+    def test_drawer_lists_todays_tasks(self):
+        self.client.force_login(User.objects.create_user("u"))
+        group = TaskGroup.objects.create(name="G")
+        today = timezone.localdate()
+        Task.objects.create(title="Today", group=group, recurrence="daily")
+        Task.objects.create(title="Elsewhere", group=group, recurrence="weekly",
+                            start_date=today - timedelta(days=7), recur_weekdays=WEEKDAY_CODES[(today.weekday() + 1) % 7])
+        titles = lambda resp: {t.title for t in resp.context["tasks"]} - {"Deep Sleep", "Light Sleep"}
+        self.assertEqual(titles(self.client.get("/agenda/edit/")), {"Today"})
+        self.assertEqual(titles(self.client.get("/agenda/edit/?all=1")), {"Today", "Elsewhere"})
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN of the hot queries: each must be served by an index, not a table scan."""
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plans are asserted in SQLite's EXPLAIN QUERY PLAN format")
+        generate(tasks=40, days=10)
+        self.today = timezone.localdate()
+
+    def assertUsesIndex(self, qs, index, sorted_by_index=True):
+        plan = qs.explain()
+        self.assertIn(f"USING INDEX {index}", plan.replace("COVERING INDEX", "INDEX"), plan)
+        for line in plan.splitlines():
+            if " SCAN " in f" {line} " and "USING" not in line:
+                self.fail(f"full table scan:\n{plan}")
+        if sorted_by_index:
+            self.assertNotIn("TEMP B-TREE", plan)
+        return plan
+
+    def test_unscheduled_due(self):
+        qs = unscheduled_due(self.today, self.today + timedelta(days=7))
+        plan = self.assertUsesIndex(qs, "planner_task_due_active")
+        self.assertIn("planner_item_task_plan", plan)
+
+    def test_drawer(self):
+        qs = Task.objects.filter(active=True).select_related("group").order_by("-priority", "duration_min")
+        self.assertUsesIndex(qs, "planner_task_active_rank")
+        self.assertUsesIndex(qs.occurring_on(self.today), "planner_task_active_rank")
+
+    def test_agenda_reads(self):
+        plan = DayPlan.objects.get(date=self.today)
+        self.assertUsesIndex(plan.items.select_related("task"), "planner_item_plan_chrono")
+        self.assertUsesIndex(PlanItem.objects.filter(plan=plan).chronological(), "planner_item_plan_chrono")
+
+    def test_items_by_task(self):
+        qs = PlanItem.objects.filter(task=Task.objects.first(), plan__date__gte=self.today)
+        self.assertUsesIndex(qs.order_by(), "planner_item_task_plan")
+
+
+class PlanApiTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title="Write", group=self.group, recurrence="daily")
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+        self.item = PlanItem.objects.create(plan=self.plan, task=self.task, group_name="G", start_min=540, end_min=600)
+        recount()
+
+    def _get(self, url, etag=None, **extra):
+        if etag:
+            extra["HTTP_IF_NONE_MATCH"] = etag
+        return self.client.get(url, **extra)
+
+    def test_plan_etag_and_conditional_get(self):
+        resp = self._get("/agenda/api/plans/today/")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual((body["total_items"], [i["title"] for i in body["items"]]), (1, ["Write"]))
+        etag = resp["ETag"]
+        self.assertTrue(etag.startswith('"'))   # strong
+        self.assertEqual(self._get(f"/agenda/api/plans/{self.plan.date}/")["ETag"], etag)
+
+        resp = self._get("/agenda/api/plans/today/", etag)
+        self.assertEqual((resp.status_code, resp.content), (304, b""))
+        self.assertLessEqual(resp.query_stats["queries"], 3)   # session, user, stamp
+
+        # a write returns the new version, and the old ETag no longer matches
+        resp = self.client.post(f"/agenda/item/{self.item.id}/toggle-done/", HTTP_ACCEPT="application/json")
+        version = resp.json()["plan"]["version"]
+        self.assertEqual(version, body["version"] + 1)
+        resp = self._get("/agenda/api/plans/today/", etag)
+        self.assertEqual((resp.status_code, resp.json()["version"], resp.json()["done_items"]), (200, version, 1))
+
+        # renaming a task on the plan changes the ETag too
+        etag = resp["ETag"]
+        self.task.title = "Rewrite"
+        self.task.save()
+        self.assertEqual(self._get("/agenda/api/plans/today/", etag).status_code, 200)
+
+    def test_missing_and_bad_dates(self):
+        resp = self._get("/agenda/api/plans/2001-02-03/")
+        self.assertEqual((resp.json()["version"], resp.json()["items"]), (0, []))
+        self.assertEqual(self._get("/agenda/api/plans/2001-02-03/", resp["ETag"]).status_code, 304)
+        self.assertEqual(self._get("/agenda/api/plans/2001-2-30/").status_code, 400)
+        self.assertFalse(self.plan.__class__.objects.filter(date="2001-02-03").exists())
+
+    def test_reorder_bumps_version(self):
+        rows = [{"item_id": self.item.id, "task_id": self.task.id, "start": "10:00", "end": "11:00"}]
+        resp = self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)}, HTTP_ACCEPT="application/json")
+        self.assertEqual(resp.json()["plan"]["version"], 1)   # same counters, still a new version
+
+        resp = self.client.post("/agenda/items/delay/", json.dumps({"delays": [{"item_id": self.item.id, "minutes": 5}]}),
+                                content_type="application/json")
+        self.assertEqual(resp.json()["plans"], [{"date": str(self.plan.date), "version": 2}])
+
+    def test_catalog_etag(self):
+        resp = self._get("/agenda/api/tasks/")
+        # the sleep tasks of the default day template (migration 0016) are in the catalog too
+        self.assertEqual([t["title"] for t in resp.json()["tasks"]], ["Write", "Deep Sleep", "Light Sleep"])
+        etag = resp["ETag"]
+        self.assertEqual(self._get("/agenda/api/tasks/", etag).status_code, 304)
+        self.assertNotEqual(self._get("/agenda/api/tasks/?active=1")["ETag"], etag)
+
+        self.group.name = "Work"
+        self.group.save()
+        resp = self._get("/agenda/api/tasks/", etag)
+        groups = {t["title"]: t["group"]["name"] for t in resp.json()["tasks"]}
+        self.assertEqual((resp.status_code, groups["Write"]), (200, "Work"))
+        etag = resp["ETag"]
+        Task.objects.create(title="New", group=self.group, active=False)
+        self.assertEqual(self._get("/agenda/api/tasks/", etag).status_code, 200)
+
+
+class IcsFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("u", password="p")
+        self.client.force_login(self.user)
+        self.group = TaskGroup.objects.create(name="Work, mostly")
+        self.task = Task.objects.create(title="Stand-up; daily", group=self.group, recurrence="weekly",
+                                        recur_weekdays="MO,TH", recur_interval=2, start_date=date(2025, 1, 2))
+        TaskSkip.objects.create(task=self.task, date=date(2025, 1, 13))
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+        self.item = PlanItem.objects.create(plan=self.plan, task=self.task, group_name=self.group.name,
+                                            start_min=540, end_min=600)
+
+    def _body(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return b"".join(resp.streaming_content).decode()
+
+    def test_feed_lists_items_and_recurring_tasks(self):
+        body = self._body(self.client.get("/agenda/feed.ics"))
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual((body.count("BEGIN:VEVENT"), body.count("BEGIN:VTODO")), (1, 3))   # and the two sleep tasks
+        self.assertIn(f"DTSTART:{_utc(_local(self.plan.date, 540))}", body)
+        self.assertIn("SUMMARY:Stand-up\\; daily", body)
+        self.assertIn("CATEGORIES:Work\\, mostly", body)
+        # starts on its first occurrence (Thursday 2 January), weeks counted from there
+        self.assertIn("DTSTART;VALUE=DATE:20250102\r\nRRULE:FREQ=WEEKLY;BYDAY=MO,TH;INTERVAL=2;WKST=TH\r\n", body)
+        self.assertIn("EXDATE;VALUE=DATE:20250113", body)
+
+    def test_rrules_agree_with_occurs_on(self):
+        start, end = date(2025, 1, 1), date(2026, 6, 30)
+        n = 0
+        for rec in ["daily", "weekly", "weekdays", "weekends", "monthly", "custom"]:
+            for interval in [1, 3]:
+                for sd in [None, date(2025, 1, 31), date(2025, 2, 12)]:
+                    for wd in ["", "TU,su"]:
+                        for dom in [None, 30]:
+                            n += 1
+                            t = Task(pk=n, title="t", recurrence=rec, recur_interval=interval, start_date=sd,
+                                     end_date=date(2026, 2, 1) if n % 3 == 0 else None, recur_weekdays=wd,
+                                     recur_monthday=dom, rrule_text="FREQ=MONTHLY;BYDAY=-1FR;COUNT=9" if n % 2 else "")
+                            with self.subTest(rec=rec, interval=interval, sd=sd, wd=wd, dom=dom):
+                                want = [d for d in (start + timedelta(days=i) for i in range((end - start).days + 1))
+                                        if occurs_on(t, d, skips=())]
+                                spelled = task_rrule(t)
+                                if spelled is None:
+                                    self.assertEqual(want, [])
+                                    continue
+                                first, rule = spelled
+                                got = RRule.parse(rule, first).between(start, end)
+                                if first < start:   # unanchored rules start in 1970
+                                    self.assertEqual(got, want)
+                                else:
+                                    self.assertEqual((got[0], got), (first, want))
+
+    def test_conditional_get(self):
+        resp = self.client.get("/agenda/feed.ics")
+        self._body(resp)
+        etag, modified = resp["ETag"], resp["Last-Modified"]
+        self.assertEqual(self.client.get("/agenda/feed.ics", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get("/agenda/feed.ics", HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+
+        self.client.post(f"/agenda/item/{self.item.id}/toggle-done/")
+        resp = self.client.get("/agenda/feed.ics", HTTP_IF_NONE_MATCH=etag)
+        self.assertIn("SUMMARY:✓ Stand-up", self._body(resp))
+        self.assertNotEqual(resp["ETag"], etag)
+
+        later = format_datetime(timezone.now() + timedelta(minutes=1), usegmt=True)
+        TaskSkip.objects.create(task=self.task, date=date(2025, 1, 16))   # a skip moves the task's stamp
+        resp = self.client.get("/agenda/feed.ics", HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertIn("EXDATE;VALUE=DATE:20250113,20250116", self._body(resp))
+        self.assertEqual(self.client.get("/agenda/feed.ics", HTTP_IF_MODIFIED_SINCE=later).status_code, 304)
+
+    def test_basic_auth(self):
+        self.client.logout()
+        resp = self.client.get("/agenda/feed.ics")
+        self.assertEqual(resp.status_code, 401)
+        self.assertIn("Basic", resp["WWW-Authenticate"])
+        auth = lambda cred: "Basic " + base64.b64encode(cred).decode()
+        self.assertEqual(self.client.get("/agenda/feed.ics", HTTP_AUTHORIZATION=auth(b"u:nope")).status_code, 401)
+        self.assertEqual(self.client.get("/agenda/feed.ics", HTTP_AUTHORIZATION="Basic !!").status_code, 401)
+        self._body(self.client.get("/agenda/feed.ics", HTTP_AUTHORIZATION=auth(b"u:p")))
+
+    def test_long_lines_are_folded(self):
+        line = "SUMMARY:" + "é" * 60
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded[:-2].split("\r\n")))
+        self.assertEqual(folded.replace("\r\n ", "")[:-2], line)
+
+
+class ChecklistTests(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(title="pack", group=TaskGroup.objects.create(name="G"), description_type="check")
+        self.items = TaskChecklistItem.objects.bulk_create([
+            TaskChecklistItem(task=self.task, text=t, order=n * ORDER_GAP) for n, t in enumerate("abcd")
+        ])
+
+    def _texts(self):
+        return [(c.text, c.done) for c in self.task.check_items.all()]
+
+    def test_batch_applies_in_order_with_one_write_per_kind(self):
+        a, b, c, d = self.items
+        with CaptureQueriesContext(connection) as ctx:
+            result = apply(self.task, [
+                {"op": "toggle", "id": a.id},
+                {"op": "move", "id": d.id, "after": a.id},
+                {"op": "add", "text": "e"},
+                {"op": "add", "text": "top", "after": None},
+                {"op": "delete", "id": b.id},
+                {"op": "toggle", "id": c.id, "done": True},
+            ])
+        self.assertEqual(self._texts(), [("top", False), ("a", True), ("d", False), ("c", True), ("e", False)])
+        self.assertEqual(sorted(r.text for r in result.updated), ["a", "c", "d"])   # b's neighbours keep their keys
+        writes = [q["sql"].split()[0] for q in ctx.captured_queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        self.assertEqual(writes, ["SELECT", "DELETE", "INSERT", "UPDATE"])
+
+    def test_moves_rebalance_when_the_gap_runs_out(self):
+        a, b = self.items[:2]
+        for _ in range(12):   # keep dropping the last item between the first two
+            last = self.task.check_items.last()
+            result = apply(self.task, [{"op": "move", "id": last.id, "after": a.id}])
+            self.assertLessEqual(len(result.updated), 1 if not result.rebalanced else 4)
+        orders = list(self.task.check_items.values_list("order", flat=True))
+        self.assertEqual(orders, sorted(set(orders)))
+        self.assertTrue(any(o % ORDER_GAP for o in orders))
+
+    def test_invalid_batch_writes_nothing(self):
+        before = self._texts()
+        with self.assertRaises(ChecklistError) as e:
+            apply(self.task, [{"op": "add", "text": "x"}, {"op": "move", "id": self.items[0].id, "after": 0}])
+        self.assertEqual(e.exception.index, 1)
+        self.assertEqual(self._texts(), before)
+        with self.assertRaises(ChecklistError) as e:
+            apply(self.task, [{"op": "toggle", "id": self.items[0].id, "done": "false"}])
+        self.assertEqual(e.exception.index, 0)
+        self.assertFalse(self.task.check_items.filter(done=True).exists())
+
+    def test_append_and_batch_view(self):
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        resp = self.client.post(f"/agenda/task/{self.task.id}/check/add/", {"text": "last"})
+        self.assertEqual(self.task.check_items.last().text, "last")
+        resp = self.client.post(f"/agenda/task/{self.task.id}/check/batch/",
+                                json.dumps({"ops": [{"op": "move", "id": resp.json()["id"], "after": None}]}),
+                                content_type="application/json")
+        self.assertEqual(resp.json()["updated"][0]["text"], "last")
+        self.assertEqual(self.task.check_items.first().text, "last")
+        resp = self.client.post(f"/agenda/task/{self.task.id}/check/batch/", json.dumps({"ops": [{"op": "nope"}]}),
+                                content_type="application/json")
+        self.assertEqual((resp.status_code, resp.json()["index"]), (400, 0))
+
+
+class UploadTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.task = Task.objects.create(title="t", group=self.group)
+        self.data = os.urandom(200_000)
+
+    def _start(self, **meta):
+        meta = {"name": "clip.mp4", "size": len(self.data), "content_type": "video/mp4", **meta}
+        return self.client.post(f"/agenda/task/{self.task.id}/attach/uploads/", json.dumps(meta),
+                                content_type="application/json")
+
+    def _patch(self, upload_id, offset, body):
+        return self.client.patch(f"/agenda/attach/uploads/{upload_id}/", body,
+                                 content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_resume_from_the_committed_offset(self):
+        resp = self._start(sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(resp.status_code, 201)
+        uid = resp.json()["id"]
+        self.assertEqual(self._patch(uid, 0, self.data[:70_000]).json()["offset"], 70_000)
+        # a retry with a stale offset is told where to resume
+        resp = self._patch(uid, 0, self.data[:70_000])
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (409, 70_000))
+        # another worker picks up: the digest is rebuilt from the partial file
+        uploads._hashers.clear()
+        self.assertEqual(self.client.get(f"/agenda/attach/uploads/{uid}/").json()["offset"], 70_000)
+        resp = self._patch(uid, 70_000, self.data[70_000:])
+        self.assertEqual(resp.status_code, 200)
+        att = TaskAttachment.objects.get(id=resp.json()["item"]["id"])
+        self.assertEqual((att.size, att.sha256, att.original_name), (len(self.data), hashlib.sha256(self.data).hexdigest(), "clip.mp4"))
+        with att.file.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(att.file.storage.location, ".partial")), [])
+
+    def test_size_is_enforced_as_bytes_arrive(self):
+        with override_settings(ATTACHMENT_MAX_MB=0):
+            self.assertEqual(self._start().status_code, 413)
+        self.assertEqual(self._start(name="notes.exe").status_code, 415)
+        uid = self._start(size=1000).json()["id"]
+        resp = self._patch(uid, 0, self.data[:5000])
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (413, 0))
+        self.assertEqual(os.path.getsize(uploads.partial_path(AttachmentUpload.objects.get(pk=uid))), 0)
+
+    def test_a_second_writer_is_refused_while_the_file_is_locked(self):
+        uid = self._start().json()["id"]
+        path = uploads.partial_path(AttachmentUpload.objects.get(pk=uid))
+        with open(path, "r+b") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            resp = self._patch(uid, 0, self.data[:1000])
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (409, 0))
+        self.assertEqual(os.path.getsize(path), 0)
+        self.assertEqual(self._patch(uid, 0, self.data[:1000]).json()["offset"], 1000)
+
+    def test_failed_finish_is_retried_by_the_next_request(self):
+        uid = self._start().json()["id"]
+        with mock.patch("planner.services.uploads.blobs.store", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self._patch(uid, 0, self.data)
+        self.assertEqual(AttachmentUpload.objects.get(pk=uid).offset, len(self.data))
+        resp = self.client.get(f"/agenda/attach/uploads/{uid}/")
+        self.assertEqual(resp.status_code, 200)
+        att = TaskAttachment.objects.get(id=resp.json()["item"]["id"])
+        with att.file.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(AttachmentUpload.objects.exists())
+
+    def test_start_rejects_bad_metadata_before_any_bytes(self):
+        for bad in [{"size": True}, {"sha256": "abc"}, {"sha256": "g" * 64}, {"sha256": 7}]:
+            self.assertEqual(self._start(**bad).status_code, 400, bad)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.assertEqual(self._start(sha256="A" * 64).status_code, 201)   # case does not matter
+
+    def test_digest_mismatch_discards_the_upload(self):
+        uid = self._start(sha256="0" * 64).json()["id"]
+        self.assertEqual(self._patch(uid, 0, self.data).status_code, 422)
+        self.assertFalse(AttachmentUpload.objects.exists() or TaskAttachment.objects.exists())
+
+    def test_multipart_upload_is_limited_while_parsing(self):
+        url = f"/agenda/task/{self.task.id}/attach/upload/"
+        resp = self.client.post(url, {"files": [SimpleUploadedFile("a.png", self.data, "image/png")]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.task.attachments.get().sha256, hashlib.sha256(self.data).hexdigest())
+        with mock.patch("planner.views.MAX_UPLOAD_MB", 0.1):
+            resp = self.client.post(url, {"files": [SimpleUploadedFile("b.png", self.data, "image/png")]})
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self.task.attachments.count(), 1)
+
+
+class BlobTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.a = Task.objects.create(title="a", group=self.group)
+        self.b = Task.objects.create(title="b", group=self.group)
+
+    def _attach(self, task, data, name="memo.m4a"):
+        resp = self.client.post(f"/agenda/task/{task.id}/attach/upload/",
+                                {"files": [SimpleUploadedFile(name, data, "audio/mp4")]})
+        return resp.json()["items"][0]
+
+    def test_same_bytes_are_stored_once_and_freed_with_the_last_reference(self):
+        first, second = self._attach(self.a, b"voice" * 1000), self._attach(self.b, b"voice" * 1000, "again.m4a")
+        other = self._attach(self.b, b"other")
+        self.assertEqual(first["url"], second["url"])
+        blob = Blob.objects.get(attachments=first["id"])
+        self.assertEqual((Blob.objects.count(), blob.refcount), (2, 2))
+        self.assertEqual(len(default_storage.listdir(os.path.dirname(blob.file.name))[1]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/agenda/attach/{first['id']}/delete/")
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.delete()   # the cascade releases both of b's attachments
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+        self.assertFalse(TaskAttachment.objects.filter(id=other["id"]).exists())
+
+    def test_resumable_upload_reuses_a_stored_blob(self):
+        data = os.urandom(5000)
+        self._attach(self.a, data, "clip.mp4")
+        uid = self.client.post(f"/agenda/task/{self.b.id}/attach/uploads/", json.dumps({"name": "c.mp4", "size": 5000}),
+                               content_type="application/json").json()["id"]
+        resp = self.client.patch(f"/agenda/attach/uploads/{uid}/", data, content_type="application/octet-stream",
+                                 HTTP_UPLOAD_OFFSET="0")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        self.assertEqual(self.b.attachments.get().file.name, Blob.objects.get().file.name)
+
+    def test_new_blob_does_not_adopt_a_file_being_collected(self):
+        data = b"voice" * 1000
+        sha256 = hashlib.sha256(data).hexdigest()
+        # the collector has deleted the old row and is about to delete its file
+        old = default_storage.save(blobs.blob_name(sha256, "memo.m4a"), ContentFile(data))
+        blob = blobs.store(ContentFile(data), "memo.m4a")
+        self.assertNotEqual(blob.file.name, old)
+        default_storage.delete(old)
+        with blob.file.open("rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_recount_repairs_drift(self):
+        self._attach(self.a, b"x")
+        Blob.objects.update(refcount=5)
+        orphan = Blob.objects.create(sha256="f" * 64, file="blobs/ff/ff/orphan", refcount=1)
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(list(Blob.objects.values_list("refcount", flat=True)), [1])
+        self.assertFalse(Blob.objects.filter(pk=orphan.pk).exists())
+
+    def test_migration_dedupes_existing_media(self):
+        migration = importlib.import_module("planner.migrations.0020_dedupe_media")
+        old = [default_storage.save(f"task_attachments/2025/01/0{i}/p.jpg", ContentFile(b"photo")) for i in range(3)]
+        rows = [TaskAttachment.objects.create(task=self.a, file=name, size=5) for name in old]
+        TaskAttachment.objects.create(task=self.a, file="task_attachments/gone.jpg", size=1)
+        drawing = TaskDrawing.objects.create(task=self.b, image=default_storage.save("task_drawings/d.png", ContentFile(b"ink")))
+        with mock.patch.object(migration, "BATCH", 2):
+            migration.dedupe(apps, None)
+
+        blob = Blob.objects.get(attachments=rows[0])
+        self.assertEqual(blob.refcount, 3)
+        self.assertEqual({r.file.name for r in TaskAttachment.objects.filter(blob=blob)}, {blob.file.name})
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertEqual(TaskAttachment.objects.get(file="task_attachments/gone.jpg").blob, None)
+        drawing.refresh_from_db()
+        self.assertEqual((drawing.blob.refcount, drawing.image.open("rb").read()), (1, b"ink"))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.group = TaskGroup.objects.create(name="Home")
+
+    def _import(self, text, name="tasks.csv", **kw):
+        return import_tasks(read_rows(name, text.encode()), **kw)
+
+    def test_csv_rows_are_written_in_batches(self):
+        occurrences.ensure_horizon()
+        lines = ["title,group,duration_min,recurrence,recur_weekdays"]
+        lines += [f"t{i},{'Home' if i % 2 else 'Work'},15,{'weekly' if i % 3 else 'none'},MO" for i in range(25)]
+        with mock.patch("planner.services.importer.IMPORT_BATCH", 10), CaptureQueriesContext(connection) as ctx:
+            report = self._import("\n".join(lines))
+        self.assertTrue(report.ok, report.errors)
+        self.assertEqual((report.created, report.groups_created), (25, ["Work"]))
+        self.assertEqual(Task.objects.filter(title__startswith="t", group__name="Work").count(), 13)
+        self.assertEqual(Task.objects.get(title="t1").recur_weekdays, "MO")
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), report.statements)
+        self.assertLess(len(ctx.captured_queries), report.statements + 6)   # no query per row
+        # the new tasks' occurrences are there as if they had been saved one by one
+        got = set(TaskOccurrence.objects.filter(task__title__startswith="t").values_list("task_id", "date"))
+        occurrences.rebuild(timezone.localdate(), occurrences.horizon_through())
+        self.assertEqual(got, set(TaskOccurrence.objects.filter(task__title__startswith="t").values_list("task_id", "date")))
+
+    def test_errors_are_reported_per_row_and_reject_the_file(self):
+        text = "title,group,priority,recur_weekdays\nok,Home,3,\n,Home,3,\nbad,Home,x,XX\n"
+        report = self._import(text)
+        self.assertEqual([(r, f) for r, f, _ in report.errors],
+                         [(3, "title"), (4, "priority"), (4, "recur_weekdays")])
+        self.assertFalse(Task.objects.filter(title="ok").exists())
+
+        report = self._import(text, skip_invalid=True)
+        self.assertEqual(report.created, 1)
+        self.assertTrue(Task.objects.filter(title="ok").exists())
+
+    def test_dry_run_writes_nothing(self):
+        report = self._import("title,group\na,New\n", dry_run=True)
+        self.assertEqual((report.rows, report.created, report.groups_created), (1, 0, ["New"]))
+        self.assertFalse(TaskGroup.objects.filter(name="New").exists())
+
+    def test_bad_header_is_a_file_error(self):
+        with self.assertRaises(ImportFileError):
+            self._import("title,colour\na,red\n")
+
+    def test_feed_imports_back(self):
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        Task.objects.create(title="Bins, out", group=self.group, recurrence="weekly", recur_weekdays="TU",
+                            start_date=date(2025, 1, 7))
+        TaskSkip.objects.create(task=Task.objects.get(title="Bins, out"), date=date(2025, 1, 14))
+        feed = b"".join(self.client.get("/agenda/feed.ics").streaming_content).decode()
+        Task.objects.all().delete()
+
+        report = self._import(feed, name="feed.ics")
+        self.assertTrue(report.ok, report.errors)
+        task = Task.objects.get(title="Bins, out")
+        self.assertEqual((task.group.name, task.recurrence), ("Home", "custom"))
+        self.assertEqual(list(task.skips.values_list("date", flat=True)), [date(2025, 1, 14)])
+        for d in [date(2025, 1, 7), date(2025, 1, 14), date(2025, 1, 21), date(2025, 1, 22)]:
+            self.assertEqual(occurs_on(task, d), d.weekday() == 1 and d != date(2025, 1, 14))
+
+    def test_upload_view(self):
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        upload = lambda text: SimpleUploadedFile("t.csv", text.encode(), "text/csv")
+        resp = self.client.post("/agenda/add/import/", {"file": upload("title,group\na,Home\n,Home\n")},
+                                HTTP_ACCEPT="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["errors"][0]["row"], 3)
+        resp = self.client.post("/agenda/add/import/", {"file": upload("title,group\na,Home\n")})
+        self.assertContains(resp, "1 task(s) imported")
+        self.assertTrue(Task.objects.filter(title="a").exists())
+
+
+class BroadcastTests(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(title="Write", group=self.group, recurrence="daily", description_type="check")
+        self.plan = DayPlan.objects.create(date=timezone.localdate())
+        self.a = PlanItem.objects.create(plan=self.plan, task=self.task, group_name="G", start_min=540, end_min=600)
+        self.b = PlanItem.objects.create(plan=self.plan, task=self.task, group_name="G", start_min=600, end_min=660)
+        recount()
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(plan_group(self.plan.date), self.channel)
+        async_to_sync(self.layer.group_add)(TASKS_GROUP, self.channel)
+        self.addCleanup(async_to_sync(self.layer.flush))
+
+    def _messages(self):
+        async def drain():
+            out = []
+            while True:
+                try:
+                    out.append(await asyncio.wait_for(self.layer.receive(self.channel), 0.05))
+                except asyncio.TimeoutError:
+                    return out
+        return async_to_sync(drain)()
+
+    def test_toggle_sends_item_diff_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/agenda/item/{self.a.id}/toggle-done/")
+            self.assertEqual(self._messages(), [])   # nothing before commit
+        [msg] = self._messages()
+        self.assertEqual(msg["type"], "plan.diff")
+        self.assertEqual((msg["date"], msg["replace"], msg["delete"]), (str(self.plan.date), False, []))
+        self.assertEqual([(i["id"], i["done"]) for i in msg["upsert"]], [(self.a.id, True)])
+        self.assertEqual(msg["counters"], {"total_items": 2, "done_items": 1, "planned_minutes": 120})
+        self.assertEqual(msg["version"], self.plan.__class__.objects.get(pk=self.plan.pk).version)
+
+    def test_one_transaction_is_one_diff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                counters.adjust({}, changed=[(self.plan.id, self.a.id)])
+                counters.adjust({}, changed=[(self.plan.id, self.b.id)])
+                gone = self.b.id
+                self.b.delete()
+        [msg] = self._messages()
+        self.assertEqual(([i["id"] for i in msg["upsert"]], msg["delete"]), ([self.a.id], [gone]))
+
+    def test_rollback_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    counters.adjust({}, changed=[(self.plan.id, self.a.id)])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # a later write in a new savepoint starts a fresh buffer
+            with transaction.atomic():
+                counters.adjust({}, changed=[(self.plan.id, self.b.id)])
+        [msg] = self._messages()
+        self.assertEqual([i["id"] for i in msg["upsert"]], [self.b.id])
+
+    def test_writers_without_changed_send_plan_whole(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.adjust({(self.plan.id, "total_items"): 0})
+        [msg] = self._messages()
+        self.assertTrue(msg["replace"])
+        self.assertEqual([i["id"] for i in msg["upsert"]], [self.a.id, self.b.id])
+
+    def test_agenda_edit_sends_deletes(self):
+        rows = [{"item_id": self.a.id, "task_id": self.task.id, "start": "09:00", "end": "09:30"}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/agenda/edit/", {"items_json": json.dumps(rows)})
+        [msg] = self._messages()
+        self.assertEqual([(i["id"], i["end"]) for i in msg["upsert"]], [(self.a.id, "09:30")])
+        self.assertEqual(msg["delete"], [self.b.id])
+        self.assertEqual(msg["counters"]["planned_minutes"], 30)
+
+    def test_delay_announces_moved_item_on_both_days(self):
+        late = PlanItem.objects.create(plan=self.plan, task=self.task, group_name="G", start_min=1380, end_min=1430)
+        tomorrow = self.plan.date + timedelta(days=1)
+        async_to_sync(self.layer.group_add)(plan_group(tomorrow), self.channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/agenda/item/{self.b.id}/delay/", {"minutes": "90"})
+        today, nxt = self._messages()
+        self.assertEqual((today["date"], nxt["date"]), (str(self.plan.date), str(tomorrow)))
+        self.assertIn(late.id, today["delete"])
+        # the new day's sleep blocks were created (and pushed) in the same transaction
+        self.assertEqual([(i["id"], i["start"]) for i in nxt["upsert"]][0], (late.id, "00:30"))
+        self.assertFalse(nxt["replace"])
+
+    def test_checklist_ops(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            row = self.client.post(f"/agenda/task/{self.task.id}/check/add/", {"text": "Draft"}).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/agenda/task/{self.task.id}/check/delete/{row['id']}/")
+        added, deleted = self._messages()
+        self.assertEqual((added["type"], added["task_id"]), ("task.checklist", self.task.id))
+        self.assertEqual([(r["text"], r["done"]) for r in added["upsert"]], [("Draft", False)])
+        self.assertEqual((deleted["upsert"], deleted["delete"]), ([], [row["id"]]))
+
+
+class PlanConsumerTests(TransactionTestCase):
+    """Drives the consumer with asgiref's ApplicationCommunicator (channels.testing needs daphne)."""
+
+    def _socket(self, app, path, user):
+        return ApplicationCommunicator(app, {
+            "type": "websocket", "path": path, "headers": [], "subprotocols": [], "user": user,
+        })
+
+    def test_subscribe_and_receive(self):
+        DayPlan.objects.create(date=date(2026, 3, 1), version=4)
+        user = User.objects.create_user("u")
+        app = URLRouter(websocket_urlpatterns)
+        layer = get_channel_layer()
+
+        async def receive_json(ws):
+            return json.loads((await ws.receive_output(1))["text"])
+
+        async def run():
+            anon = self._socket(app, "/ws/agenda/today/", AnonymousUser())
+            await anon.send_input({"type": "websocket.connect"})
+            self.assertEqual((await anon.receive_output(1))["type"], "websocket.close")
+
+            ws = self._socket(app, "/ws/agenda/today/", user)
+            await ws.send_input({"type": "websocket.connect"})
+            self.assertEqual((await ws.receive_output(1))["type"], "websocket.accept")
+            hello = await receive_json(ws)
+            self.assertEqual((hello["type"], hello["date"]), ("hello", str(timezone.localdate())))
+
+            await ws.send_input({"type": "websocket.receive", "text": json.dumps({"subscribe": "2026-03-01"})})
+            self.assertEqual(await receive_json(ws), {"type": "hello", "date": "2026-03-01", "version": 4})
+
+            await layer.group_send("planner.plan.2026-03-01", {"type": "plan.diff", "date": "2026-03-01", "version": 5})
+            self.assertEqual((await receive_json(ws))["version"], 5)
+            await layer.group_send(TASKS_GROUP, {"type": "task.checklist", "task_id": 1})
+            self.assertEqual((await receive_json(ws))["task_id"], 1)
+            # the day it switched away from no longer reaches it
+            await layer.group_send(f"planner.plan.{timezone.localdate()}", {"type": "plan.diff", "version": 9})
+            self.assertTrue(await ws.receive_nothing())
+            await ws.send_input({"type": "websocket.disconnect", "code": 1000})
+            await ws.wait(1)
+
+        async_to_sync(run)()
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    """Two layer instances on one file stand in for two worker processes (separate connections)."""
+
+    def setUp(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "channels.sqlite3")
+        self.a = SQLiteChannelLayer(path=path, capacity=3, expiry=60)
+        self.b = SQLiteChannelLayer(path=path, capacity=3, expiry=60)
+
+    def run_async(self, coro):
+        async def run():
+            try:
+                return await coro
+            finally:
+                await self.a.close()
+                await self.b.close()
+        return async_to_sync(run)()
+
+    async def _receive(self, layer, channel, timeout=1.0):
+        try:
+            return await asyncio.wait_for(layer.receive(channel), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def test_send_and_group_send_cross_instances(self):
+        async def run():
+            c1, c2 = await self.b.new_channel(), await self.b.new_channel()
+            await self.a.send(c1, {"type": "x", "raw": b"\x00\xff"})
+            self.assertEqual(await self._receive(self.b, c1), {"type": "x", "raw": b"\x00\xff"})
+
+            await self.b.group_add("g", c1)
+            await self.b.group_add("g", c2)
+            await self.a.group_send("g", {"type": "diff", "n": 1})
+            got = [await self._receive(self.b, c) for c in (c1, c2)]
+            self.assertEqual(got, [{"type": "diff", "n": 1}] * 2)
+
+            await self.b.group_discard("g", c2)
+            await self.a.group_send("g", {"type": "diff", "n": 2})
+            self.assertEqual((await self._receive(self.b, c1))["n"], 2)
+            self.assertIsNone(await self._receive(self.b, c2, 0.1))
+        self.run_async(run())
+
+    def test_capacity(self):
+        async def run():
+            full, other = await self.b.new_channel(), await self.b.new_channel()
+            for c in (full, other):
+                await self.a.group_add("g", c)
+            for n in range(3):
+                await self.a.send(full, {"n": n})
+            with self.assertRaises(ChannelFull):
+                await self.a.send(full, {"n": 3})
+            await self.a.group_send("g", {"n": "group"})   # skips the full channel only
+            self.assertEqual([(await self._receive(self.b, full))["n"] for _ in range(3)], [0, 1, 2])
+            self.assertIsNone(await self._receive(self.b, full, 0.1))
+            self.assertEqual((await self._receive(self.b, other))["n"], "group")
+        self.run_async(run())
+
+    def test_expiry_and_flush(self):
+        async def run():
+            self.a.expiry = 0.05
+            c = await self.b.new_channel()
+            await self.a.group_add("g", c)
+            await self.a.send(c, {"n": 1})
+            await asyncio.sleep(0.1)
+            self.assertIsNone(await self._receive(self.b, c, 0.1))
+
+            await self.a.send(c, {"n": 2})
+            await self.a.flush()
+            self.a.expiry = 60
+            await self.a.group_send("g", {"n": 3})   # flush dropped the membership too
+            self.assertIsNone(await self._receive(self.b, c, 0.1))
+        self.run_async(run())
@@ -1,19 +1,24 @@
 from django.urls import path
-from . import views
+from . import api, ics, views
 from django.contrib.auth import views as auth_views
+from abhijitongit_be.querybudget import query_budget
 
 app_name = "planner"
 
 urlpatterns = [
 
-    path("login/",  auth_views.LoginView.as_view(template_name="planner/agenda_login.html"), name="agenda-login"),
-    path("logout/", auth_views.LogoutView.as_view(next_page="/"), name="agenda-logout"),
+    path("login/",  query_budget(4)(auth_views.LoginView.as_view(template_name="planner/agenda_login.html")),
+         name="agenda-login"),
+    path("logout/", query_budget(4)(auth_views.LogoutView.as_view(next_page="/")), name="agenda-logout"),
 
     path("", views.agenda_today, name="agenda-today"),            # /agenda
     path("edit/", views.agenda_edit, name="agenda-edit"),         # /agenda/edit
+    path("edit/auto/", views.agenda_autoplan, name="agenda-autoplan"),  # POST: fill free time
+    path("edit/week/", views.agenda_plan_week, name="agenda-plan-week"),  # POST: place due tasks
     path("add/", views.add_entry, name="agenda-add"),             # /agenda/add (chooser)
     path("add/task/", views.add_task, name="add-task"),           # /agenda/add/task
     path("add/group/", views.add_group, name="add-group"),        # /agenda/add/group
+    path("add/import/", views.add_import, name="add-import"),     # /agenda/add/import (CSV / .ics)
     path("manage/", views.manage_hub, name="manage"),             # /agenda/manage\
 
     # toggle route
@@ -29,10 +34,21 @@ urlpatterns = [
     path("manage/groups/<int:pk>/delete/", views.group_delete, name="group-delete"),
 
     path("manage/agendas/", views.agendas_list, name="agendas-list"),
+    path("calendar/week/", views.calendar_week, name="calendar-week"),     # ?start=YYYY-MM-DD
+    path("calendar/month/", views.calendar_month, name="calendar-month"),  # ?month=YYYY-MM
 
     path("manage/tasks/<int:pk>/purge/", views.task_purge, name="task-purge"),
 
     path("item/<int:item_id>/delay/", views.delay_after, name="delay-after"),
+    path("items/delay/", views.delay_batch, name="delay-batch"),    # JSON batch of delays
+
+    # read-only JSON API with ETag / If-None-Match (planner.api)
+    path("api/plans/today/", api.plan_detail, name="api-plan-today"),
+    path("api/plans/<str:day>/", api.plan_detail, name="api-plan"),
+    path("api/tasks/", api.task_catalog, name="api-tasks"),
+
+    # iCalendar subscription (planner.ics); session or HTTP Basic auth
+    path("feed.ics", ics.ics_feed, name="ics-feed"),
 
 
 
@@ -40,6 +56,7 @@ urlpatterns = [
     path("task/<int:task_id>/check/add/",    views.check_add,    name="check-add"),
     path("task/<int:task_id>/check/toggle/<int:item_id>/", views.check_toggle, name="check-toggle"),
     path("task/<int:task_id>/check/delete/<int:item_id>/", views.check_delete, name="check-delete"),
+    path("task/<int:task_id>/check/batch/",  views.check_batch,  name="check-batch"),   # JSON list of operations
 
     path("task/<int:task_id>/drawing/save/", views.drawing_save, name="drawing-save"),
     path("drawing/<int:pk>/delete/",        views.drawing_delete, name="drawing-delete"),
@@ -47,5 +64,8 @@ urlpatterns = [
     # Attachments
     path("task/<int:task_id>/attach/upload/",  views.attach_upload, name="attach-upload"),
     path("attach/<int:pk>/delete/",            views.attach_delete, name="attach-delete"),
+    # resumable uploads (planner.services.uploads): POST to start, then PATCH chunks / GET the offset
+    path("task/<int:task_id>/attach/uploads/", views.attach_upload_start, name="attach-upload-start"),
+    path("attach/uploads/<uuid:pk>/",          views.attach_upload_chunk, name="attach-upload-chunk"),
 
 ]
@@ -1,7 +1,8 @@
 import json
+import logging
 from datetime import date as dtdate
 from django.shortcuts import render, redirect
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
 from django.utils import timezone
@@ -9,7 +10,6 @@ from .models import DayPlan, PlanItem, Task, TaskGroup
 from .forms import TaskForm, TaskGroupForm
 from django.contrib import messages
 from datetime import timedelta
-from django.db.models import Count, Q
 # views.py (or utils where _today lives)
 from django.utils import timezone
 
@@ -28,84 +28,30 @@ def _today():
     # If you later activate per-user TZ, localdate() will honor it.
     return timezone.localdate()
 
-# --- helper: ensure the two canonical sleep tasks exist ---
-def _ensure_sleep_tasks():
-    group, _ = TaskGroup.objects.get_or_create(name="Necessities")
-    deep, _ = Task.objects.get_or_create(
-        title="Deep Sleep",
-        defaults=dict(
-            group=group,
-            duration_min=360,                     # 6h
-            priority=5,
-            desired_time="night",
-            recurrence="daily",
-            active=True,
-            description_type="none",
-        ),
-    )
-    light, _ = Task.objects.get_or_create(
-        title="Light Sleep",
-        defaults=dict(
-            group=group,
-            duration_min=120,                     # 2h
-            priority=5,
-            desired_time="night",
-            recurrence="daily",
-            active=True,
-            description_type="none",
-        ),
-    )
-    return deep, light, group.name
-
-# --- helper: seed a new plan with sleep blocks (idempotent) ---
-def _seed_sleep_blocks(plan: DayPlan):
-    deep, light, group_name = _ensure_sleep_tasks()
-
-    # If there are *any* items already, don't seed (prevents duplicates)
-    if plan.items.exists():
-        return
-
-    # Create two plan items
-    PlanItem.objects.bulk_create([
-        PlanItem(
-            plan=plan, task=deep, group_name=group_name,
-            start_hhmm="00:00", end_hhmm="06:00", order=0, done=False
-        ),
-        PlanItem(
-            plan=plan, task=light, group_name=group_name,
-            start_hhmm="22:00", end_hhmm="23:59", order=999, done=False
-        ),
-    ])
-
-# --- helper: sort items (treat "00:00" end as 24:00 for ordering) ---
-def _hhmm_to_min(hhmm: str) -> int:
-    try:
-        h, m = hhmm.split(":")
-        return int(h) * 60 + int(m)
-    except Exception:
-        return 0
+from .models import MIDNIGHT, hhmm_to_min
+from .services import blobs, broadcast, checklist, counters
+from abhijitongit_be.querybudget import allow_queries, query_budget
+from .api import plan_version, wants_json
+
+logger = logging.getLogger(__name__)
 
-def _sort_key(item: PlanItem):
-    s = _hhmm_to_min(item.start_hhmm or "00:00")
-    e = _hhmm_to_min(item.end_hhmm or "00:00")
-    # If an item ends exactly at 00:00, interpret it as 24:00 for same-day ordering
-    if item.end_hhmm == "00:00":
-        e = 24 * 60
-    return (s, e, item.order, item.id or 0)
+# new days are cloned from their day template (services.dayplans, shared with the horizon planner)
+from .services.dayplans import ensure_plans
 
 # ========== VIEW ==========
+@query_budget(20)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET"])
 def agenda_today(request):
     d = _today()
-    plan, created = DayPlan.objects.get_or_create(date=d)
-
-    # If this is a new day plan, seed the sleep blocks once
-    if created:
-        _seed_sleep_blocks(plan)
+    plan = ensure_plans([d])[d]   # a new day starts as a copy of its day template
 
-    # Fetch items ordered for display
-    items = sorted(plan.items.select_related("task").all(), key=_sort_key)
+    # Fetch items ordered for display (midnight ends are stored as 1440, so SQL order is right)
+    items = (
+        plan.items.select_related("task", "task__group")
+            .prefetch_related("task__check_items", "task__drawings", "task__attachments")
+            .chronological()
+    )
 
     ctx = {
         "date": d,
@@ -114,190 +60,213 @@ def agenda_today(request):
     }
     return render(request, "planner/agenda_today.html", ctx)
 
-def _has_overlaps(rows):
-    """rows: [{'start': 'HH:MM', 'end': 'HH:MM', ...}]"""
-    def to_min(s):
-      h,m = map(int, s.split(':')); return h*60+m
+def _row_minutes(rows):
+    """rows: [{'start': 'HH:MM', 'end': 'HH:MM', ...}] -> [(start_min, end_min)], None if any range is invalid."""
     try:
-        intervals = []
-        for r in rows:
-            s = to_min(r["start"]); e = to_min(r["end"])
-            if e <= s:  # invalid interval
-                return True
-            intervals.append((s,e))
-        intervals.sort()
-        for i in range(1, len(intervals)):
-            if intervals[i][0] < intervals[i-1][1]:
-                return True
-        return False
-    except Exception:
-        # any parse error = treat as invalid/overlap to be safe
-        return True
+        out = [(hhmm_to_min(r["start"]), hhmm_to_min(r["end"], end=True)) for r in rows]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if any(not (0 <= s < e <= MIDNIGHT) for s, e in out):
+        return None
+    return out
+
+def _row_conflicts(minutes):
+    """1-based row numbers of every overlapping pair, e.g. [(2, 3)]."""
+    from .services.intervals import IntervalIndex
+    index = IntervalIndex((s, e, n) for n, (s, e) in enumerate(minutes, start=1))
+    return sorted(tuple(sorted(pair)) for pair in index.conflicts())
+
+def _render_edit_error(request, d, plan, msg):
+    messages.error(request, msg)
+    # Re-render editor with current DB items and task drawer (no changes saved)
+    tasks = Task.objects.filter(active=True).select_related("group").order_by("-priority", "duration_min")
+    items = plan.items.select_related("task").all()
+    groups = TaskGroup.objects.all().order_by("name")
+    return render(request, "planner/agenda_edit.html", {
+        "date": d, "items": items, "tasks": tasks, "groups": groups
+    })
 
+@query_budget(28)   # dropping an auto item re-plans the week
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET", "POST"])
 @transaction.atomic
 def agenda_edit(request):
     d = _today()
-    plan, _ = DayPlan.objects.get_or_create(date=d)
+    plan = ensure_plans([d])[d]
 
     if request.method == "POST":
         raw = request.POST.get("items_json", "")
-        print("[agenda_edit] POST for", d)
-        print("[agenda_edit] raw length:", len(raw))
-        if raw:
-            print("[agenda_edit] raw preview:", raw[:300])
-        else:
-            print("[agenda_edit] raw is empty")
+        logger.debug("agenda_edit POST for %s: %d bytes, preview %r", d, len(raw), raw[:300])
 
         try:
             rows = json.loads(raw) if raw else []
         except Exception as e:
-            print("[agenda_edit] JSON parse error:", e)
+            logger.warning("agenda_edit: bad items payload for %s: %s", d, e)
             return HttpResponseBadRequest("Bad items payload")
 
-        print("[agenda_edit] parsed rows:", len(rows))
-
-        if _has_overlaps(rows):
-            messages.error(request, "Overlapping or invalid time ranges. Please fix highlighted rows.")
-            # Re-render editor with current DB items and task drawer (no changes saved)
-            tasks = Task.objects.filter(active=True).select_related("group").order_by("-priority", "duration_min")
-            items = plan.items.select_related("task").all()
-            groups = TaskGroup.objects.all().order_by("name")
-            return render(request, "planner/agenda_edit.html", {
-                "date": d, "items": items, "tasks": tasks, "groups": groups
-            })
+        minutes = _row_minutes(rows)
+        if minutes is None:
+            return _render_edit_error(request, d, plan, "Invalid time range. Please fix highlighted rows.")
+        conflicts = _row_conflicts(minutes)
+        if conflicts:
+            pairs = ", ".join(f"{a} and {b}" for a, b in conflicts[:5])
+            return _render_edit_error(request, d, plan, f"Overlapping rows: {pairs}. Please fix highlighted rows.")
 
         # # SAFETY: if nothing came through, do nothing (avoid accidental clears)
         # if len(rows) == 0:
         #     print("[agenda_edit] 0 rows received -> no changes applied")
         #     return redirect("planner:agenda-today")
 
-        existing_qs = plan.items.select_related("task").all()
-        existing = {str(it.id): it for it in existing_qs}
-        print("[agenda_edit] existing item ids:", list(existing.keys()))
+        # Constant query count whatever the row count: one read of the plan's items,
+        # one in_bulk for every referenced task, then one bulk write per kind of change.
+        existing = {it.id: it for it in plan.items.all()}
+        deltas = counters.tally(existing.values(), -1)
+        try:
+            task_ids = {int(r["task_id"]) for r in rows}
+        except (KeyError, TypeError, ValueError):
+            return HttpResponseBadRequest("Bad items payload")
+        tasks_by_id = Task.objects.select_related("group").in_bulk(task_ids)
+        if len(tasks_by_id) != len(task_ids):
+            return HttpResponseBadRequest("Unknown task in items payload")
 
         keep_ids = set()
         creates = []
-        updates = 0
-
+        updates = []
         one_time_to_deactivate = set()
 
-        order_counter = 0
-        for r in rows:
-            print("[agenda_edit] row", order_counter, "->", r)
-            item_id = r.get("item_id")
-            task_id = int(r["task_id"])
-            start = r["start"]
-            end = r["end"]
+        for order_counter, (r, (start, end)) in enumerate(zip(rows, minutes)):
+            t = tasks_by_id[int(r["task_id"])]
+            try:
+                it = existing.get(int(r.get("item_id") or 0))
+            except (TypeError, ValueError):
+                it = None
 
-            if item_id and str(item_id) in existing:
-                it = existing[str(item_id)]
+            if it is not None and it.id not in keep_ids:
                 changed = False
-                # if it.task_id != task_id:
-                #     it.task_id = task_id
-                #     it.group_name = Task.objects.get(id=task_id).group.name
-                #     changed = True
-                if it.task_id != task_id:
-                    it.task_id = task_id
-                    t = Task.objects.select_related("group").get(id=task_id)
+                if it.task_id != t.id:
+                    it.task_id = t.id
                     it.group_name = t.group.name
                     changed = True
-                    if getattr(t, "recurrence", "none") == "none":
+                    if t.recurrence == "none":
                         one_time_to_deactivate.add(t.id)
-                if it.start_hhmm != start:
-                    it.start_hhmm = start; changed = True
-                if it.end_hhmm != end:
-                    it.end_hhmm = end; changed = True
+                if it.start_min != start:
+                    it.start_min = start; changed = True
+                if it.end_min != end:
+                    it.end_min = end; changed = True
                 if it.order != order_counter:
                     it.order = order_counter; changed = True
                 if changed:
-                    it.save(update_fields=["task_id","group_name","start_hhmm","end_hhmm","order"])
-                    updates += 1
+                    updates.append(it)
                 keep_ids.add(it.id)
             else:
                 # New row
-                grp_name = Task.objects.select_related("group").get(id=task_id).group.name
-                t = Task.objects.select_related("group").get(id=task_id)
                 creates.append(PlanItem(
                     plan=plan,
                     task_id=t.id,
                     group_name=t.group.name,
-                    start_hhmm=start,
-                    end_hhmm=end,
+                    start_min=start,
+                    end_min=end,
                     order=order_counter,
                     done=False,
                 ))
-                if getattr(t, "recurrence", "none") == "none":
+                if t.recurrence == "none":
                     one_time_to_deactivate.add(t.id)
 
-            order_counter += 1
-
+        if updates:
+            PlanItem.objects.bulk_update(updates, ["task", "group_name", "start_min", "end_min", "order"])
         if creates:
             PlanItem.objects.bulk_create(creates)
-        print("[agenda_edit] created:", len(creates), "updated:", updates)
+        deltas.update(counters.tally([existing[i] for i in keep_ids] + creates))
 
-        # Delete removed ones
-        # to_delete_qs = plan.items.exclude(id__in=keep_ids)
-        # deleted_count = to_delete_qs.count()
-        # to_delete_qs.delete()
-        # ✅ FIX: only delete items that existed before but were not kept
-        existing_ids = {it.id for it in existing_qs}  # capture BEFORE any creates
-        keep_existing_ids = set(keep_ids)             # ids of existing rows we kept
-        to_delete_ids = existing_ids - keep_existing_ids
+        # only delete items that existed before but were not kept
+        to_delete_ids = existing.keys() - keep_ids
 
         deleted_count = 0
+        removed_auto = set()
         if to_delete_ids:
+            removed_auto = {existing[i].task_id for i in to_delete_ids if existing[i].auto and not existing[i].done}
             deleted_count = PlanItem.objects.filter(id__in=to_delete_ids).delete()[0]
+        written = [x.id for x in updates + creates] + list(to_delete_ids)
+        counters.adjust(deltas, plans=[plan], changed=[(plan.id, i) for i in written])
+
+        if removed_auto:
+            # planner-placed items were dropped: give their tasks a slot on another day
+            from .services.horizon import replan_day
+            replan_day(d, removed_auto)
 
         if one_time_to_deactivate:
-            Task.objects.filter(id__in=one_time_to_deactivate).update(active=False)
+            Task.objects.filter(id__in=one_time_to_deactivate).update(active=False, updated_at=timezone.now())
 
-        print("[agenda_edit] deleted (existing only):", deleted_count)
+        logger.info("agenda_edit %s: %d rows, created %d, updated %d, deleted %d",
+                    d, len(rows), len(creates), len(updates), deleted_count)
+        if wants_json(request):
+            plan.refresh_from_db(fields=["version"])   # replan_day may have bumped it again
+            return JsonResponse({"ok": True, "plan": plan_version(plan)})
 
         return redirect("planner:agenda-today")
 
     # GET – unchanged
     # tasks = Task.objects.filter(active=True).select_related("group").order_by("-priority", "duration_min")
     # views.py (inside agenda_edit GET branch)
-    from .services.recurrence import occurs_on
-    today = d
-    all_tasks = list(Task.objects.filter(active=True).select_related("group"))
-    eligible = [t for t in all_tasks if occurs_on(t, today)]
-    # order: eligible first, then others
-    tasks = sorted(all_tasks, key=lambda t: (t not in eligible, -t.priority, t.duration_min))
+    from .services.occurrences import ensure_horizon
+    ensure_horizon()   # custom RRULEs are answered from the materialized occurrences
+    # the drawer lists today's tasks, filtered in SQL; ?all=1 lists every active task
+    show_all = request.GET.get("all") == "1"
+    tasks = Task.objects.filter(active=True)
+    if not show_all:
+        tasks = tasks.occurring_on(d)
+    tasks = tasks.select_related("group").order_by("-priority", "duration_min")
     
     items = plan.items.select_related("task").all()
     groups = TaskGroup.objects.all().order_by("name")
 
-    today = d
-    window = today + timedelta(days=7)
-
-    unscheduled_due = (
-        Task.objects.filter(active=True, deadline_at__isnull=False,
-                            deadline_at__date__lte=window)
-            .annotate(scheduled_count=Count(
-                "planitem",
-                filter=Q(planitem__plan__date__gte=today)
-            ))
-            .filter(scheduled_count=0)   # not scheduled today or later
-            .select_related("group")
-            .order_by("-priority", "deadline_at")
-    )
+    from .services.horizon import unscheduled_due as _unscheduled_due, HORIZON_DAYS
+    # due within the horizon and not scheduled today or later
+    unscheduled_due = _unscheduled_due(d, d + timedelta(days=HORIZON_DAYS)).order_by("-priority", "deadline_at")
 
     return render(request, "planner/agenda_edit.html", {
         "date": d, "items": items, "tasks": tasks, "groups": groups,
         "unscheduled_due": unscheduled_due,   # NEW
+        "show_all": show_all,
     })
     # return render(request, "planner/agenda_edit.html", {
     #     "date": d, "items": items, "tasks": tasks, "groups": groups
     # })
 
+@query_budget(14)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["POST"])
+def agenda_autoplan(request):
+    """Fill today's free time with eligible tasks (services.scheduler)."""
+    from .services.scheduler import plan_day
+    d = _today()
+    items = plan_day(ensure_plans([d])[d])
+    if items:
+        messages.success(request, f"Auto-planned {len(items)} task(s).")
+    else:
+        messages.info(request, "No free slot fits the remaining tasks.")
+    return redirect("planner:agenda-edit")
+
+@query_budget(22)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["POST"])
+def agenda_plan_week(request):
+    """Spread unscheduled deadline tasks over the coming days (services.horizon)."""
+    from .services.horizon import plan_horizon
+    items = plan_horizon()
+    if items:
+        messages.success(request, f"Scheduled {len(items)} due task(s) over the next days.")
+    else:
+        messages.info(request, "Nothing left to schedule before its deadline.")
+    return redirect("planner:agenda-edit")
+
+@query_budget(2)
 @login_required(login_url="/agenda/login/")
 def add_entry(request):
     # simple chooser page
     return render(request, "planner/add_entry.html")
 
+@query_budget(6)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET", "POST"])
 def add_task(request):
@@ -311,6 +280,7 @@ def add_task(request):
         form = TaskForm()
     return render(request, "planner/add_task.html", {"form": form})
 
+@query_budget(6)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET", "POST"])
 def add_group(request):
@@ -324,18 +294,54 @@ def add_group(request):
         form = TaskGroupForm()
     return render(request, "planner/add_group.html", {"form": form})
 
+@query_budget(8)   # plus one per batched INSERT (allow_queries)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["GET", "POST"])
+def add_import(request):
+    """Upload a CSV / .ics file of tasks (services.importer); JSON clients get the report as JSON."""
+    from .services.importer import ImportFileError, import_tasks, read_rows
+    if request.method == "GET":
+        return render(request, "planner/add_import.html")
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return HttpResponseBadRequest("No file")
+    try:
+        report = import_tasks(read_rows(upload.name, upload.read()), dry_run=bool(request.POST.get("dry_run")),
+                              skip_invalid=bool(request.POST.get("skip_invalid")))
+    except ImportFileError as e:
+        if wants_json(request):
+            return JsonResponse({"ok": False, "error": str(e)}, status=400)
+        messages.error(request, str(e))
+        return render(request, "planner/add_import.html", status=400)
+    allow_queries(request, report.statements)
+
+    if wants_json(request):
+        rejected = not report.ok and not report.dry_run and not request.POST.get("skip_invalid")
+        return JsonResponse({"ok": report.ok, **report.as_dict()}, status=400 if rejected else 200)
+    if report.created:
+        messages.success(request, f"Imported {report.created} task(s).")
+    return render(request, "planner/add_import.html", {"report": report})
+
+@query_budget(2)
 @login_required(login_url="/agenda/login/")
 def manage_hub(request):
     return render(request, "planner/manage.html")
 
 from django.shortcuts import get_object_or_404
 
+@query_budget(10)   # plan writers include the two queries of the post-commit broadcast
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["POST"])
+@transaction.atomic
 def toggle_done(request, item_id):
-    it = get_object_or_404(PlanItem, id=item_id)
+    it = get_object_or_404(PlanItem.objects.select_for_update().select_related("plan"), id=item_id)
     it.done = not it.done
     it.save(update_fields=["done"])
+    counters.adjust({(it.plan_id, "done_items"): 1 if it.done else -1}, plans=[it.plan],
+                    changed=[(it.plan_id, it.id)])
+    if wants_json(request):
+        return JsonResponse({"ok": True, "item": {"id": it.id, "done": it.done}, "plan": plan_version(it.plan)})
     return redirect("planner:agenda-today")
 
 
@@ -343,6 +349,7 @@ from django.forms import modelform_factory
 from django.contrib import messages
 
 # ----- TASKS -----
+@query_budget(4)
 @login_required(login_url="/agenda/login/")
 def tasks_list(request):
     qs = Task.objects.select_related("group").order_by("group__name","-priority","title")
@@ -351,6 +358,7 @@ def tasks_list(request):
         qs = qs.filter(title__icontains=q)
     return render(request, "planner/tasks_list.html", {"tasks": qs})
 
+@query_budget(6)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET","POST"])
 def task_edit(request, pk):
@@ -368,6 +376,8 @@ def task_edit(request, pk):
         "title": f"Edit Task: {obj.title}"
     })
 
+@query_budget(19)   # the cascade loads day template items, uploads, attachments and drawings (delete signals),
+                    # and the released blobs are collected after commit (services.blobs)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["POST"])
 def task_delete(request, pk):
@@ -377,11 +387,13 @@ def task_delete(request, pk):
 
 
 # ----- GROUPS -----
+@query_budget(4)
 @login_required(login_url="/agenda/login/")
 def groups_list(request):
     qs = TaskGroup.objects.order_by("name")
     return render(request, "planner/groups_list.html", {"groups": qs})
 
+@query_budget(5)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["GET","POST"])
 def group_edit(request, pk):
@@ -395,6 +407,7 @@ def group_edit(request, pk):
         form = Form(instance=obj)
     return render(request, "planner/simple_form.html", {"form": form, "title": f"Edit Group: {obj.name}"})
 
+@query_budget(6)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["POST"])
 def group_delete(request, pk):
@@ -404,22 +417,105 @@ def group_delete(request, pk):
 
 # ----- AGENDAS -----
 
+AGENDAS_PAGE_SIZE = 30
+
+@query_budget(4)
 @login_required(login_url="/agenda/login/")
 def agendas_list(request):
-    plans = DayPlan.objects.order_by("-date").prefetch_related("items")
-    rows = []
-    for p in plans:
-        total = p.items.count()
-        done = p.items.filter(done=True).count()
-        rows.append({"plan": p, "total": total, "done": done})
-    return render(request, "planner/agendas_list.html", {"rows": rows})
+    """Newest first; ?before=<date> / ?after=<date> page by date (keyset), one query per page.
+
+    Totals come from the DayPlan counters (services.counters), not from the items.
+    """
+    try:
+        before = dtdate.fromisoformat(request.GET["before"]) if request.GET.get("before") else None
+        after = dtdate.fromisoformat(request.GET["after"]) if request.GET.get("after") else None
+    except ValueError:
+        return HttpResponseBadRequest("Bad page cursor")
+
+    plans = DayPlan.objects.all()
+    if after:
+        # walk forward from the cursor, then show the page newest first like the others
+        page = list(plans.filter(date__gt=after).order_by("date")[:AGENDAS_PAGE_SIZE + 1])
+        more = len(page) > AGENDAS_PAGE_SIZE
+        page = page[:AGENDAS_PAGE_SIZE][::-1]
+        has_newer, has_older = more, True
+    else:
+        if before:
+            plans = plans.filter(date__lt=before)
+        page = list(plans.order_by("-date")[:AGENDAS_PAGE_SIZE + 1])
+        has_older = len(page) > AGENDAS_PAGE_SIZE
+        page = page[:AGENDAS_PAGE_SIZE]
+        has_newer = before is not None
+
+    rows = [{"plan": p, "total": p.total_items, "done": p.done_items, "hours": p.planned_minutes / 60}
+            for p in page]
+    return render(request, "planner/agendas_list.html", {
+        "rows": rows,
+        "newer_cursor": page[0].date.isoformat() if page and has_newer else None,
+        "older_cursor": page[-1].date.isoformat() if page and has_older else None,
+    })
+
+# ----- CALENDAR -----
 
+@query_budget(7)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["GET"])
+def calendar_week(request):
+    """Seven days from ?start=<date> (default: this week's Monday); services.calendar reads them at once."""
+    from .services.calendar import calendar_days
+    try:
+        start = dtdate.fromisoformat(request.GET["start"]) if request.GET.get("start") else None
+    except ValueError:
+        return HttpResponseBadRequest("Dates look like YYYY-MM-DD")
+    today = _today()
+    start = start or today - timedelta(days=today.weekday())
+    try:
+        prev, nxt = start - timedelta(days=7), start + timedelta(days=7)
+    except OverflowError:
+        return HttpResponseBadRequest("Date out of range")
+    days, totals = calendar_days(start, nxt - timedelta(days=1))
+    return render(request, "planner/calendar_week.html", {
+        "days": days, "totals": totals, "today": today, "prev": prev, "next": nxt,
+    })
+
+
+@query_budget(7)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["GET"])
+def calendar_month(request):
+    """?month=YYYY-MM (default: this month) as whole Monday-first weeks, read in one range."""
+    from .services.calendar import calendar_days
+    today = _today()
+    try:
+        first = dtdate.fromisoformat(request.GET["month"] + "-01") if request.GET.get("month") else today.replace(day=1)
+    except ValueError:
+        return HttpResponseBadRequest("Months look like YYYY-MM")
+    try:
+        following = (first + timedelta(days=31)).replace(day=1)
+        prev = (first - timedelta(days=1)).replace(day=1)
+        start = first - timedelta(days=first.weekday())
+        last = following - timedelta(days=1)
+        end = last + timedelta(days=6 - last.weekday())
+    except OverflowError:
+        return HttpResponseBadRequest("Month out of range")
+    # the padding days belong to the neighbouring months: they are shown but not counted
+    days, totals = calendar_days(start, end, counted=(first, last))
+    return render(request, "planner/calendar_month.html", {
+        "month": first, "weeks": [days[i:i + 7] for i in range(0, len(days), 7)], "totals": totals,
+        "today": today, "prev": prev, "next": following,
+    })
+
+@query_budget(23)   # as task_delete, after the plan items
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["POST"])
 def task_purge(request, pk):
     obj = get_object_or_404(Task, pk=pk)
-    PlanItem.objects.filter(task=obj).delete()
-    obj.delete()
+    with transaction.atomic():
+        items = PlanItem.objects.filter(task=obj)
+        rows = list(items.only("plan_id", "done", "start_min", "end_min"))
+        counters.adjust(counters.tally(rows, -1), changed=[(it.plan_id, it.id) for it in rows])
+        items.delete()
+        obj.delete()
     messages.success(request, "Task and its scheduled items were permanently deleted.")
     return redirect("planner:tasks-list")
 
@@ -428,10 +524,21 @@ from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from .models import PlanItem
 
+def _touched_plans(items):
+    """New versions of the plans apply_delays() wrote (its items share the updated plan objects)."""
+    plans = {x.plan.id: x.plan for x in items}
+    return [plan_version(p) for p in sorted(plans.values(), key=lambda p: p.date)]
+
+
+@query_budget(14)
 @login_required(login_url="/agenda/login/")
 @require_http_methods(["POST"])
 def delay_after(request, item_id):
-    """Extend the selected item by N minutes and push all later items forward by N."""
+    """Extend the selected item by N minutes and push all later items forward by N.
+
+    Items pushed past midnight continue on the next day's plan (services.delays).
+    """
+    from .services.delays import apply_delays, DelayError
     try:
         delay_min = int(request.POST.get("minutes", "0"))
     except (TypeError, ValueError):
@@ -444,46 +551,43 @@ def delay_after(request, item_id):
         messages.error(request, "Negative delay is not supported.")
         return redirect("planner:agenda-today")
 
-    it = get_object_or_404(PlanItem, id=item_id)
-    plan = it.plan
-
-    # --- helpers ---
-    def hhmm_to_min(hhmm: str) -> int:
-        h, m = map(int, hhmm.split(":"))
-        return h * 60 + m
-
-    def min_to_hhmm(total: int) -> str:
-        total = max(0, min(24 * 60, total))
-        return f"{total // 60:02d}:{total % 60:02d}"
-
-    # Keep the original end to decide which items count as "later"
-    original_end_str = it.end_hhmm
-    original_end_min = hhmm_to_min(original_end_str)
-
-    # 1) Extend the current item
-    new_end_min = min(original_end_min + delay_min, 24 * 60)
-    it.end_hhmm = min_to_hhmm(new_end_min)
-    it.save(update_fields=["end_hhmm"])
-
-    # 2) Shift all items whose start >= original end
-    later_items = plan.items.filter(start_hhmm__gte=original_end_str).order_by("start_hhmm", "order")
-    for li in later_items:
-        s = hhmm_to_min(li.start_hhmm) + delay_min
-        e = hhmm_to_min(li.end_hhmm) + delay_min
-        li.start_hhmm = min_to_hhmm(s)
-        li.end_hhmm   = min_to_hhmm(e)
-        li.save(update_fields=["start_hhmm", "end_hhmm"])
-
-    # 3) Recompute 'order' by chronological order (nice to keep consistent)
-    reordered = list(plan.items.order_by("start_hhmm", "end_hhmm", "id"))
-    for idx, li in enumerate(reordered):
-        if li.order != idx:
-            li.order = idx
-            li.save(update_fields=["order"])
+    it = get_object_or_404(PlanItem.objects.select_related("task", "plan"), id=item_id)
+    try:
+        touched = apply_delays([(it.id, delay_min)])
+    except DelayError as e:
+        messages.error(request, str(e))
+        return redirect("planner:agenda-today")
 
     messages.success(request, f"Extended “{it.task.title}” by {delay_min} min and delayed later tasks.")
+    # later items move with the delay; anything that already ran in parallel still does
+    from .services.intervals import IntervalIndex
+    clashes = IntervalIndex.for_plan(it.plan).conflicts()
+    if wants_json(request):
+        return JsonResponse({"ok": True, "overlaps": len(clashes), "plans": _touched_plans(touched)})
+    if clashes:
+        messages.warning(request, f"{len(clashes)} overlapping pair(s) remain on this day.")
     return redirect("planner:agenda-today")
 
+@query_budget(12)
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["POST"])
+def delay_batch(request):
+    """JSON body {"delays": [{"item_id": 1, "minutes": 15}, ...]}, applied in order in one transaction."""
+    from .services.delays import apply_delays, DelayError
+    try:
+        payload = json.loads(request.body or b"{}")
+        delays = [(int(x["item_id"]), int(x["minutes"])) for x in payload["delays"]]
+    except (ValueError, KeyError, TypeError):
+        return _json_error("Bad delays payload")
+    try:
+        touched = apply_delays(delays)
+    except DelayError as e:
+        return _json_error(str(e))
+    return JsonResponse({"ok": True, "items": [
+        {"id": x.id, "date": str(x.plan.date), "start": x.start_hhmm, "end": x.end_hhmm, "order": x.order}
+        for x in touched
+    ], "plans": _touched_plans(touched)})
+
 
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_POST
@@ -491,6 +595,7 @@ from .models import Task, TaskChecklistItem
 
 def _json_error(msg, code=400): return JsonResponse({"ok": False, "error": msg}, status=code)
 
+@query_budget(7)
 @login_required(login_url="/agenda/login/")
 @require_POST
 def check_add(request, task_id):
@@ -500,11 +605,10 @@ def check_add(request, task_id):
     text = (request.POST.get("text") or "").strip()
     if not text:
         return _json_error("Empty item")
-    last = task.check_items.order_by("-order").first()
-    order = (last.order + 1) if last else 0
-    item = TaskChecklistItem.objects.create(task=task, text=text, order=order)
+    item = checklist.append(task, text)
     return JsonResponse({"ok": True, "id": item.id, "text": item.text, "done": item.done})
 
+@query_budget(7)
 @login_required(login_url="/agenda/login/")
 @require_POST
 def check_toggle(request, task_id, item_id):
@@ -512,16 +616,37 @@ def check_toggle(request, task_id, item_id):
     item = get_object_or_404(TaskChecklistItem, id=item_id, task=task)
     item.done = not item.done
     item.save(update_fields=["done"])
+    broadcast.checklist_changed(task.id, [item.id])
     return JsonResponse({"ok": True, "id": item.id, "done": item.done})
 
+@query_budget(7)
 @login_required(login_url="/agenda/login/")
 @require_POST
 def check_delete(request, task_id, item_id):
     task = get_object_or_404(Task, id=task_id)
     item = get_object_or_404(TaskChecklistItem, id=item_id, task=task)
     item.delete()
+    broadcast.checklist_changed(task.id, [item_id])
     return JsonResponse({"ok": True, "id": item_id})
 
+@query_budget(10)
+@login_required(login_url="/agenda/login/")
+@require_POST
+def check_batch(request, task_id):
+    """JSON {"ops": [...]}: add / toggle / delete / move items in one transaction (services.checklist)."""
+    task = get_object_or_404(Task, id=task_id)
+    if task.description_type != "check":
+        return _json_error("Task is not a checklist")
+    try:
+        ops = json.loads(request.body or b"{}").get("ops")
+    except (ValueError, AttributeError):
+        return _json_error("Bad JSON")
+    try:
+        result = checklist.apply(task, ops)
+    except checklist.ChecklistError as e:
+        return JsonResponse({"ok": False, "error": str(e), "index": e.index}, status=400)
+    return JsonResponse({"ok": True, **result.as_dict()})
+
 
 import base64
 from django.core.files.base import ContentFile
@@ -532,6 +657,7 @@ from .models import Task, TaskDrawing
 def _json_error(msg, code=400): 
     return JsonResponse({"ok": False, "error": msg}, status=code)
 
+@query_budget(8)   # blobs.store: a refcount UPDATE, then a guarded INSERT for new content
 @login_required(login_url="/agenda/login/")
 @require_POST
 def drawing_save(request, task_id):
@@ -552,9 +678,8 @@ def drawing_save(request, task_id):
     if len(raw) > 2 * 1024 * 1024:
         return _json_error("PNG too large (max 2MB)")
 
-    fname = f"task-{task.id}-{timezone.now().strftime('%Y%m%d%H%M%S')}.png"
-    drawing = TaskDrawing(task=task, title=title)
-    drawing.image.save(fname, ContentFile(raw), save=True)
+    blob = blobs.store(ContentFile(raw), "drawing.png")
+    drawing = TaskDrawing.objects.create(task=task, title=title, blob=blob, image=blob.file.name)
 
     return JsonResponse({
         "ok": True,
@@ -564,6 +689,7 @@ def drawing_save(request, task_id):
         "created": drawing.created_at.isoformat(),
     })
 
+@query_budget(9)   # the blob release runs after commit: refcount UPDATE, and deletes the blob at zero
 @login_required(login_url="/agenda/login/")
 @require_POST
 def drawing_delete(request, pk):
@@ -576,40 +702,106 @@ def drawing_delete(request, pk):
 
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponseBadRequest
-from .models import Task, TaskAttachment
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .models import AttachmentUpload, Task, TaskAttachment
+from .services import uploads
 
 MAX_UPLOAD_MB = 20  # tweak if you want
 
 def _json_error(msg, code=400): return JsonResponse({"ok": False, "error": msg}, status=code)
 
+def _attachment_json(att):
+    return {
+        "id": att.id,
+        "url": att.file.url,
+        "name": att.original_name or att.file.name,
+        "ct": att.content_type,
+        "is_image": att.is_image, "is_audio": att.is_audio, "is_video": att.is_video
+    }
+
+@query_budget(14)   # two files: a blob and a row each
+@csrf_exempt    # checked below, once the size-limiting upload handler is installed
 @login_required(login_url="/agenda/login/")
 @require_POST
 def attach_upload(request, task_id):
+    # the limit and the hash apply while Django parses the body, not after it has spooled it all
+    handler = uploads.LimitedHashingUploadHandler(request, MAX_UPLOAD_MB * 1024 * 1024)
+    request.upload_handlers.insert(0, handler)
+    return _attach_upload(request, task_id, handler)
+
+@csrf_protect
+def _attach_upload(request, task_id, handler):
     task = get_object_or_404(Task, id=task_id)
     files = request.FILES.getlist("files")
+    if handler.too_large:
+        return _json_error(f"{handler.too_large}: too large (>{MAX_UPLOAD_MB}MB)", 413)
     if not files:
         return _json_error("No files")
 
     created = []
-    for f in files:
-        if f.size > MAX_UPLOAD_MB * 1024 * 1024:
-            return _json_error(f"{f.name}: too large (>{MAX_UPLOAD_MB}MB)")
+    for f, digest in zip(files, handler.digests.get("files", [])):
+        blob = blobs.store(f, f.name, digest)   # content seen before is not written again
         att = TaskAttachment(
             task=task,
-            file=f,
+            blob=blob,
+            file=blob.file.name,
             original_name=getattr(f, "name", ""),
-            content_type=getattr(f, "content_type", "") or ""
+            content_type=getattr(f, "content_type", "") or "",
+            size=f.size,
+            sha256=digest,
         )
         att.save()
-        created.append({
-            "id": att.id,
-            "url": att.file.url,
-            "name": att.original_name or att.file.name,
-            "ct": att.content_type,
-            "is_image": att.is_image, "is_audio": att.is_audio, "is_video": att.is_video
-        })
+        created.append(_attachment_json(att))
     return JsonResponse({"ok": True, "items": created})
 
+def _upload_error(e):
+    body = {"ok": False, "error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return JsonResponse(body, status=e.status)
+
+@query_budget(5)
+@login_required(login_url="/agenda/login/")
+@require_POST
+def attach_upload_start(request, task_id):
+    """JSON {"name", "size", "content_type", "sha256"}: open a resumable upload (services.uploads)."""
+    task = get_object_or_404(Task, id=task_id)
+    try:
+        meta = json.loads(request.body or b"{}")
+        upload = uploads.start(task, meta.get("name"), meta.get("size"),
+                               meta.get("content_type", ""), meta.get("sha256", ""))
+    except (ValueError, AttributeError):
+        return _json_error("Bad JSON")
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({"ok": True, "id": str(upload.id), "offset": 0, "size": upload.size,
+                         "chunk_size": uploads.CLIENT_CHUNK_SIZE}, status=201)
+
+@query_budget(13)   # the offset is re-read once the partial file is locked
+@login_required(login_url="/agenda/login/")
+@require_http_methods(["GET", "PATCH", "DELETE"])
+def attach_upload_chunk(request, pk):
+    """GET: committed offset (finishing a complete upload); PATCH (Upload-Offset header): append; DELETE: abandon."""
+    upload = get_object_or_404(AttachmentUpload, pk=pk)
+    if request.method == "DELETE":
+        uploads.discard(upload)
+        return JsonResponse({"ok": True})
+    try:
+        if request.method == "GET":
+            att = uploads.complete(upload)   # None unless every byte is in
+        else:
+            try:
+                offset = int(request.headers.get("Upload-Offset", ""))
+            except ValueError:
+                return _json_error("Missing or bad Upload-Offset header")
+            att = uploads.append(upload, offset, request)   # reads the body in chunks, never whole
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    if att is None:
+        return JsonResponse({"ok": True, "offset": upload.offset, "size": upload.size})
+    return JsonResponse({"ok": True, "offset": upload.offset, "size": upload.size, "item": _attachment_json(att)})
+
+@query_budget(9)   # as drawing_delete
 @login_required(login_url="/agenda/login/")
 @require_POST
 def attach_delete(request, pk):